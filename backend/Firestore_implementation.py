@@ -1,27 +1,19 @@
-import firebase_admin
-from firebase_admin import credentials, storage, firestore
+from firebase_admin import firestore
 import logging
 import datetime
 import os
 from pathlib import Path
+from services import firebase_client
+from services.transcript_mirror import mirror_transcription
+from services.blob_cache import blob_cache
+from services.signed_url_cache import signed_url_cache
+from services.resumable_upload import upload_file_resumable
 
 logger = logging.getLogger(__name__)
 
-# Initialize Firebase app with credentials
-try:
-    cred = credentials.Certificate("Accesskey.json")
-    firebase_admin.initialize_app(cred, {
-        'storageBucket': 'yapper-1958d.firebasestorage.app'
-    })
-    logger.info("Firebase initialized successfully via Firestore_implementation")
-except ValueError:
-    # App already initialized
-    logger.info("Firebase already initialized")
-except Exception as e:
-    logger.error(f"Error initializing Firebase: {e}")
-
-bucket = storage.bucket()
-db = firestore.client()
+# Shared clients; Firebase is initialized by the first storage call
+bucket = firebase_client.bucket
+db = firebase_client.db
 
 def ensure_path_exists(firebase_path):
     """
@@ -38,10 +30,10 @@ def ensure_path_exists(firebase_path):
         
         # Create an empty marker to ensure folder exists
         marker_path = f"users/{user_id}/{folder_type}/.folder_marker"
-        marker_blob = bucket.blob(marker_path)
-        
-        if not marker_blob.exists():
+        if not blob_cache.exists(bucket, marker_path):
+            marker_blob = bucket.blob(marker_path)
             marker_blob.upload_from_string('', content_type='application/octet-stream')
+            blob_cache.note_uploaded(marker_blob)
             logger.info(f"Created {folder_type} folder for user {user_id}")
 
 def upload_file_by_path(local_path, firebase_path):
@@ -80,17 +72,7 @@ def upload_file_by_path(local_path, firebase_path):
     
     blob = bucket.blob(firebase_path)
     
-    try:
-        # Upload file directly from data to avoid path issues
-        with open(local_path, 'rb') as file_obj:
-            file_data = file_obj.read()
-            content_type = 'audio/mpeg'  # Default for audio files
-            blob.upload_from_string(file_data, content_type=content_type)
-    except Exception as e:
-        logger.error(f"Error uploading file content: {e}")
-        raise
-    
-    # Set metadata after upload
+    # Metadata goes with the upload session, so no separate patch is needed
     timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
     
     blob.metadata = {
@@ -98,8 +80,17 @@ def upload_file_by_path(local_path, firebase_path):
         'uploadTime': timestamp,
         'originalPath': local_path
     }
-    # Update the blob with new metadata
-    blob.patch()
+    
+    try:
+        # Stream the file in chunks; only one chunk is held in memory and a
+        # failed chunk resumes where the session left off
+        content_type = 'audio/mpeg'  # Default for audio files
+        upload_file_resumable(blob, local_path, content_type=content_type)
+    except Exception as e:
+        logger.error(f"Error uploading file content: {e}")
+        raise
+    
+    blob_cache.note_uploaded(blob)
     
     # Store additional metadata in Firestore
     filename = os.path.basename(firebase_path)
@@ -121,6 +112,9 @@ def get_signed_url(firebase_path, expiration=3600):
     """
     Generates a signed URL with security check.
     
+    A URL signed earlier for the same path is reused while enough of its
+    validity remains, so most calls cost no Storage round trip.
+    
     Args:
         firebase_path: Path in Firebase
         expiration: URL validity in seconds
@@ -128,15 +122,15 @@ def get_signed_url(firebase_path, expiration=3600):
     Returns:
         str: Signed URL
     """
-    blob = bucket.blob(firebase_path)
-    
-    # Check if blob exists before generating URL
-    if not blob.exists():
-        logger.warning(f"Blob not found at path: {firebase_path}")
-        return None
-    
-    # Generate a short-lived URL for security
-    return blob.generate_signed_url(expiration=expiration, version="v4")
+    def sign():
+        # Check if blob exists before generating URL
+        if not blob_cache.exists(bucket, firebase_path):
+            logger.warning(f"Blob not found at path: {firebase_path}")
+            return None
+        # Generate a short-lived URL for security
+        return bucket.blob(firebase_path).generate_signed_url(expiration=expiration, version="v4")
+    
+    return signed_url_cache.get_url(firebase_path, sign, expiration)
 
 def delete_file_by_path(firebase_path):
     """
@@ -148,11 +142,11 @@ def delete_file_by_path(firebase_path):
     Returns:
         bool: True if deleted, False otherwise
     """
-    blob = bucket.blob(firebase_path)
-    
     # Check if blob exists before deleting
-    if blob.exists():
-        blob.delete()
+    if blob_cache.exists(bucket, firebase_path):
+        bucket.blob(firebase_path).delete()
+        blob_cache.note_deleted(firebase_path)
+        signed_url_cache.invalidate(firebase_path)
         
         # Also delete from Firestore
         filename = os.path.basename(firebase_path)
@@ -177,15 +171,14 @@ def move_file(firebase_source_path, firebase_dest_path):
     Returns:
         bool: True if moved successfully, False otherwise
     """
-    source_blob = bucket.blob(firebase_source_path)
+    source_info = blob_cache.lookup(bucket, firebase_source_path)
     
     # Check if source exists
-    if not source_blob.exists():
+    if source_info is None:
         logger.warning(f"Source file not found: {firebase_source_path}")
         
         # Check if destination already exists (might have been moved already)
-        dest_blob = bucket.blob(firebase_dest_path)
-        if dest_blob.exists():
+        if blob_cache.exists(bucket, firebase_dest_path):
             logger.info(f"Destination already exists: {firebase_dest_path}, treating as success")
             
             # Update Firestore record
@@ -206,17 +199,19 @@ def move_file(firebase_source_path, firebase_dest_path):
     ensure_path_exists(firebase_dest_path)
     
     # Copy with metadata preservation
-    source_blob.reload()  # Ensure we have the latest blob data
+    source_blob = bucket.blob(firebase_source_path)
     bucket.copy_blob(source_blob, bucket, firebase_dest_path)
     
     # Get the new blob and ensure metadata is preserved
     dest_blob = bucket.blob(firebase_dest_path)
-    dest_blob.metadata = source_blob.metadata
-    dest_blob.content_type = source_blob.content_type
+    dest_blob.metadata = source_info.metadata
+    dest_blob.content_type = source_info.content_type
     dest_blob.patch()
     
     # Delete source
     source_blob.delete()
+    blob_cache.note_moved(firebase_source_path, dest_blob)
+    signed_url_cache.invalidate(firebase_source_path)
     
     # Update Firestore record
     filename = os.path.basename(firebase_dest_path)
@@ -236,29 +231,15 @@ def save_to_firestore(doc_id, file_url, chunk_buffer, final=False):
     """
     Stores transcription chunks in Firestore.
     
+    Chunks go to the transcriptions/<doc_id>/chunks subcollection. They are
+    queued and written in batches by a background thread, so this returns
+    without waiting on Firestore. Nothing is stored unless
+    FIRESTORE_TRANSCRIPT_MIRROR is set (see services/transcript_mirror.py).
+    
     Args:
         doc_id: Document ID
         file_url: File URL
         chunk_buffer: Transcription chunks
         final: Is this the final update
     """
-    doc_ref = db.collection("transcriptions").document(doc_id)
-    
-    # Try to get existing document
-    doc = doc_ref.get()
-    if doc.exists:
-        data = doc.to_dict()
-        existing_chunks = data.get("transcription_chunks", [])
-    else:
-        existing_chunks = []
-
-    # Append new chunks
-    existing_chunks.extend(chunk_buffer)
-
-    # Update Firestore document
-    doc_ref.set({
-        "file_url": file_url,
-        "transcription_chunks": existing_chunks,
-        "status": "completed" if final else "in_progress",
-        "updated_at": firestore.SERVER_TIMESTAMP
-    }, merge=True)
+    mirror_transcription(doc_id, file_url, chunk_buffer, final=final)
@@ -4,6 +4,11 @@ Cross-platform compatible Flask application for Yapper with Whisper transcriptio
 Firebase integration, and SocketIO for real-time updates.
 """
 
+import time
+
+# Reference point for the cold-start time reported by create_app
+_STARTED_AT = time.perf_counter()
+
 import os
 import logging
 import tempfile
@@ -41,9 +46,14 @@ if IS_WINDOWS:
 
 # --- Config and Services ---
 from config import UPLOAD_FOLDER, TRASH_FOLDER, DOC_STORE_FILE
-from services.storage import load_doc_store
+from services.storage import load_doc_store, doc_store
 from services.socketio_instance import socketio
-from services.firebase_service import initialize_firebase
+from services.search_index import backfill_search_index
+from services.storage_upload import resume_storage_uploads
+from services.folder_index import migrate_all_users
+from services.trash import start_trash_purger
+from services.reconciler import start_reconciler
+from services.audio_cache import audio_cache
 
 # --- Routes ---
 from routes.docmanage import register_docmanage_routes
@@ -51,7 +61,10 @@ from routes.document import register_document_routes
 from routes.trash_route import register_trash_routes
 from routes.folders import folders_bp
 from routes.user_settings import register_user_settings_routes
+from routes.search import register_search_routes
 from routes.system_routes import register_system_routes
+from routes.metrics import register_metrics_routes
+from routes.storage_route import register_storage_routes
 
 # --- Auth ---
 from auth import verify_firebase_token, is_admin
@@ -100,12 +113,9 @@ def create_app():
     app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "yapper_secret_key")
     app.config["MAX_CONTENT_LENGTH"] = 100 * 1024 * 1024  # 100MB max upload
 
-    # Initialize Firebase
-    initialize_firebase()
-
     # Initialize directories and load doc store
     ensure_directories()
-    load_doc_store()
+    doc_store_seconds = load_doc_store()
 
     # Register routes
     register_basic_routes(app)
@@ -113,6 +123,9 @@ def create_app():
     register_document_routes(app)
     register_trash_routes(app)
     register_user_settings_routes(app)
+    register_search_routes(app)
+    register_metrics_routes(app)
+    register_storage_routes(app)
     app.register_blueprint(folders_bp)
 
     # Attach SocketIO to Flask app with appropriate CORS for production
@@ -123,11 +136,33 @@ def create_app():
             "https://yapper-frontend.vercel.app",  # Update this to your actual Vercel domain
         ],
         async_mode="eventlet",
+        # Needed to fan events out across workers when running more than one
+        message_queue=os.environ.get("SOCKETIO_MESSAGE_QUEUE"),
     )
 
     # Register error handlers
     register_error_handlers(app)
 
+    # Background work starts once init_app has given socketio its server
+    # Index transcripts written before search existed, without delaying startup
+    socketio.start_background_task(backfill_search_index)
+    # Finish Firebase uploads interrupted by the last shutdown (each claimed by one worker)
+    resume_storage_uploads()
+    # Turn Storage-prefix folders into virtual folders (once per user)
+    socketio.start_background_task(migrate_all_users)
+    # Permanently delete trash past its retention period
+    start_trash_purger()
+    # Check doc_store, local disk and Firebase against each other
+    start_reconciler()
+    # Bring the local audio cache under its size cap
+    socketio.start_background_task(audio_cache.trim)
+
+    startup_ms = (time.perf_counter() - _STARTED_AT) * 1000
+    logger.info(
+        f"Cold start: ready to serve in {startup_ms:.0f} ms"
+        f" (doc store: {len(doc_store)} documents loaded in {(doc_store_seconds or 0) * 1000:.0f} ms)"
+    )
+
     return app
 
 
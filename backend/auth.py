@@ -1,8 +1,8 @@
-import firebase_admin
 from firebase_admin import auth
 from flask import request, jsonify
 from functools import wraps
 from config import ADMIN_UIDS
+from services.firebase_client import get_app
 
 
 def verify_firebase_token(fn):
@@ -16,7 +16,7 @@ def verify_firebase_token(fn):
             return jsonify({"error": "Invalid authorization header"}), 401
         token = parts[1]
         try:
-            decoded_token = auth.verify_id_token(token)
+            decoded_token = auth.verify_id_token(token, app=get_app())
             request.uid = decoded_token.get("uid")
             request.user_email = decoded_token.get("email")
         except Exception as e:
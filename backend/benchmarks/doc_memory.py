@@ -0,0 +1,86 @@
+# backend/benchmarks/doc_memory.py
+"""
+Memory benchmark: free-form dict records vs slotted Document records.
+
+Builds a doc_store-sized mapping of realistic metadata records both ways and
+reports the resident size per document, as measured by tracemalloc.
+
+Usage (from backend/):
+    python -m benchmarks.doc_memory                 # 10k, 100k and 1M docs
+    python -m benchmarks.doc_memory 10000 50000
+"""
+import sys
+import os
+import gc
+import tracemalloc
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.doc_record import Document
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+STATUSES = ("pending", "in_progress", "completed", "failed")
+
+
+def make_record(n, owners):
+    """A record as load_doc_store or an upload produces it: fresh string objects"""
+    owner = f"uid-{n % owners:028d}"
+    filename = f"{n:08x}-4c1e-9a7b-recording.mp3"
+    return {
+        "id": f"{n:08x}-5d2e-4f6a-8b9c-0123456789ab",
+        "name": f"Doc{n}",
+        "audioFilename": filename,
+        "originalFilename": f"recording {n}.mp3",
+        "audioTrashed": False,
+        "deleted": False,
+        "owner": owner,
+        "firebaseUrl": f"https://storage.googleapis.com/bucket/users/{owner}/uploads/{filename}",
+        "firebasePath": f"users/{owner}/uploads/{filename}",
+        "localPath": f"/srv/yapper/uploads/{filename}",
+        "transcription_status": "".join(STATUSES[n % len(STATUSES)]),
+        "is_replicate": False,
+        "requires_prompt": False,
+        "createdAt": f"2025-01-01T00:00:00.{n % 1000:03d}+00:00",
+        "updatedAt": f"2025-01-02T00:00:00.{n % 1000:03d}+00:00",
+        "version": 1,
+    }
+
+
+def measure(count, build):
+    """Return bytes allocated by the store that build(count) creates"""
+    gc.collect()
+    tracemalloc.start()
+    store = build(count)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    gc.collect()
+    return size
+
+
+def build_dicts(count):
+    owners = max(1, count // 100)
+    return {record["id"]: record for record in (make_record(n, owners) for n in range(count))}
+
+
+def build_documents(count):
+    owners = max(1, count // 100)
+    store = {}
+    for n in range(count):
+        doc = Document.from_dict(make_record(n, owners))
+        store[doc.id] = doc
+    return store
+
+
+def main(sizes):
+    print(f"{'docs':>10} {'dict MB':>10} {'Document MB':>12} {'B/doc dict':>11} {'B/doc Doc':>10} {'saved':>6}")
+    for count in sizes:
+        dict_bytes = measure(count, build_dicts)
+        doc_bytes = measure(count, build_documents)
+        print(
+            f"{count:>10} {dict_bytes / 2**20:>10.1f} {doc_bytes / 2**20:>12.1f}"
+            f" {dict_bytes // count:>11} {doc_bytes // count:>10}"
+            f" {1 - doc_bytes / dict_bytes:>6.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
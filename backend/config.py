@@ -46,6 +46,107 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 UPLOAD_FOLDER = normalize_path(os.path.join(BASE_DIR, "uploads"))
 TRASH_FOLDER = normalize_path(os.path.join(BASE_DIR, "trash"))
 DOC_STORE_FILE = normalize_path(os.path.join(BASE_DIR, "doc_store.json"))
+# "binary" keeps doc_store in a memory-mapped snapshot (DOC_STORE_SNAPSHOT) and
+# only reads doc_store.json to migrate it; "json" keeps using doc_store.json
+DOC_STORE_FORMAT = os.environ.get("YAPPER_DOC_STORE_FORMAT", "binary")
+DOC_STORE_SNAPSHOT = normalize_path(os.path.join(BASE_DIR, "doc_store.bin"))
+# Memory-map the snapshot when loading instead of reading it into memory first
+DOC_STORE_MMAP = os.environ.get("YAPPER_DOC_STORE_MMAP", "true").lower() == "true"
+CONTENT_STORE_DIR = normalize_path(os.path.join(BASE_DIR, "doc_content"))
+VERSION_HISTORY_DIR = normalize_path(os.path.join(BASE_DIR, "doc_history"))
+# Transcript versions between full snapshots in the version history
+VERSION_SNAPSHOT_INTERVAL = int(os.environ.get("YAPPER_VERSION_SNAPSHOT_INTERVAL", "20"))
+SEARCH_INDEX_DB = normalize_path(
+    os.environ.get("YAPPER_SEARCH_INDEX_DB", os.path.join(BASE_DIR, "search_index.db"))
+)
+
+# Shared state: "local" (single process, doc_store.json), "sqlite" (several
+# workers on one host), "memory" (in-process stand-in for a network store)
+# or "package.module:ClassName" for a custom StateBackend
+STATE_BACKEND = os.environ.get("YAPPER_STATE_BACKEND", "local")
+SHARED_STATE_DB = normalize_path(
+    os.environ.get("YAPPER_SHARED_STATE_DB", os.path.join(BASE_DIR, "shared_state.db"))
+)
+# How often (seconds) a worker pulls changes made by other workers
+SHARED_STATE_SYNC_INTERVAL = float(os.environ.get("YAPPER_SHARED_STATE_SYNC_INTERVAL", "0.5"))
+# Transcripts, version history and the search index stay on local disk, so
+# shared state is pinned to one host; set this only when every host mounts
+# the same data directories (BASE_DIR) from a shared filesystem
+SHARED_STATE_MULTI_HOST = os.environ.get("YAPPER_SHARED_STATE_MULTI_HOST", "false").lower() == "true"
+
+# Serve Firebase Storage listings from a local index kept up to date by our
+# own uploads/moves/deletes (see services/blob_index.py)
+BLOB_LISTING_INDEX = os.environ.get("YAPPER_BLOB_LISTING_INDEX", "false").lower() == "true"
+# Seconds a complete listing is served from the index before the bucket is listed again
+BLOB_LISTING_INDEX_TTL = int(os.environ.get("YAPPER_BLOB_LISTING_INDEX_TTL", "3600"))
+
+# Blob existence/metadata cache: seconds an answer is reused, shorter for
+# "does not exist" since another worker may create the blob
+BLOB_CACHE_TTL = float(os.environ.get("YAPPER_BLOB_CACHE_TTL", "60"))
+BLOB_CACHE_NEGATIVE_TTL = float(os.environ.get("YAPPER_BLOB_CACHE_NEGATIVE_TTL", "5"))
+BLOB_CACHE_MAX_ENTRIES = int(os.environ.get("YAPPER_BLOB_CACHE_MAX_ENTRIES", "10000"))
+
+# Signed download URLs are reused while more than this many seconds of
+# validity remain
+SIGNED_URL_SAFETY_MARGIN = int(os.environ.get("YAPPER_SIGNED_URL_SAFETY_MARGIN", "300"))
+SIGNED_URL_CACHE_MAX_ENTRIES = int(os.environ.get("YAPPER_SIGNED_URL_CACHE_MAX_ENTRIES", "10000"))
+
+# Resumable uploads to Firebase Storage: bytes per request (rounded up to a
+# multiple of 256 KiB), seconds each request may take, and seconds failed
+# requests are retried before the upload fails
+UPLOAD_CHUNK_SIZE = int(os.environ.get("YAPPER_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_REQUEST_TIMEOUT = int(os.environ.get("YAPPER_UPLOAD_REQUEST_TIMEOUT", "60"))
+UPLOAD_RETRY_TIMEOUT = int(os.environ.get("YAPPER_UPLOAD_RETRY_TIMEOUT", "600"))
+
+# Attempts of the background upload of a recording before it is marked failed
+STORAGE_UPLOAD_ATTEMPTS = int(os.environ.get("YAPPER_STORAGE_UPLOAD_ATTEMPTS", "3"))
+
+# Trash: days before trashed documents are deleted for good, seconds between
+# purger runs, and documents purged per batch
+TRASH_RETENTION_DAYS = int(os.environ.get("YAPPER_TRASH_RETENTION_DAYS", "30"))
+TRASH_PURGE_INTERVAL = int(os.environ.get("YAPPER_TRASH_PURGE_INTERVAL", "3600"))
+TRASH_PURGE_BATCH = int(os.environ.get("YAPPER_TRASH_PURGE_BATCH", "100"))
+
+# Local audio in UPLOAD_FOLDER is a cache of Firebase Storage capped at this
+# many bytes; least recently used files are evicted and downloaded again on use
+AUDIO_CACHE_MAX_BYTES = int(os.environ.get("YAPPER_AUDIO_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+
+# Concurrent Storage requests of bulk operations (deletes go in batches of 100 blobs)
+BULK_DELETE_WORKERS = int(os.environ.get("YAPPER_BULK_DELETE_WORKERS", "8"))
+
+# Most documents one POST /api/docs/bulk request may change
+BULK_MAX_DOCS = int(os.environ.get("YAPPER_BULK_MAX_DOCS", "1000"))
+
+# Where audio blobs are stored: "firebase" (Firebase Storage) or "local"
+# (LOCAL_STORAGE_ROOT on this host, served by signed /api/storage URLs)
+STORAGE_BACKEND = os.environ.get("YAPPER_STORAGE_BACKEND", "firebase")
+LOCAL_STORAGE_ROOT = normalize_path(
+    os.environ.get("YAPPER_LOCAL_STORAGE_ROOT", os.path.join(BASE_DIR, "storage"))
+)
+# Base of the local backend's signed URLs (an absolute URL if the frontend is on another origin)
+LOCAL_STORAGE_URL = os.environ.get("YAPPER_LOCAL_STORAGE_URL", "/api/storage")
+# Key of the local backend's URL signatures; without one a random key is
+# generated on first start and kept in STORAGE_URL_SECRET_FILE
+STORAGE_URL_SECRET = os.environ.get("YAPPER_STORAGE_URL_SECRET", os.environ.get("SECRET_KEY"))
+STORAGE_URL_SECRET_FILE = normalize_path(
+    os.environ.get("YAPPER_STORAGE_URL_SECRET_FILE", os.path.join(BASE_DIR, "storage_url_secret"))
+)
+
+# Direct uploads (POST /api/uploads): seconds a signed upload URL is valid
+# and the largest recording that may be uploaded that way
+DIRECT_UPLOAD_EXPIRATION = int(os.environ.get("YAPPER_DIRECT_UPLOAD_EXPIRATION", "3600"))
+DIRECT_UPLOAD_MAX_BYTES = int(os.environ.get("YAPPER_DIRECT_UPLOAD_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Mirror transcription chunks to Firestore (transcriptions/<doc_id>/chunks)
+FIRESTORE_TRANSCRIPT_MIRROR = os.environ.get("YAPPER_FIRESTORE_TRANSCRIPT_MIRROR", "false").lower() == "true"
+
+# Connections kept open by the shared Firebase Storage client
+FIREBASE_HTTP_POOL_SIZE = int(os.environ.get("YAPPER_FIREBASE_HTTP_POOL_SIZE", "32"))
+
+# Seconds between reconciliation runs of doc_store, local disk and Firebase
+RECONCILE_INTERVAL = int(os.environ.get("YAPPER_RECONCILE_INTERVAL", "300"))
+# Blobs listed per reconciliation run; a sweep of the bucket spans several runs
+RECONCILE_LIST_BATCH = int(os.environ.get("YAPPER_RECONCILE_LIST_BATCH", "5000"))
 
 # Web config
 HOST = "0.0.0.0"
@@ -67,7 +168,11 @@ logger.info(f"Platform detected: {platform.system()} {'(WSL)' if IS_WSL else ''}
 logger.info(f"Base directory: {BASE_DIR}")
 logger.info(f"Upload folder: {UPLOAD_FOLDER}")
 logger.info(f"Trash folder: {TRASH_FOLDER}")
-logger.info(f"Doc store file: {DOC_STORE_FILE}")
+logger.info(f"Doc store file: {DOC_STORE_SNAPSHOT if DOC_STORE_FORMAT == 'binary' else DOC_STORE_FILE}")
+logger.info(f"Content store directory: {CONTENT_STORE_DIR}")
+logger.info(f"Search index: {SEARCH_INDEX_DB}")
+logger.info(f"Version history directory: {VERSION_HISTORY_DIR}")
+logger.info(f"State backend: {STATE_BACKEND}")
 
 
 # Ensure necessary directories exist
@@ -2,104 +2,29 @@
 """
 Robust Firebase helper with proper initialization and error handling
 """
-import os
 import logging
 import uuid
 import json
-import signal
 from datetime import datetime, timedelta
-import firebase_admin
-from firebase_admin import credentials, storage, firestore
+from firebase_admin import firestore
+from services import firebase_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global state
-db = None
-bucket = None
-firebase_available = False
+# Shared clients; Firebase is initialized by the first storage call
+db = firebase_client.db
+bucket = firebase_client.bucket
 
-# Class to handle timeouts
-class TimeoutError(Exception):
-    pass
-
-def timeout_handler(signum, frame):
-    raise TimeoutError("Firebase initialization timed out")
-
-def initialize_firebase(timeout=10):
+def initialize_firebase():
     """
-    Initialize Firebase with timeout and error handling
+    Initialize Firebase now instead of on first use
     
-    Args:
-        timeout: Maximum seconds to wait for initialization
-        
     Returns:
-        bool: True if initialization successful
+        bool: True if Firebase is available
     """
-    global db, bucket, firebase_available
-    
-    # Set up timeout handler
-    signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(timeout)
-    
-    try:
-        # First check if already initialized
-        if firebase_admin._apps:
-            logger.info("Firebase already initialized")
-            db = firestore.client()
-            bucket = storage.bucket()
-            firebase_available = True
-            signal.alarm(0)  # Cancel alarm
-            return True
-        
-        # Look for credentials file in multiple locations
-        cred_paths = [
-            os.path.join(os.getcwd(), "Accesskey.json"),
-            "Accesskey.json"
-        ]
-        
-        cred_file = None
-        for path in cred_paths:
-            if os.path.exists(path):
-                logger.info(f"Found credentials at: {path}")
-                cred_file = path
-                break
-        
-        if not cred_file:
-            logger.error("Could not find Firebase credentials file")
-            signal.alarm(0)  # Cancel alarm
-            return False
-        
-        # Load credentials and initialize app
-        logger.info(f"Initializing Firebase with credentials from: {cred_file}")
-        cred = credentials.Certificate(cred_file)
-        firebase_admin.initialize_app(cred, {
-            'storageBucket': 'yapper-1958d.firebasestorage.app'
-        })
-        
-        # Initialize clients
-        db = firestore.client()
-        bucket = storage.bucket()
-        
-        # Simple connectivity test
-        logger.info("Testing Firebase connection...")
-        db.collection('_test_').document('_connection_test').get()
-        
-        firebase_available = True
-        logger.info("Firebase initialized successfully")
-        return True
-    
-    except TimeoutError:
-        logger.error(f"Firebase initialization timed out after {timeout} seconds")
-        return False
-    
-    except Exception as e:
-        logger.error(f"Firebase initialization error: {e}")
-        return False
-    
-    finally:
-        signal.alarm(0)  # Cancel alarm
+    return firebase_client.get_app() is not None
 
 def upload_file(file, user_id=None):
     """
@@ -112,7 +37,7 @@ def upload_file(file, user_id=None):
     Returns:
         dict: Upload result with success status
     """
-    if not firebase_available:
+    if not bucket:
         logger.warning("Firebase not available for upload")
         return {"message": "Firebase not available", "success": False}
     
@@ -172,8 +97,5 @@ def upload_file(file, user_id=None):
         logger.error(f"Firebase upload error: {e}")
         return {"message": f"Firebase upload error: {e}", "success": False}
 
-# Initialize Firebase at module import with 15 second timeout
-firebase_available = initialize_firebase(timeout=15)
-
 # Other methods like delete_audio, is_admin_user, etc. would go here
 # ...
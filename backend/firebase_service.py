@@ -2,56 +2,24 @@
 Firebase service for Yapper application
 Handles authentication, storage, and user-based access control
 """
-import os
 import uuid
 import logging
 import datetime
 from pathlib import Path
-import firebase_admin
-from firebase_admin import credentials, storage, firestore, auth
-from firebase_config import FIREBASE_SERVICE_ACCOUNT_KEY, FIREBASE_STORAGE_BUCKET, ADMIN_USER_IDS
+from firebase_admin import firestore, auth
+from firebase_config import ADMIN_USER_IDS
+from services import firebase_client
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Firebase clients
-bucket = None
-db = None
-firebase_app = None
+# Firebase clients, created on first use by services.firebase_client
+bucket = firebase_client.bucket
+db = firebase_client.db
 
 def initialize_firebase():
-    """Initialize Firebase Admin SDK with service account credentials"""
-    global bucket, db, firebase_app
-    
-    if not firebase_admin._apps:
-        try:
-            # Check if service account key file exists
-            if not os.path.exists(FIREBASE_SERVICE_ACCOUNT_KEY):
-                logger.error(f"Firebase service account key not found: {FIREBASE_SERVICE_ACCOUNT_KEY}")
-                return False
-                
-            # Initialize with service account
-            cred = credentials.Certificate(FIREBASE_SERVICE_ACCOUNT_KEY)
-            firebase_app = firebase_admin.initialize_app(cred, {
-                'storageBucket': FIREBASE_STORAGE_BUCKET
-            })
-            
-            # Initialize services
-            bucket = storage.bucket()
-            db = firestore.client()
-            
-            logger.info("Firebase initialized successfully")
-            return True
-        except Exception as e:
-            logger.error(f"Error initializing Firebase: {e}")
-            return False
-    else:
-        # Already initialized, ensure clients are set
-        if not bucket:
-            bucket = storage.bucket()
-        if not db:
-            db = firestore.client()
-        return True
+    """Initialize Firebase now instead of on first use; returns whether it is available"""
+    return firebase_client.get_app() is not None
 
 def is_admin(user_id):
     """Check if user is an admin"""
@@ -478,13 +446,14 @@ def verify_token(id_token):
     Returns:
         dict: User data if valid, None otherwise
     """
-    if not firebase_app:
+    app = firebase_client.get_app()
+    if app is None:
         logger.error("Firebase not initialized")
         return None
         
     try:
         # Verify the token
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = auth.verify_id_token(id_token, app=app)
         user_id = decoded_token.get('uid')
         email = decoded_token.get('email', '')
         
@@ -496,6 +465,3 @@ def verify_token(id_token):
     except Exception as e:
         logger.error(f"Error verifying token: {e}")
         return None
-
-# Initialize on import
-initialize_firebase()
@@ -1,38 +1,84 @@
 # backend/routes/docmanage.py
-import os
 import uuid
 import logging
 from flask import request, jsonify, Blueprint
-from config import UPLOAD_FOLDER, TRASH_FOLDER
-from services.storage import save_doc_store, doc_store
-from services.firebase_service import move_file, check_blob_exists
+from services.storage import save_doc_store, doc_store, doc_index
+from services.doc_store import VersionConflict
+from services.content_store import load_content, save_content, with_content
+from services.transcript_builder import is_transcribing
+from services.search_index import index_document
+from services.version_history import record_version, list_versions, get_version
+from services.doc_index import InvalidQuery, HOME_FOLDER, project
+from services.trash import delete_changes
+from services.doc_bulk import BulkError, apply_bulk
+from services.socketio_instance import socketio
 from auth import verify_firebase_token, is_admin
 
 logger = logging.getLogger(__name__)
 
 docmanage_bp = Blueprint('docmanage', __name__)
 
+# Query parameters that switch /api/docs to the paginated response
+PAGINATION_PARAMS = ("limit", "cursor", "sort", "order", "fields", "status", "folder",
+                     "trashed", "created_after", "created_before", "updated_after", "updated_before")
+
 @docmanage_bp.route('/api/docs', methods=['GET'])
 @verify_firebase_token
 def list_docs():
-    """Return only non-deleted documents for the authenticated user that are not in any folder."""
+    """Return only non-deleted documents for the authenticated user that are not in any folder.
+    Records are metadata only; transcript bodies are loaded by get_doc.
+
+    When any paging parameter is given the response is a page instead:
+    {"docs": [...], "nextCursor": str | null}, served from doc_index.
+    """
+    if any(param in request.args for param in PAGINATION_PARAMS):
+        return list_docs_page()
+
     if not doc_store:
         return jsonify([]), 200
 
     active_docs = [
-        d for d in doc_store.values()
-        if not d.get("deleted", False) and not d.get("folderName") and (d.get("owner") == request.uid or is_admin(request.uid))
+        d.to_dict() for d in doc_store.values()
+        if not d.deleted and not d.folderName and (d.owner == request.uid or is_admin(request.uid))
     ]
     return jsonify(active_docs), 200
 
+def list_docs_page():
+    """Cursor-paginated, filtered and sorted listing with optional field projection"""
+    args = request.args
+    trashed_arg = args.get("trashed", "false").lower()
+    trashed = None if trashed_arg == "any" else trashed_arg == "true"
+    fields = [f for f in args.get("fields", "").split(",") if f]
+
+    try:
+        doc_ids, next_cursor = doc_index.query(
+            owner=None if is_admin(request.uid) else request.uid,
+            folder=args.get("folder", HOME_FOLDER),
+            trashed=trashed,
+            status=args.get("status"),
+            created_after=args.get("created_after"),
+            created_before=args.get("created_before"),
+            updated_after=args.get("updated_after"),
+            updated_before=args.get("updated_before"),
+            sort=args.get("sort", "createdAt"),
+            order=args.get("order", "desc"),
+            cursor=args.get("cursor"),
+            limit=args.get("limit", 50),
+        )
+    except (InvalidQuery, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    docs = [project(doc, fields) for doc in map(doc_store.get, doc_ids) if doc]
+    return jsonify({"docs": docs, "nextCursor": next_cursor}), 200
+
 @docmanage_bp.route('/api/docs/<doc_id>', methods=['GET'])
 @verify_firebase_token
 def get_doc(doc_id):
     """Retrieve a specific document by ID for the authenticated user"""
     d = doc_store.get(doc_id)
-    if not d or d.get("deleted") or (d.get("owner") != request.uid and not is_admin(request.uid)):
+    if not d or d.deleted or (d.owner != request.uid and not is_admin(request.uid)):
         return jsonify({"error": "Doc not found"}), 404
-    return jsonify(d), 200
+    return jsonify(with_content(d)), 200
 
 @docmanage_bp.route('/api/docs', methods=['POST'])
 @verify_firebase_token
@@ -46,7 +92,6 @@ def create_doc():
     doc_obj = {
         "id": doc_id,
         "name": name,
-        "content": content,
         "audioFilename": None,
         "originalFilename": None,
         "audioTrashed": False,
@@ -54,90 +99,156 @@ def create_doc():
         "owner": request.uid
     }
 
-    doc_store[doc_id] = doc_obj
+    doc_obj = doc_store.insert(doc_obj)
+    save_content(doc_id, content=content, segments=[])
+    index_document(doc_id, request.uid, content)
     save_doc_store()
-    return jsonify(doc_obj), 201
+    return jsonify(with_content(doc_obj)), 201
+
+@docmanage_bp.route('/api/docs/bulk', methods=['POST'])
+@verify_firebase_token
+def bulk_docs():
+    """Move, trash, restore or permanently delete many documents in one request.
+
+    Body: {"ids": [...], "operation": "move" | "trash" | "restore" | "delete",
+    "folder": name or null (move only)}. Returns one result per document.
+    Only documents in the trash can be deleted.
+    """
+    data = request.json or {}
+    try:
+        results = apply_bulk(
+            request.uid, data.get("ids"), data.get("operation"),
+            folder=data.get("folder"), admin=is_admin(request.uid),
+        )
+    except BulkError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in bulk {data.get('operation')}: {e}")
+        return jsonify({"error": "Bulk operation failed"}), 500
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    return jsonify({
+        "operation": data["operation"],
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+    }), 200
+
+def _expected_version(value):
+    """Version a write was based on (a body "version" or an If-Match header), or None
+
+    Raises:
+        ValueError: If the value is not an integer
+    """
+    if value is None:
+        return None
+    return int(str(value).strip('"'))
 
 @docmanage_bp.route('/api/docs/<doc_id>', methods=['PUT'])
 @verify_firebase_token
 def update_doc(doc_id):
-    """Update an existing document"""
+    """Update an existing document.
+
+    Clients may send the "version" they last saw (in the body or an If-Match
+    header); the write is then rejected with 409 if the doc changed since.
+    """
     data = request.json or {}
     doc = doc_store.get(doc_id)
-    if not doc or doc.get("deleted") or (doc.get("owner") != request.uid and not is_admin(request.uid)):
+    if not doc or doc.deleted or (doc.owner != request.uid and not is_admin(request.uid)):
         return jsonify({"error": "Doc not found"}), 404
 
-    doc["name"] = data.get("name", doc.get("name"))
-    doc["content"] = data.get("content", doc.get("content"))
+    try:
+        expected_version = _expected_version(data.get("version", request.headers.get("If-Match")))
+    except ValueError:
+        return jsonify({"error": "Invalid version"}), 400
+    if "content" in data and is_transcribing(doc_id):
+        return jsonify({"error": "Transcription in progress", "version": doc.version}), 409
+    changes = {"name": data["name"]} if "name" in data else {}
 
-    save_doc_store()
-    return jsonify(doc), 200
+    if changes or "content" in data:
+        previous = doc
+        try:
+            doc = doc_store.patch(doc_id, changes, expected_version=expected_version)
+        except VersionConflict as e:
+            return jsonify({"error": "Version conflict", "version": e.current}), 409
+        if "content" in data:
+            old = load_content(doc_id)
+            body = save_content(doc_id, content=data["content"], segments=old["segments"])
+            index_document(doc_id, doc.owner, body["content"], body["segments"])
+            record_version(doc_id, doc.version, body["content"], request.uid,
+                           previous=(previous.version, old["content"]))
+        save_doc_store()
+
+    return jsonify(with_content(doc)), 200
 
 @docmanage_bp.route('/api/docs/<doc_id>', methods=['DELETE'])
 @verify_firebase_token
 def delete_doc(doc_id):
     """Soft delete a document and mark its file as trashed"""
     d = doc_store.get(doc_id)
-    if not d or d.get("deleted") or (d.get("owner") != request.uid and not is_admin(request.uid)):
+    if not d or d.deleted or (d.owner != request.uid and not is_admin(request.uid)):
         return jsonify({"message": "Doc not found"}), 404
 
-    d["deleted"] = True
-    filename = d.get("audioFilename")
-    
-    if filename and not d.get("audioTrashed"):
-        # Move the file to trash in Firebase with permission check
-        uid = d.get("owner")
-        upload_path = f"users/{uid}/uploads/{filename}"
-        trash_path = f"users/{uid}/trash/{filename}"
-        
-        try:
-            # First check if file exists in uploads
-            file_exists_in_uploads = check_blob_exists(upload_path)
-            
-            # If file doesn't exist in uploads, check if it's already in trash
-            file_exists_in_trash = False
-            if not file_exists_in_uploads:
-                file_exists_in_trash = check_blob_exists(trash_path)
-            
-            # Move in Firebase if it exists in uploads
-            firebase_moved = False
-            if file_exists_in_uploads:
-                firebase_moved = move_file(upload_path, trash_path, request.uid)
-                logger.info(f"Firebase move result: {firebase_moved}")
-            elif file_exists_in_trash:
-                # File already in trash
-                firebase_moved = True
-                logger.info(f"File {filename} already in trash")
-            
-            # Try to move local file if it exists
-            local_moved = False
-            try:
-                local_upload_path = os.path.join(UPLOAD_FOLDER, filename)
-                local_trash_path = os.path.join(TRASH_FOLDER, filename)
-                if (os.path.exists(local_upload_path)):
-                    os.makedirs(os.path.dirname(local_trash_path), exist_ok=True)
-                    os.rename(local_upload_path, local_trash_path)
-                    local_moved = True
-                    logger.info(f"Moved local file to trash: {filename}")
-                elif os.path.exists(local_trash_path):
-                    # File already in local trash
-                    local_moved = True
-                    logger.info(f"File {filename} already in local trash")
-            except Exception as local_err:
-                logger.error(f"Error moving local file to trash: {local_err}")
-            
-            # Update document status if either operation succeeded or file was already in trash
-            if firebase_moved or local_moved:
-                d["audioTrashed"] = True
-                logger.info(f"Moved file to trash: {filename}")
-            else:
-                logger.error(f"Failed to move file to trash: {filename}")
-        except Exception as e:
-            logger.error(f"Error moving file to trash: {e}")
-    
+    # Trash is a flag: the audio stays where it is until the purger deletes it
+    doc_store.patch(doc_id, delete_changes(d))
     save_doc_store()
     return jsonify({"message": "Doc deleted"}), 200
 
+@docmanage_bp.route('/api/docs/<doc_id>/versions', methods=['GET'])
+@verify_firebase_token
+def get_doc_versions(doc_id):
+    """List the recorded transcript versions of a document, newest first"""
+    d = doc_store.get(doc_id)
+    if not d or d.deleted or (d.owner != request.uid and not is_admin(request.uid)):
+        return jsonify({"error": "Doc not found"}), 404
+    return jsonify({"versions": list_versions(doc_id), "current": d.version}), 200
+
+@docmanage_bp.route('/api/docs/<doc_id>/versions/<int:version>', methods=['GET'])
+@verify_firebase_token
+def get_doc_version(doc_id, version):
+    """Return the transcript text of one recorded version"""
+    d = doc_store.get(doc_id)
+    if not d or d.deleted or (d.owner != request.uid and not is_admin(request.uid)):
+        return jsonify({"error": "Doc not found"}), 404
+    content = get_version(doc_id, version)
+    if content is None:
+        return jsonify({"error": "Version not found"}), 404
+    return jsonify({"version": version, "content": content}), 200
+
+@docmanage_bp.route('/api/docs/<doc_id>/versions/<int:version>/restore', methods=['POST'])
+@verify_firebase_token
+def restore_doc_version(doc_id, version):
+    """Make an old transcript version the current one (recorded as a new version)"""
+    d = doc_store.get(doc_id)
+    if not d or d.deleted or (d.owner != request.uid and not is_admin(request.uid)):
+        return jsonify({"error": "Doc not found"}), 404
+    content = get_version(doc_id, version)
+    if content is None:
+        return jsonify({"error": "Version not found"}), 404
+    if is_transcribing(doc_id):
+        return jsonify({"error": "Transcription in progress", "version": d.version}), 409
+
+    try:
+        expected_version = _expected_version((request.get_json(silent=True) or {}).get("version"))
+    except ValueError:
+        return jsonify({"error": "Invalid version"}), 400
+    try:
+        doc = doc_store.patch(doc_id, {}, expected_version=expected_version)
+    except VersionConflict as e:
+        return jsonify({"error": "Version conflict", "version": e.current}), 409
+    body = save_content(doc_id, content=content)
+    index_document(doc_id, doc.owner, content, body["segments"])
+    record_version(doc_id, doc.version, content, request.uid, restoredFrom=version)
+    save_doc_store()
+
+    # Let open editors pick up the restored text
+    socketio.emit("doc_content_update", {
+        "doc_id": doc_id,
+        "content": content,
+        "segments": body["segments"],
+        "version": doc.version,
+    }, room=doc_id)
+    return jsonify(with_content(doc)), 200
+
 def register_docmanage_routes(app):
     """Register document management routes with Flask app"""
     app.register_blueprint(docmanage_bp)
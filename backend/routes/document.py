@@ -1,16 +1,29 @@
 import os
 import uuid
 import logging
-import re
 from pathlib import Path
 from flask import request, jsonify, Blueprint, send_from_directory, Response
 from pydub import AudioSegment
 from transcribe import chunked_transcribe_audio
 from config import UPLOAD_FOLDER, TRASH_FOLDER
-from services.storage import save_doc_store, doc_store, doc_counter
+from services.storage import save_doc_store, doc_store, next_doc_number
+from services.doc_store import VersionConflict
+from services.content_store import save_content
+from services.doc_record import TranscriptionStatus, StorageStatus
+from services.storage_upload import start_storage_upload
+from services.audio_cache import audio_cache
+from services.blob_store import save_upload, blob_path, blob_refs, audio_storage_path
+from services.direct_upload import create_upload, complete_upload, UploadError
+from services.search_index import index_document, start_document, append_text
+from services.transcript_builder import (
+    start_transcript, get_builder, discard_transcript, normalize_transcript,
+)
+from services.version_history import record_version
+from services.transcript_mirror import mirror_transcription
+from services.job_registry import start_job, update_job
 from services.socketio_instance import socketio
 from auth import verify_firebase_token, is_admin
-from Firestore_implementation import upload_file_by_path, get_signed_url
+from services.storage_backend import get_signed_url
 from routes.user_settings import user_settings_store
 from dotenv import load_dotenv
 
@@ -21,57 +34,86 @@ logger = logging.getLogger(__name__)
 
 document_bp = Blueprint('document', __name__)
 
+# Seconds of audio per local transcription chunk; chunk i covers [(i-1)*N, i*N)
+TRANSCRIBE_CHUNK_SECONDS = 30
+
+def _audio_doc(filename):
+    """The user's document for an audio file, or an error response.
+    Content-addressed audio can be shared by documents of several users."""
+    docs = [doc for doc in doc_store.values() if doc.audioFilename == filename]
+    for doc in docs:
+        if doc.owner == request.uid:
+            return doc, None
+    if docs and is_admin(request.uid):
+        return docs[0], None
+    if docs:
+        return None, (jsonify({"error": "Access denied"}), 403)
+    return None, None
+
 @document_bp.route('/api/audio/<filename>', methods=['GET'])
 @verify_firebase_token
 def get_audio_file(filename):
-    for doc in doc_store.values():
-        if doc.get("audioFilename") == filename:
-            if doc.get("owner") != request.uid and not is_admin(request.uid):
-                return jsonify({"error": "Access denied"}), 403
-            uid = doc.get("owner")
-            firebase_path = f"users/{uid}/uploads/{filename}"
-            try:
-                url = get_signed_url(firebase_path)
-                if url:
-                    return jsonify({"url": url}), 200
-                else:
-                    return jsonify({"error": "Could not get file access"}), 403
-            except Exception as e:
-                logger.error(f"Error getting signed URL: {e}")
-                return jsonify({"error": "Could not get file", "details": str(e)}), 500
+    doc, error = _audio_doc(filename)
+    if error:
+        return error
+    if doc:
+        try:
+            url = get_signed_url(audio_storage_path(doc))
+            if url:
+                return jsonify({"url": url}), 200
+            else:
+                return jsonify({"error": "Could not get file access"}), 403
+        except Exception as e:
+            logger.error(f"Error getting signed URL: {e}")
+            return jsonify({"error": "Could not get file", "details": str(e)}), 500
     return jsonify({"error": "File not found"}), 404
 
 @document_bp.route('/local-audio/<filename>')
 @verify_firebase_token
 def serve_local_audio(filename):
-    for doc in doc_store.values():
-        if doc.get("audioFilename") == filename:
-            if doc.get("owner") != request.uid and not is_admin(request.uid):
-                return jsonify({"error": "Access denied"}), 403
-            upload_path = Path(UPLOAD_FOLDER)
-            local_path = upload_path / filename
-            if local_path.exists():
-                try:
-                    return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=False, mimetype="audio/mpeg")
-                except Exception as e:
-                    logger.error(f"Error serving local file: {e}")
-            uid = doc.get("owner")
-            firebase_path = f"users/{uid}/uploads/{filename}"
+    doc, error = _audio_doc(filename)
+    if error:
+        return error
+    if doc:
+        storage_path = audio_storage_path(doc)
+        # Evicted files are downloaded back into the local cache
+        local_path = audio_cache.get_path(filename, storage_path)
+        if local_path:
             try:
-                url = get_signed_url(firebase_path)
-                if url:
-                    return jsonify({"url": url}), 200
-                else:
-                    return jsonify({"error": "Could not access file"}), 403
+                response = send_from_directory(UPLOAD_FOLDER, filename, as_attachment=False, mimetype="audio/mpeg")
+                audio_cache.note_served(os.path.getsize(local_path))
+                return response
             except Exception as e:
-                logger.error(f"Error getting signed URL: {e}")
-                return jsonify({"error": "File not accessible", "details": str(e)}), 500
+                logger.error(f"Error serving local file: {e}")
+        try:
+            url = get_signed_url(storage_path)
+            if url:
+                return jsonify({"url": url}), 200
+            else:
+                return jsonify({"error": "Could not access file"}), 403
+        except Exception as e:
+            logger.error(f"Error getting signed URL: {e}")
+            return jsonify({"error": "File not accessible", "details": str(e)}), 500
     return jsonify({"error": "File not found or access denied"}), 404
 
+def _replicate_job_settings(uid, transcription_config, transcription_prompt):
+    """Settings of a Replicate transcription job for a user"""
+    # Get API key from env or user settings
+    api_key = os.environ.get("REPLICATE_API_TOKEN") or transcription_config.get("replicateApiKey", "")
+    if not api_key:
+        logger.warning(f"No Replicate API key found for user {uid}. Using empty key.")
+    else:
+        logger.info(f"Using Replicate API key (first 5 chars): {api_key[:5]}")
+    
+    return {
+        "replicateApiKey": api_key,
+        "whisperModel": transcription_config.get("whisperModel", "medium"),
+        "transcriptionPrompt": transcription_prompt
+    }
+
 @document_bp.route('/upload-audio', methods=['POST'])
 @verify_firebase_token
 def upload_audio():
-    global doc_counter
     if 'audio' not in request.files:
         return jsonify({"error": "No audio file found"}), 400
     
@@ -80,195 +122,240 @@ def upload_audio():
     if not original_filename:
         return jsonify({"error": "Invalid filename"}), 400
     
-    unique_name = f"{uuid.uuid4()}_{original_filename}"
     abs_upload_folder = os.path.abspath(UPLOAD_FOLDER)
-    os.makedirs(abs_upload_folder, exist_ok=True)
-    logger.info(f"Ensured upload directory exists: {abs_upload_folder}")
-    
-    save_path = Path(abs_upload_folder) / unique_name
-    save_path_str = str(save_path)
-    logger.info(f"Attempting to save file to: {save_path_str}")
+    uid = request.uid
+    doc_id = str(uuid.uuid4())
+    unique_name = None
     
     try:
-        # Test write permissions
-        temp_path = save_path.with_suffix('.tmp')
-        with open(temp_path, 'wb') as f:
-            f.write(b'Test')
-        temp_path.unlink()
+        # Stored under its SHA-256: a recording the user uploaded before is not kept twice
+        unique_name, content_hash, file_size, duplicate = save_upload(
+            audio_file.stream, original_filename, uid, doc_id, abs_upload_folder
+        )
+        save_path_str = str(Path(abs_upload_folder) / unique_name)
+        audio_cache.add(unique_name)
         
-        # Save the file
-        audio_file.save(save_path_str)
-        logger.info(f"Successfully saved file locally to: {save_path_str}")
+        if file_size == 0:
+            raise ValueError(f"Uploaded file {original_filename} is empty")
         
-        # Verify file was created correctly
-        if not save_path.exists():
-            raise FileNotFoundError(f"File not created at {save_path_str}")
+        logger.info(f"Stored {original_filename} as {unique_name} ({file_size} bytes"
+                    f"{', duplicate' if duplicate else ''})")
         
-        file_size = save_path.stat().st_size
-        if file_size == 0:
-            raise ValueError(f"File created but has zero size: {save_path_str}")
+        # Content blobs are shared by every document of the user with the same audio
+        firebase_path = blob_path(unique_name)
         
-        logger.info(f"Verified file exists and has size: {file_size} bytes")
+        # Create new document
+        doc_name = f"Doc{next_doc_number()}"
         
-        # Get user ID and prepare Firebase path
-        uid = request.uid
-        firebase_path = f"users/{uid}/uploads/{unique_name}"
+        # Get user transcription settings
+        user_settings = user_settings_store.get(uid, {})
+        transcription_config = user_settings.get("transcriptionConfig", {})
         
-        try:
-            # Upload to Firebase
-            blob = upload_file_by_path(save_path_str, firebase_path)
-            file_url = get_signed_url(firebase_path)
-            logger.info(f"Uploaded to Firebase: {firebase_path}")
-            
-            # Create new document
-            doc_counter += 1
-            doc_id = str(uuid.uuid4())
-            doc_name = f"Doc{doc_counter}"
-            
-            # Get user transcription settings
-            transcription_config = {}
-            if user_settings_store and uid in user_settings_store:
-                user_settings = user_settings_store.get(uid, {})
-                transcription_config = user_settings.get("transcriptionConfig", {})
-            
-            # Determine if using Replicate API
-            is_replicate = transcription_config.get("mode") == "replicate"
-            logger.info(f"Transcription mode detected: {'replicate' if is_replicate else 'local'}")
-            
-            # Get transcription prompt if provided
-            transcription_prompt = request.form.get("transcription_prompt", "")
-            requires_prompt = is_replicate and not transcription_prompt
-            
-            # Create document object
-            doc_obj = {
-                "id": doc_id,
-                "name": doc_name,
-                "content": "",
-                "audioFilename": unique_name,
-                "originalFilename": original_filename,
-                "audioTrashed": False,
-                "deleted": False,
-                "owner": uid,
-                "firebaseUrl": file_url,
-                "firebasePath": firebase_path,
-                "localPath": save_path_str,
-                "transcription_status": "pending",
-                "is_replicate": is_replicate,
-                "requires_prompt": requires_prompt
-            }
-            
-            # Save document to store
-            doc_store[doc_id] = doc_obj
-            save_doc_store()
-            
-            # If using Replicate and no prompt provided, request prompt
-            if requires_prompt:
-                return jsonify({
-                    "message": "File uploaded. Provide a prompt to begin transcription.",
-                    "filename": unique_name,
-                    "doc_id": doc_id,
-                    "requires_prompt": True
-                }), 200
-            
-            # Start transcription based on mode
-            if is_replicate:
-                logger.info(f"Starting Replicate transcription for document {doc_id}")
-                
-                # Get API key from env or user settings
-                api_key = os.environ.get("REPLICATE_API_TOKEN") or transcription_config.get("replicateApiKey", "")
-                if not api_key:
-                    logger.warning(f"No Replicate API key found for user {uid}. Using empty key.")
-                else:
-                    logger.info(f"Using Replicate API key (first 5 chars): {api_key[:5]}")
-                
-                # Prepare settings for transcription job
-                user_settings_for_job = {
-                    "replicateApiKey": api_key,
-                    "whisperModel": transcription_config.get("whisperModel", "medium"),
-                    "transcriptionPrompt": transcription_prompt
-                }
-                
-                # Start background transcription task
-                socketio.start_background_task(
-                    background_replicate_transcription, 
-                    save_path_str, 
-                    doc_id,
-                    user_settings_for_job
-                )
-            else:
-                logger.info(f"Starting local transcription for document {doc_id}")
-                socketio.start_background_task(
-                    background_transcription, 
-                    save_path_str, 
-                    doc_id
-                )
-            
+        # Determine if using Replicate API
+        is_replicate = transcription_config.get("mode") == "replicate"
+        logger.info(f"Transcription mode detected: {'replicate' if is_replicate else 'local'}")
+        
+        # Get transcription prompt if provided
+        transcription_prompt = request.form.get("transcription_prompt", "")
+        requires_prompt = is_replicate and not transcription_prompt
+        
+        # Create document object; firebaseUrl is filled in by the upload job
+        doc_obj = {
+            "id": doc_id,
+            "name": doc_name,
+            "audioFilename": unique_name,
+            "originalFilename": original_filename,
+            "audioTrashed": False,
+            "deleted": False,
+            "owner": uid,
+            "firebaseUrl": None,
+            "firebasePath": firebase_path,
+            "localPath": save_path_str,
+            "contentHash": content_hash,
+            "storage_status": StorageStatus.PENDING,
+            "transcription_status": TranscriptionStatus.PENDING,
+            "is_replicate": is_replicate,
+            "requires_prompt": requires_prompt
+        }
+        
+        # Save document to store
+        doc_store.insert(doc_obj)
+        save_doc_store()
+        
+        # Upload in the background, alongside the transcription (skipped if the blob exists)
+        start_storage_upload(doc_id, save_path_str, firebase_path)
+        
+        # If using Replicate and no prompt provided, request prompt
+        if requires_prompt:
             return jsonify({
-                "message": "File received, uploaded to Firebase, and doc created",
+                "message": "File uploaded. Provide a prompt to begin transcription.",
                 "filename": unique_name,
                 "doc_id": doc_id,
-                "is_replicate": is_replicate
+                "requires_prompt": True,
+                "storage_status": StorageStatus.PENDING
             }), 200
+        
+        # Start transcription based on mode
+        if is_replicate:
+            logger.info(f"Starting Replicate transcription for document {doc_id}")
             
-        except Exception as firebase_err:
-            logger.error(f"Error uploading to Firebase: {firebase_err}")
-            import traceback
-            logger.error(f"Firebase error details: {traceback.format_exc()}")
-            
-            # Still create document if Firebase upload fails
-            doc_counter += 1
-            doc_id = str(uuid.uuid4())
-            doc_name = f"Doc{doc_counter}"
-            doc_obj = {
-                "id": doc_id,
-                "name": doc_name,
-                "content": "",
-                "audioFilename": unique_name,
-                "originalFilename": original_filename,
-                "audioTrashed": False,
-                "deleted": False,
-                "owner": uid,
-                "firebaseUrl": None,
-                "localPath": save_path_str,
-                "transcription_status": "pending"
-            }
-            
-            doc_store[doc_id] = doc_obj
-            save_doc_store()
-            
-            # Start local transcription since Firebase failed
+            # Start background transcription task
+            socketio.start_background_task(
+                background_replicate_transcription, 
+                save_path_str, 
+                doc_id,
+                _replicate_job_settings(uid, transcription_config, transcription_prompt)
+            )
+        else:
+            logger.info(f"Starting local transcription for document {doc_id}")
             socketio.start_background_task(
                 background_transcription, 
                 save_path_str, 
                 doc_id
             )
-            
-            return jsonify({
-                "message": "File received and doc created (Firebase upload failed but will still transcribe)",
-                "filename": unique_name,
-                "doc_id": doc_id,
-                "warning": "Firebase upload failed, using local file only"
-            }), 200
+        
+        return jsonify({
+            "message": "File received and doc created; Firebase upload started",
+            "filename": unique_name,
+            "doc_id": doc_id,
+            "is_replicate": is_replicate,
+            "storage_status": StorageStatus.PENDING
+        }), 200
             
     except Exception as e:
         logger.error(f"Error uploading file: {e}")
+        if unique_name and not doc_store.get(doc_id):
+            # save_upload referenced the blob for a document that was never created
+            blob_refs.discard(unique_name, doc_id)
         import traceback
         error_details = traceback.format_exc()
         logger.error(f"Detailed error: {error_details}")
         
-        # Clean up temporary file if it exists
-        try:
-            if temp_path.exists():
-                temp_path.unlink()
-        except:
-            pass
-            
         return jsonify({
             "error": "File upload failed", 
             "details": str(e),
-            "path_attempted": save_path_str
+            "path_attempted": abs_upload_folder
         }), 500
 
+@document_bp.route('/api/uploads', methods=['POST'])
+@verify_firebase_token
+def create_direct_upload():
+    """Start an upload that goes from the client straight to Storage.
+
+    Body: {"filename", "size", "contentType"?}. The client PUTs the file
+    to the returned url with the returned headers, then calls
+    POST /api/uploads/<upload_id>/complete.
+    """
+    data = request.json or {}
+    try:
+        upload = create_upload(
+            request.uid,
+            data.get("filename"),
+            data.get("contentType") or "audio/mpeg",
+            data.get("size"),
+        )
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        logger.error(f"Error creating upload URL: {e}")
+        return jsonify({"error": "Could not create upload URL", "details": str(e)}), 500
+    return jsonify(upload), 201
+
+@document_bp.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@verify_firebase_token
+def complete_direct_upload(upload_id):
+    """Create the document of a finished direct upload and start its transcription"""
+    uid = request.uid
+    
+    # A retried completion gets the document created by the first one
+    existing = doc_store.get(upload_id)
+    if existing and existing.owner == uid:
+        return jsonify({
+            "message": "Upload already completed",
+            "filename": existing.audioFilename,
+            "doc_id": upload_id,
+            "requires_prompt": existing.requires_prompt,
+            "storage_status": existing.storage_status
+        }), 200
+    
+    # Get user transcription settings
+    user_settings = user_settings_store.get(uid, {})
+    transcription_config = user_settings.get("transcriptionConfig", {})
+    is_replicate = transcription_config.get("mode") == "replicate"
+    
+    data = request.json or {}
+    transcription_prompt = data.get("transcription_prompt", "")
+    requires_prompt = is_replicate and not transcription_prompt
+    
+    def create_doc(session):
+        # The audio is already in Storage; the local copy is fetched for transcription
+        storage_path = session["storagePath"]
+        if doc_store.get(upload_id):
+            # Created by an earlier completion that didn't end the session
+            return session
+        try:
+            doc_store.insert({
+                "id": upload_id,
+                "name": f"Doc{next_doc_number()}",
+                "audioFilename": session["filename"],
+                "originalFilename": session["originalFilename"],
+                "audioTrashed": False,
+                "deleted": False,
+                "owner": uid,
+                "firebaseUrl": get_signed_url(storage_path),
+                "firebasePath": storage_path,
+                "localPath": None,
+                "storage_status": StorageStatus.UPLOADED,
+                "transcription_status": TranscriptionStatus.PENDING,
+                "is_replicate": is_replicate,
+                "requires_prompt": requires_prompt
+            })
+        except VersionConflict:
+            # Inserted by another worker in between
+            logger.info(f"Document of upload {upload_id} already exists")
+        save_doc_store()
+        return session
+    
+    try:
+        session = complete_upload(uid, upload_id, create_doc)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        logger.error(f"Error completing upload {upload_id}: {e}")
+        import traceback
+        logger.error(f"Detailed error: {traceback.format_exc()}")
+        return jsonify({"error": "Could not complete upload", "details": str(e)}), 500
+    
+    try:
+        storage_path = session["storagePath"]
+        
+        if requires_prompt:
+            return jsonify({
+                "message": "File uploaded. Provide a prompt to begin transcription.",
+                "filename": session["filename"],
+                "doc_id": upload_id,
+                "requires_prompt": True,
+                "storage_status": StorageStatus.UPLOADED
+            }), 200
+        
+        job_settings = _replicate_job_settings(uid, transcription_config, transcription_prompt) if is_replicate else None
+        logger.info(f"Starting {'Replicate' if is_replicate else 'local'} transcription for document {upload_id}")
+        socketio.start_background_task(background_stored_transcription, upload_id, storage_path, job_settings)
+        
+        return jsonify({
+            "message": "Upload completed and doc created; transcription started",
+            "filename": session["filename"],
+            "doc_id": upload_id,
+            "is_replicate": is_replicate,
+            "storage_status": StorageStatus.UPLOADED
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Error completing upload {upload_id}: {e}")
+        import traceback
+        logger.error(f"Detailed error: {traceback.format_exc()}")
+        return jsonify({"error": "Could not complete upload", "details": str(e)}), 500
+
 @document_bp.route('/api/transcribe/<doc_id>', methods=['POST'])
 @verify_firebase_token
 def transcribe_document(doc_id):
@@ -277,7 +364,7 @@ def transcribe_document(doc_id):
         if not doc:
             return jsonify({"error": "Document not found"}), 404
             
-        if doc.get("owner") != request.uid and not is_admin(request.uid):
+        if doc.owner != request.uid and not is_admin(request.uid):
             return jsonify({"error": "Access denied"}), 403
             
         uid = request.uid
@@ -288,17 +375,14 @@ def transcribe_document(doc_id):
             "whisperModel": "small"
         })
         
-        audio_filename = doc.get("audioFilename")
-        if not audio_filename or doc.get("audioTrashed", False):
+        audio_filename = doc.audioFilename
+        if not audio_filename or doc.audioTrashed:
             return jsonify({"error": "No audio file available for transcription"}), 400
             
-        # Find the audio file
-        if doc.get("localPath") and os.path.exists(doc.get("localPath")):
-            file_path = doc.get("localPath")
-        else:
-            file_path = os.path.join(UPLOAD_FOLDER, audio_filename)
-            if not os.path.exists(file_path):
-                return jsonify({"error": "Audio file not found on server"}), 404
+        # Find the audio file, downloading it again if it was evicted
+        file_path = audio_cache.get_path(audio_filename, audio_storage_path(doc))
+        if not file_path:
+            return jsonify({"error": "Audio file not found on server"}), 404
         
         # Determine transcription mode
         is_replicate = transcription_config.get("mode") == "replicate"
@@ -308,9 +392,11 @@ def transcribe_document(doc_id):
         data = request.json or {}
         
         # Update document status
-        doc["transcription_status"] = "in_progress"
-        doc["content"] = ""
-        doc["is_replicate"] = is_replicate
+        doc_store.patch(doc_id, {
+            "transcription_status": TranscriptionStatus.IN_PROGRESS,
+            "is_replicate": is_replicate
+        })
+        save_content(doc_id, content="")
         save_doc_store()
         
         # Start transcription based on mode
@@ -363,13 +449,14 @@ def transcribe_document(doc_id):
         return jsonify({"error": f"Failed to start transcription: {str(e)}"}), 500
 
 def background_transcription(file_path, doc_id):
+    job_id = f"transcription:{doc_id}"
+    start_job(job_id, "transcription", doc_id=doc_id, mode="local")
     try:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found for transcription: {file_path}")
             
         logger.info(f"Starting transcription for file: {file_path}")
         
-        all_text = ""
         processed_chunks = 0
         total_chunks = 0
         
@@ -377,32 +464,27 @@ def background_transcription(file_path, doc_id):
         if not doc:
             raise ValueError(f"Document {doc_id} not found")
             
-        doc["content"] = ""
-        doc["transcription_status"] = "in_progress"
+        doc_store.patch(doc_id, {"transcription_status": TranscriptionStatus.IN_PROGRESS})
+        builder = start_transcript(doc_id)
+        start_document(doc_id, doc.owner, has_segments=True)
         save_doc_store()
         
-        for i, total, text in chunked_transcribe_audio(file_path):
+        for i, total, text in chunked_transcribe_audio(file_path, chunk_size=TRANSCRIBE_CHUNK_SECONDS):
             if total > total_chunks:
                 total_chunks = total
                 
             processed_chunks += 1
-            chunk_text = text.strip()
-            
-            if all_text:
-                last_char = all_text[-1] if all_text else ""
-                first_char = chunk_text[0] if chunk_text else ""
-                
-                if first_char in ".,;:!?\"'":
-                    all_text += chunk_text
-                elif last_char.isalnum() and first_char.isalnum():
-                    all_text += " " + chunk_text
-                else:
-                    all_text += chunk_text
-            else:
-                all_text = chunk_text
-                
-            doc["content"] = all_text
-            save_doc_store()
+            # Audio offsets of the chunk (i is 0 for an error message)
+            start = (i - 1) * TRANSCRIBE_CHUNK_SECONDS if i > 0 else None
+            end = i * TRANSCRIBE_CHUNK_SECONDS if i > 0 else None
+            # Only the new chunk is written; the metadata store is left alone
+            chunk_text = builder.append(text, start, end)
+            # Index just the new chunk; the final whitespace cleanup below
+            # doesn't change any words, so no reindex is needed at the end
+            append_text(doc_id, doc.owner, chunk_text, start, end)
+            mirror_transcription(doc_id, audio_storage_path(doc), [{
+                'chunk_index': i, 'text': chunk_text, 'start': start, 'end': end
+            }])
             
             progress = round((processed_chunks / total_chunks) * 100) if total_chunks > 0 else 0
             
@@ -421,13 +503,12 @@ def background_transcription(file_path, doc_id):
             if i % 5 == 0 or i == total:
                 logger.info(f"Transcription progress: {progress}% ({i}/{total} chunks)")
         
-        final_text = all_text.strip()
-        final_text = re.sub(r'\s+', ' ', final_text)
-        final_text = re.sub(r'\s+([.,;:!?])', r'\1', final_text)
-        
-        doc["content"] = final_text
-        doc["transcription_status"] = "completed"
+        final_text = builder.finalize()
+        mirror_transcription(doc_id, audio_storage_path(doc), [], final=True)
+        doc = doc_store.patch(doc_id, {"transcription_status": TranscriptionStatus.COMPLETED})
         save_doc_store()
+        if doc:
+            record_version(doc_id, doc.version, final_text, "transcription")
         
         socketio.emit('final_transcript', {
             'doc_id': doc_id,
@@ -435,18 +516,19 @@ def background_transcription(file_path, doc_id):
             'content': final_text
         }, room=doc_id)
         
+        update_job(job_id, status="completed")
         logger.info(f"Transcription completed for file: {file_path}")
         
     except Exception as e:
         logger.error(f"Error during transcription: {e}")
         import traceback
         logger.error(f"Transcription error details: {traceback.format_exc()}")
+        discard_transcript(doc_id)
         
         try:
-            if doc_id in doc_store:
-                doc_store[doc_id]["transcription_status"] = "failed"
-                doc_store[doc_id]["error"] = str(e)
+            if doc_store.patch(doc_id, {"transcription_status": TranscriptionStatus.FAILED, "error": str(e)}):
                 save_doc_store()
+            update_job(job_id, status="failed", error=str(e))
         except:
             pass
             
@@ -455,7 +537,30 @@ def background_transcription(file_path, doc_id):
             'error': str(e)
         }, room=doc_id)
 
+def background_stored_transcription(doc_id, storage_path, replicate_settings=None):
+    """Fetch audio that is only in Storage and transcribe it (Replicate if settings are given)"""
+    doc = doc_store.get(doc_id)
+    file_path = audio_cache.get_path(doc.audioFilename, storage_path) if doc else None
+    if not file_path:
+        error = f"Audio not found in storage: {storage_path}"
+        logger.error(error)
+        if doc_store.patch(doc_id, {"transcription_status": TranscriptionStatus.FAILED, "error": error}):
+            save_doc_store()
+        socketio.emit('transcription_error', {
+            'doc_id': doc_id,
+            'error': error
+        }, room=doc_id)
+        return
+    
+    doc_store.patch(doc_id, {"localPath": file_path})
+    if replicate_settings is not None:
+        background_replicate_transcription(file_path, doc_id, replicate_settings)
+    else:
+        background_transcription(file_path, doc_id)
+
 def background_replicate_transcription(file_path, doc_id, user_settings):
+    job_id = f"transcription:{doc_id}"
+    start_job(job_id, "transcription", doc_id=doc_id, mode="replicate")
     try:
         # Import here to avoid circular imports
         from transcribe import transcribe_with_replicate
@@ -463,12 +568,16 @@ def background_replicate_transcription(file_path, doc_id, user_settings):
         doc = doc_store.get(doc_id)
         if not doc:
             logger.error(f"Document {doc_id} not found")
+            update_job(job_id, status="failed", error="Document not found")
             return
             
         # Initialize document status
-        doc["content"] = ""
-        doc["is_replicate"] = True
-        doc["transcription_status"] = "in_progress"
+        doc_store.patch(doc_id, {
+            "is_replicate": True,
+            "transcription_status": TranscriptionStatus.IN_PROGRESS
+        })
+        save_content(doc_id, content="", segments=[])
+        start_document(doc_id, doc.owner)
         save_doc_store()
         
         # Send progress updates to client
@@ -531,9 +640,7 @@ def background_replicate_transcription(file_path, doc_id, user_settings):
             raise Exception("Received empty transcription result from Replicate")
         
         # Clean up text
-        final_text = result.strip()
-        final_text = re.sub(r'\s+', ' ', final_text)
-        final_text = re.sub(r'\s+([.,;:!?])', r'\1', final_text)
+        final_text = normalize_transcript(result)
         
         logger.info(f"Processed transcription, final length: {len(final_text)} characters")
         
@@ -546,9 +653,12 @@ def background_replicate_transcription(file_path, doc_id, user_settings):
         }, room=doc_id)
         
         # Save final result
-        doc["content"] = final_text
-        doc["transcription_status"] = "completed"
+        save_content(doc_id, content=final_text)
+        index_document(doc_id, doc.owner, final_text)
+        doc = doc_store.patch(doc_id, {"transcription_status": TranscriptionStatus.COMPLETED})
         save_doc_store()
+        if doc:
+            record_version(doc_id, doc.version, final_text, "transcription")
         
         # Send final updates to client
         socketio.emit("partial_transcript_batch", {
@@ -564,6 +674,7 @@ def background_replicate_transcription(file_path, doc_id, user_settings):
             "content": final_text
         }, room=doc_id)
         
+        update_job(job_id, status="completed")
         logger.info(f"Replicate transcription completed successfully for document {doc_id}")
     
     except Exception as e:
@@ -579,10 +690,9 @@ def background_replicate_transcription(file_path, doc_id, user_settings):
         
         # Update document status
         try:
-            if doc_id in doc_store:
-                doc_store[doc_id]["transcription_status"] = "failed"
-                doc_store[doc_id]["error"] = str(e)
+            if doc_store.patch(doc_id, {"transcription_status": TranscriptionStatus.FAILED, "error": str(e)}):
                 save_doc_store()
+            update_job(job_id, status="failed", error=str(e))
         except:
             pass
 
@@ -593,26 +703,14 @@ def append_to_doc(doc_id, chunk_list):
             logger.warning(f"Document not found for appending transcription: {doc_id}")
             return
             
-        combined_text = doc.get("content", "")
-        
+        # Extends a transcription in progress, or the stored body; either
+        # way only the new chunks are written
+        builder = get_builder(doc_id)
         for chunk in chunk_list:
-            chunk_text = chunk["text"].strip()
-            
-            if combined_text:
-                last_char = combined_text[-1] if combined_text else ""
-                first_char = chunk_text[0] if chunk_text else ""
-                
-                if first_char in ".,;:!?\"'":
-                    combined_text += chunk_text
-                elif last_char.isalnum() and first_char.isalnum():
-                    combined_text += " " + chunk_text
-                else:
-                    combined_text += chunk_text
-            else:
-                combined_text = chunk_text
-                
-        doc["content"] = combined_text
-        save_doc_store()
+            chunk_text = builder.append(chunk["text"])
+            append_text(doc_id, doc.owner, chunk_text)
+        # No metadata fields change, but version/updatedAt must reflect the new body
+        doc_store.patch(doc_id, {})
         logger.debug(f"Updated document {doc_id} with new transcription content")
         
     except Exception as e:
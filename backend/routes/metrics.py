@@ -0,0 +1,38 @@
+# backend/routes/metrics.py
+import logging
+from flask import request, jsonify, Blueprint
+from services.blob_cache import blob_cache
+from services.signed_url_cache import signed_url_cache
+from services.reconciler import reconciler
+from services.audio_cache import audio_cache
+from services.blob_store import blob_refs
+from auth import verify_firebase_token, is_admin
+
+logger = logging.getLogger(__name__)
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/api/metrics', methods=['GET'])
+@verify_firebase_token
+def get_metrics():
+    """Cache statistics of this worker (admin only).
+
+    blobCache: hits are Storage existence/metadata round trips saved.
+    signedUrlCache: hits and coalesced calls reused an already signed URL.
+    reconciliation: drift found and repairs made by the background reconciler.
+    audioCache: local audio cache hit rate, bytes served/rehydrated, evictions.
+    contentBlobs: content-addressed audio blobs and the documents referencing them.
+    """
+    if not is_admin(request.uid):
+        return jsonify({"error": "Access denied"}), 403
+    return jsonify({
+        "blobCache": blob_cache.stats(),
+        "signedUrlCache": signed_url_cache.stats(),
+        "reconciliation": reconciler.stats(),
+        "audioCache": audio_cache.stats(),
+        "contentBlobs": blob_refs.stats(),
+    }), 200
+
+def register_metrics_routes(app):
+    """Register metrics routes with Flask app"""
+    app.register_blueprint(metrics_bp)
@@ -0,0 +1,74 @@
+# backend/routes/search.py
+import logging
+from flask import request, jsonify, Blueprint
+from services.storage import doc_store
+from services.content_store import load_content, ContentCorruptError
+from services.search_index import (
+    get_search_index, hit_timestamps, InvalidSearch, DEFAULT_RESULTS,
+)
+from auth import verify_firebase_token, is_admin
+
+logger = logging.getLogger(__name__)
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/api/search', methods=['GET'])
+@verify_firebase_token
+def search_docs():
+    """Full-text search over the caller's transcripts.
+
+    Query parameters: q (words, "a phrase", prefix*), limit.
+    Returns {"query": str, "results": [{"doc_id", "name", "score",
+    "hits": [{"snippet", "timestamps", "end"}]}]}, best match first.
+    Snippets are HTML-escaped with the matched words in <mark>; timestamps
+    are audio offsets in seconds, present when the transcript has timing
+    data, and end is where the matched chunk of audio ends, if known.
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Missing search query"}), 400
+
+    try:
+        limit = int(request.args.get("limit", DEFAULT_RESULTS))
+        matches = get_search_index().search(
+            query,
+            owner=None if is_admin(request.uid) else request.uid,
+            limit=limit,
+        )
+    except (InvalidSearch, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error searching for {query!r}: {e}")
+        return jsonify({"error": "Search failed"}), 500
+
+    results = []
+    for match in matches:
+        doc = doc_store.get(match["doc_id"])
+        if not doc or doc.deleted:
+            continue
+        segments = None
+        if match["has_segments"]:
+            try:
+                segments = load_content(doc.id)["segments"]
+            except ContentCorruptError as e:
+                # The hit is still listed, without timestamps from the damaged body
+                logger.error(f"Search hit {doc.id} without segments: {e}")
+        hits = []
+        for hit in match["hits"]:
+            if hit["start"] is not None:
+                timestamps = [hit["start"]]
+            else:
+                timestamps = hit_timestamps(hit["terms"], segments)
+            hits.append({"snippet": hit["snippet"], "timestamps": timestamps, "end": hit["end"]})
+        results.append({
+            "doc_id": doc.id,
+            "name": doc.name,
+            "score": match["score"],
+            "hits": hits,
+        })
+
+    return jsonify({"query": query, "results": results}), 200
+
+def register_search_routes(app):
+    """Register full-text search routes with Flask app"""
+    app.register_blueprint(search_bp)
@@ -6,7 +6,7 @@ import logging
 import json
 import requests
 from flask import jsonify, request, Blueprint
-from firebase_admin import firestore
+from services.firebase_client import get_db
 from auth import verify_firebase_token
 
 logger = logging.getLogger(__name__)
@@ -52,7 +52,7 @@ def get_user_settings():
     """Get user settings from Firestore"""
     try:
         # Get reference to Firestore
-        db = firestore.client()
+        db = get_db()
         
         # Get user ID from the token verification middleware
         user_id = request.uid
@@ -97,7 +97,7 @@ def save_user_settings():
     """Save user settings to Firestore"""
     try:
         # Get reference to Firestore
-        db = firestore.client()
+        db = get_db()
         
         # Get user ID from the token verification middleware
         user_id = request.uid
@@ -0,0 +1,64 @@
+# backend/routes/storage_route.py
+import logging
+from flask import request, jsonify, Blueprint, send_file
+from services.storage_backend import get_storage
+
+logger = logging.getLogger(__name__)
+
+storage_bp = Blueprint('storage', __name__)
+
+@storage_bp.route('/api/storage/<path:storage_path>', methods=['GET'])
+def get_stored_file(storage_path):
+    """Serve a blob of the local storage backend to the holder of a signed URL.
+
+    The URL's expiry and HMAC signature are the authorization, like a
+    Firebase signed URL, so no token is needed. send_file supports range
+    requests and uses the server's sendfile support.
+    """
+    storage = get_storage()
+    if storage.name != "local":
+        return jsonify({"error": "Not found"}), 404
+    if not storage.verify(storage_path, request.args.get("expires"), request.args.get("signature")):
+        return jsonify({"error": "Invalid or expired signature"}), 403
+    try:
+        path = storage.path(storage_path)
+    except ValueError:
+        return jsonify({"error": "Not found"}), 404
+    if not storage.exists(storage_path):
+        return jsonify({"error": "Not found"}), 404
+    return send_file(path, conditional=True, max_age=0)
+
+@storage_bp.route('/api/storage/<path:storage_path>', methods=['PUT'])
+def put_stored_file(storage_path):
+    """Store the body of a PUT to a signed upload URL of the local storage backend.
+
+    Stands in for a PUT to a Firebase signed upload URL: the signature
+    covers method, path, expiry and size, and a body of another size is
+    rejected. The signed size replaces the app's MAX_CONTENT_LENGTH, which
+    is meant for uploads through the server and is below what
+    create_upload() allows.
+    """
+    storage = get_storage()
+    if storage.name != "local":
+        return jsonify({"error": "Not found"}), 404
+    try:
+        size = int(request.args.get("size"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid or expired signature"}), 403
+    if not storage.verify(storage_path, request.args.get("expires"), request.args.get("signature"),
+                          method="PUT", size=size):
+        return jsonify({"error": "Invalid or expired signature"}), 403
+    request.max_content_length = size
+    if request.content_length is not None and request.content_length != size:
+        return jsonify({"error": f"Expected {size} bytes"}), 400
+    try:
+        stored = storage.receive(storage_path, request.stream, size, request.content_type)
+    except ValueError:
+        return jsonify({"error": "Not found"}), 404
+    if not stored:
+        return jsonify({"error": f"Expected {size} bytes"}), 400
+    return "", 200
+
+def register_storage_routes(app):
+    """Register local storage routes with Flask app"""
+    app.register_blueprint(storage_bp)
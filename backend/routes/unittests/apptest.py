@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import app as app_module
+from services.socketio_instance import socketio
+
+
+class TestCreateApp(unittest.TestCase):
+
+    def setUp(self):
+        self.started = []
+        self._saved = (app_module.load_doc_store, app_module.backfill_search_index,
+                       app_module.resume_storage_uploads, app_module.migrate_all_users,
+                       app_module.start_trash_purger, app_module.start_reconciler,
+                       socketio.start_background_task)
+        start_background_task = socketio.start_background_task
+
+        def record(target, *args, **kwargs):
+            # Fails like the real call if socketio has no server yet
+            self.started.append(target.__name__)
+            return start_background_task(lambda: None)
+
+        socketio.start_background_task = record
+        app_module.load_doc_store = lambda: 0
+        app_module.backfill_search_index = self.job("backfill_search_index")
+        app_module.resume_storage_uploads = self.starter("resume_storage_uploads")
+        app_module.migrate_all_users = self.job("migrate_all_users")
+        app_module.start_trash_purger = self.starter("start_trash_purger")
+        app_module.start_reconciler = self.starter("start_reconciler")
+        app_module.audio_cache.trim = self.job("trim")
+
+    def tearDown(self):
+        (app_module.load_doc_store, app_module.backfill_search_index,
+         app_module.resume_storage_uploads, app_module.migrate_all_users,
+         app_module.start_trash_purger, app_module.start_reconciler,
+         socketio.start_background_task) = self._saved
+        del app_module.audio_cache.trim
+
+    def job(self, name):
+        def run():
+            pass
+        run.__name__ = name
+        return run
+
+    def starter(self, name):
+        # Like the start_* functions: starts its loop in the background
+        def start():
+            socketio.start_background_task(self.job(name))
+        return start
+
+    def test_create_app_starts_background_work(self):
+        app = app_module.create_app()
+        self.assertIsNotNone(socketio.server)
+        self.assertIn("backfill_search_index", self.started)
+        self.assertIn("resume_storage_uploads", self.started)
+        self.assertIn("migrate_all_users", self.started)
+        self.assertIn("start_trash_purger", self.started)
+        self.assertIn("start_reconciler", self.started)
+        self.assertIn("trim", self.started)
+        self.assertEqual(app.test_client().get("/healthcheck").status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
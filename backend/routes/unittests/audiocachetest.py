@@ -0,0 +1,76 @@
+import unittest
+import tempfile
+import threading
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from services.audio_cache import AudioCache
+
+
+class TestAudioCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.tmp.name, "uploads")
+        os.makedirs(self.folder)
+        self.remote = {}
+        self.downloads = 0
+        self.evictable = {"a.mp3", "b.mp3", "c.mp3"}
+        self.cache = AudioCache(self.folder, max_bytes=250, download=self.download,
+                                evictable=lambda: self.evictable)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def download(self, storage_path, dest_path):
+        self.downloads += 1
+        data = self.remote.get(storage_path)
+        if data is None:
+            return False
+        with open(dest_path, "wb") as f:
+            f.write(data)
+        return True
+
+    def write(self, name, size=100):
+        with open(os.path.join(self.folder, name), "wb") as f:
+            f.write(b"x" * size)
+        self.remote[f"users/u/uploads/{name}"] = b"x" * size
+        self.cache.add(name)
+
+    def test_evicts_least_recently_used(self):
+        self.write("a.mp3")
+        self.write("b.mp3")
+        self.cache.get_path("a.mp3", "users/u/uploads/a.mp3")
+        self.write("c.mp3")
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "b.mp3")))
+        self.assertTrue(os.path.exists(os.path.join(self.folder, "a.mp3")))
+        stats = self.cache.stats()
+        self.assertEqual((stats["evictions"], stats["bytes"], stats["hits"]), (1, 200, 1))
+
+    def test_files_not_in_storage_are_kept(self):
+        self.evictable = set()
+        self.write("a.mp3")
+        self.write("b.mp3")
+        self.write("c.mp3")
+        self.assertEqual(self.cache.stats()["evictions"], 0)
+        self.assertEqual(len(os.listdir(self.folder)), 3)
+
+    def test_rehydrates_evicted_file_once(self):
+        self.write("a.mp3")
+        os.remove(os.path.join(self.folder, "a.mp3"))
+        paths = []
+        threads = [threading.Thread(target=lambda: paths.append(
+            self.cache.get_path("a.mp3", "users/u/uploads/a.mp3"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(set(paths), {os.path.join(self.folder, "a.mp3")})
+        self.assertEqual(self.downloads, 1)
+        self.assertEqual(self.cache.stats()["bytesRehydrated"], 100)
+        self.assertIsNone(self.cache.get_path("gone.mp3", "users/u/uploads/gone.mp3"))
+        self.assertEqual([f for f in os.listdir(self.folder) if f.startswith(".")], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
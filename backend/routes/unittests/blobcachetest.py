@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from services.blob_cache import BlobCache
+
+
+class FakeBlob:
+
+    def __init__(self, name):
+        self.name = name
+        self.size = 3
+        self.content_type = "audio/mpeg"
+        self.metadata = {"ownerId": "u1"}
+        self.time_created = None
+        self.generation = 1
+
+
+class FakeBucket:
+
+    def __init__(self, names):
+        self.names = set(names)
+        self.requests = 0
+
+    def get_blob(self, name):
+        self.requests += 1
+        return FakeBlob(name) if name in self.names else None
+
+
+class TestBlobCache(unittest.TestCase):
+
+    def setUp(self):
+        self.bucket = FakeBucket(["users/u1/uploads/a"])
+        self.cache = BlobCache(ttl=60, negative_ttl=60, max_entries=100)
+
+    def test_repeated_checks_cost_one_request(self):
+        for _ in range(3):
+            self.assertTrue(self.cache.exists(self.bucket, "users/u1/uploads/a"))
+            self.assertFalse(self.cache.exists(self.bucket, "users/u1/trash/a"))
+        self.assertEqual(self.bucket.requests, 2)
+        self.assertEqual(self.cache.lookup(self.bucket, "users/u1/uploads/a").metadata, {"ownerId": "u1"})
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (5, 2))
+
+    def test_writes_update_the_cache(self):
+        self.cache.exists(self.bucket, "users/u1/uploads/a")
+        self.cache.note_moved("users/u1/uploads/a", FakeBlob("users/u1/trash/a"))
+        self.assertFalse(self.cache.exists(self.bucket, "users/u1/uploads/a"))
+        self.assertTrue(self.cache.exists(self.bucket, "users/u1/trash/a"))
+        self.assertEqual(self.bucket.requests, 1)
+
+    def test_expiry_and_invalidation(self):
+        self.cache.negative_ttl = 0
+        self.cache.exists(self.bucket, "users/u1/uploads/b")
+        self.bucket.names.add("users/u1/uploads/b")
+        self.assertTrue(self.cache.exists(self.bucket, "users/u1/uploads/b"))
+        self.cache.invalidate("users/u1/uploads/b")
+        self.cache.exists(self.bucket, "users/u1/uploads/b")
+        self.assertEqual(self.bucket.requests, 3)
+
+    def test_fetch_does_not_overwrite_a_newer_write(self):
+        path = "users/u1/uploads/a"
+        cache = self.cache
+
+        class DeletingBucket(FakeBucket):
+            def get_blob(self, name):
+                blob = super().get_blob(name)
+                # The blob is deleted while the fetch is in flight
+                cache.note_deleted(name)
+                return blob
+
+        self.assertFalse(cache.exists(DeletingBucket([path]), path))
+        self.assertFalse(cache.exists(self.bucket, path))
+        self.assertEqual(self.bucket.requests, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
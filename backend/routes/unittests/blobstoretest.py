@@ -0,0 +1,120 @@
+import unittest
+import tempfile
+import threading
+import io
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import services.trash as trash
+import services.storage_upload as storage_upload
+from services.blob_store import save_upload, blob_path, blob_refs
+from services.storage import doc_store
+from services.doc_record import StorageStatus
+
+
+class TestBlobStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.deleted_paths = []
+        self._saved = (trash.delete_files, trash.UPLOAD_FOLDER, storage_upload.save_doc_store,
+                       storage_upload.socketio.emit, storage_upload.check_blob_exists)
+        trash.delete_files = self.delete_files
+        trash.UPLOAD_FOLDER = self.tmp.name
+        storage_upload.save_doc_store = lambda: None
+        storage_upload.socketio.emit = lambda event, data, room=None: None
+        storage_upload.check_blob_exists = lambda path: True
+        self.doc_ids = []
+
+    def tearDown(self):
+        (trash.delete_files, trash.UPLOAD_FOLDER, storage_upload.save_doc_store,
+         storage_upload.socketio.emit, storage_upload.check_blob_exists) = self._saved
+        for doc_id in self.doc_ids:
+            doc = doc_store.get(doc_id)
+            if doc:
+                blob_refs.discard(doc.audioFilename, doc_id)
+                doc_store.remove(doc_id)
+        self.tmp.cleanup()
+
+    def delete_files(self, paths, requesting_user_id=None):
+        self.deleted_paths.extend(paths)
+        return {"deleted": list(paths), "failed": {}}
+
+    def upload(self, doc_id, owner, data, original="talk.MP3"):
+        filename, content_hash, size, duplicate = save_upload(
+            io.BytesIO(data), original, owner, doc_id, self.tmp.name
+        )
+        doc_store.insert({"id": doc_id, "owner": owner, "audioFilename": filename,
+                          "contentHash": content_hash, "firebasePath": blob_path(filename),
+                          "storage_status": StorageStatus.PENDING})
+        self.doc_ids.append(doc_id)
+        return filename, duplicate
+
+    def test_duplicate_upload_is_stored_once(self):
+        first, duplicate = self.upload("c1", "alice", b"same audio")
+        self.assertFalse(duplicate)
+        self.assertTrue(first.endswith(".mp3"))
+        second, duplicate = self.upload("c2", "alice", b"same audio")
+        self.assertTrue(duplicate)
+        self.assertEqual(first, second)
+        self.assertEqual(os.listdir(self.tmp.name), [first])
+        self.assertEqual(blob_refs.count(first), 2)
+
+    def test_uploads_are_not_deduplicated_across_users(self):
+        first, _ = self.upload("c1", "alice", b"same audio")
+        second, duplicate = self.upload("c2", "bob", b"same audio")
+        self.assertFalse(duplicate)
+        self.assertNotEqual(first, second)
+        self.assertEqual(doc_store.get("c1").contentHash, doc_store.get("c2").contentHash)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), sorted([first, second]))
+
+    def test_existing_blob_is_not_uploaded_again(self):
+        filename, _ = self.upload("c1", "alice", b"same audio")
+        uploads = []
+        ok = storage_upload.upload_to_storage(
+            "c1", os.path.join(self.tmp.name, filename), blob_path(filename),
+            upload=lambda local, path: uploads.append(path), sign=lambda path: "https://signed",
+        )
+        self.assertTrue(ok)
+        self.assertEqual(uploads, [])
+        self.assertEqual(doc_store.get("c1").storage_status, StorageStatus.UPLOADED)
+
+    def test_blob_deleted_with_last_reference(self):
+        filename, _ = self.upload("c1", "alice", b"same audio")
+        self.upload("c2", "alice", b"same audio")
+
+        self.assertEqual(trash.purge_docs([doc_store.get("c1")], "alice")["purged"], ["c1"])
+        self.assertEqual(self.deleted_paths, [])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, filename)))
+        self.assertEqual(blob_refs.count(filename), 1)
+
+        self.assertEqual(trash.purge_docs([doc_store.get("c2")], "alice")["purged"], ["c2"])
+        self.assertEqual(self.deleted_paths, [blob_path(filename)])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, filename)))
+        self.assertEqual(blob_refs.count(filename), 0)
+
+    def test_upload_during_purge_keeps_its_blob(self):
+        filename, _ = self.upload("c1", "alice", b"same audio")
+        results = []
+        uploader = threading.Thread(
+            target=lambda: results.append(self.upload("c2", "alice", b"same audio"))
+        )
+
+        def delete_files(paths, requesting_user_id=None):
+            # The same audio is uploaded while the purge deletes the blob
+            uploader.start()
+            uploader.join(0.2)
+            self.assertTrue(uploader.is_alive())
+            return self.delete_files(paths, requesting_user_id)
+
+        trash.delete_files = delete_files
+        self.assertEqual(trash.purge_docs([doc_store.get("c1")], "alice")["purged"], ["c1"])
+        uploader.join(5)
+        # The upload waited for the purge and kept its own copy
+        self.assertEqual(results, [(filename, False)])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, filename)))
+        self.assertEqual(blob_refs.count(filename), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
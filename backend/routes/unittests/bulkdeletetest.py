@@ -0,0 +1,124 @@
+import unittest
+import threading
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from google.api_core.exceptions import NotFound
+import services.firebase_service as firebase_service
+
+
+class FakeBatch:
+
+    def __init__(self, client):
+        self.client = client
+
+    def __enter__(self):
+        self.client.batching.current = self
+        self.errors = []
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.client.batching.current = None
+        with self.client.lock:
+            self.client.batches += 1
+        if self.errors:
+            raise self.errors[-1]
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.batching = threading.local()
+        self.batches = 0
+        self.lock = threading.Lock()
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+class FakeBucket:
+
+    def __init__(self, names, broken=()):
+        self.names = set(names)
+        self.broken = set(broken)
+        self.client = FakeClient()
+        self.lock = threading.Lock()
+
+    def blob(self, name):
+        bucket = self
+
+        class Blob:
+            def delete(self):
+                with bucket.lock:
+                    if name in bucket.broken:
+                        error = RuntimeError("503 backend error")
+                    elif name not in bucket.names:
+                        error = NotFound("gone")
+                    else:
+                        bucket.names.discard(name)
+                        return
+                batch = getattr(bucket.client.batching, "current", None)
+                if batch:
+                    batch.errors.append(error)
+                else:
+                    raise error
+        return Blob()
+
+
+class FakeWriteBatch:
+
+    def __init__(self, db):
+        self.db = db
+        self.deletes = 0
+
+    def delete(self, ref):
+        self.deletes += 1
+
+    def commit(self):
+        self.db.commits.append(self.deletes)
+
+
+class FakeDb:
+
+    def __init__(self):
+        self.commits = []
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def collection(self, name):
+        return self
+
+    def document(self, name):
+        return name
+
+
+class TestBulkDelete(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = (firebase_service.bucket, firebase_service.db)
+        self.paths = [f"users/alice/uploads/{i}.mp3" for i in range(1200)]
+        self.bucket = FakeBucket(self.paths, broken=["users/alice/uploads/7.mp3"])
+        firebase_service.bucket = self.bucket
+        firebase_service.db = FakeDb()
+
+    def tearDown(self):
+        firebase_service.bucket, firebase_service.db = self._saved
+
+    def test_batches_and_reports_partial_failures(self):
+        missing = "users/alice/uploads/never-uploaded.mp3"
+        result = firebase_service.delete_files(
+            self.paths + [missing, "users/bob/uploads/x.mp3"], "alice", max_workers=4
+        )
+        self.assertEqual(self.bucket.client.batches, 13)
+        self.assertEqual(self.bucket.names, {"users/alice/uploads/7.mp3"})
+        self.assertEqual(set(result["failed"]), {"users/alice/uploads/7.mp3", "users/bob/uploads/x.mp3"})
+        self.assertEqual(result["failed"]["users/bob/uploads/x.mp3"], "Access denied")
+        # Already gone counts as deleted
+        self.assertIn(missing, result["deleted"])
+        self.assertEqual(len(result["deleted"]), 1200)
+        self.assertEqual(firebase_service.db.commits, [500, 500, 200])
+
+
+if __name__ == '__main__':
+    unittest.main()
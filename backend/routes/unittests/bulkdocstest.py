@@ -0,0 +1,89 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import services.doc_bulk as doc_bulk
+from services.storage import doc_store
+
+
+class TestBulkDocs(unittest.TestCase):
+
+    def setUp(self):
+        self.saves = 0
+        self.purged = []
+        self._saved = (doc_bulk.save_doc_store, doc_bulk.add_folder, doc_bulk.purge_docs,
+                       doc_bulk.restore_legacy_audio, doc_bulk.get_file_url)
+        doc_bulk.save_doc_store = self.save
+        doc_bulk.add_folder = lambda owner, name: True
+        doc_bulk.purge_docs = self.purge_docs
+        doc_bulk.restore_legacy_audio = lambda owner, filename: filename == "b1.mp3"
+        doc_bulk.get_file_url = lambda path: f"https://storage/{path}"
+        doc_store.insert({"id": "b1", "owner": "alice", "audioFilename": "b1.mp3"})
+        doc_store.insert({"id": "b2", "owner": "alice", "audioFilename": "b2.mp3"})
+        doc_store.insert({"id": "b3", "owner": "bob", "audioFilename": "b3.mp3"})
+
+    def tearDown(self):
+        (doc_bulk.save_doc_store, doc_bulk.add_folder, doc_bulk.purge_docs,
+         doc_bulk.restore_legacy_audio, doc_bulk.get_file_url) = self._saved
+        for doc_id in ("b1", "b2", "b3"):
+            if doc_store.get(doc_id):
+                doc_store.remove(doc_id)
+
+    def save(self):
+        self.saves += 1
+
+    def purge_docs(self, docs, requesting_user_id=None):
+        self.purged.extend(doc.id for doc in docs)
+        return {"purged": [doc.id for doc in docs if doc.id != "b2"],
+                "failed": {doc.id: "503" for doc in docs if doc.id == "b2"}}
+
+    def statuses(self, results):
+        return {r["id"]: r["status"] for r in results}
+
+    def test_move_saves_once_and_checks_ownership(self):
+        results = doc_bulk.apply_bulk("alice", ["b1", "b2", "b3", "nope", "b1"], "move", folder="Work")
+        self.assertEqual(self.statuses(results),
+                         {"b1": "ok", "b2": "ok", "b3": "forbidden", "nope": "not_found"})
+        self.assertEqual(len(results), 4)
+        self.assertEqual(self.saves, 1)
+        self.assertEqual(doc_store.get("b1").folderName, "Work")
+        self.assertIsNone(doc_store.get("b3").folderName)
+
+    def test_trash_and_restore(self):
+        doc_bulk.apply_bulk("alice", ["b1", "b2"], "trash")
+        self.assertTrue(doc_store.get("b1").deleted)
+        self.assertTrue(doc_store.get("b2").trashedAt)
+
+        # b1 and b2 trashed the old way; only b1's audio is still in the legacy trash
+        doc_store.patch_many({"b1": {"trashedAt": None}, "b2": {"trashedAt": None}})
+        results = doc_bulk.apply_bulk("alice", ["b1", "b2"], "restore")
+        self.assertEqual(self.statuses(results), {"b1": "ok", "b2": "failed"})
+        self.assertFalse(doc_store.get("b1").deleted)
+        self.assertTrue(doc_store.get("b1").firebaseUrl.endswith("users/alice/uploads/b1.mp3"))
+        self.assertTrue(doc_store.get("b2").deleted)
+
+    def test_delete_reports_failed_blobs(self):
+        doc_bulk.apply_bulk("admin", ["b2", "b3"], "trash", admin=True)
+        results = doc_bulk.apply_bulk("admin", ["b2", "b3"], "delete", admin=True)
+        self.assertEqual(self.statuses(results), {"b2": "failed", "b3": "ok"})
+        self.assertEqual(results[0]["error"], "503")
+        self.assertEqual(self.purged, ["b2", "b3"])
+
+    def test_delete_only_purges_trashed_docs(self):
+        doc_bulk.apply_bulk("alice", ["b1"], "trash")
+        results = doc_bulk.apply_bulk("alice", ["b1", "b2"], "delete")
+        self.assertEqual(self.statuses(results), {"b1": "ok", "b2": "failed"})
+        self.assertEqual(results[1]["error"], "Document is not in the trash")
+        self.assertEqual(self.purged, ["b1"])
+
+    def test_invalid_requests(self):
+        with self.assertRaises(doc_bulk.BulkError):
+            doc_bulk.apply_bulk("alice", ["b1"], "rename")
+        with self.assertRaises(doc_bulk.BulkError):
+            doc_bulk.apply_bulk("alice", [], "trash")
+        with self.assertRaises(doc_bulk.BulkError):
+            doc_bulk.apply_bulk("alice", "b1", "trash")
+
+
+if __name__ == '__main__':
+    unittest.main()
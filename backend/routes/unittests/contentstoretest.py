@@ -0,0 +1,61 @@
+import unittest
+import tempfile
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import services.content_store as content_store
+from services.content_store import load_content, save_content, migrate_inline_content
+from services.transcript_builder import start_transcript, is_transcribing
+
+
+class TestContentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self._saved = content_store.CONTENT_STORE_DIR
+        content_store.CONTENT_STORE_DIR = self.tmpdir.name
+
+    def tearDown(self):
+        content_store.CONTENT_STORE_DIR = self._saved
+        self.tmpdir.cleanup()
+
+    def break_store(self):
+        # A file where the content directory should be: every write fails
+        content_store.CONTENT_STORE_DIR = os.path.join(self.tmpdir.name, "blocked")
+        with open(content_store.CONTENT_STORE_DIR, "w") as f:
+            f.write("not a directory")
+
+    def test_failed_save_raises(self):
+        save_content("doc", content="Stored text", segments=[])
+        self.break_store()
+        with self.assertRaises(OSError):
+            save_content("doc", content="New text", segments=[])
+        content_store.CONTENT_STORE_DIR = self.tmpdir.name
+        self.assertEqual(load_content("doc")["content"], "Stored text")
+
+    def test_migration_moves_inline_content(self):
+        docs = {
+            "d1": {"id": "d1", "content": "Inline", "segments": [{"start": 0}]},
+            "d2": {"id": "d2"},
+        }
+        self.assertEqual(migrate_inline_content(docs), (1, 0))
+        self.assertEqual(docs, {"d1": {"id": "d1"}, "d2": {"id": "d2"}})
+        self.assertEqual(load_content("d1"), {"content": "Inline", "segments": [{"start": 0}]})
+
+    def test_failed_migration_keeps_inline_content(self):
+        self.break_store()
+        docs = {"d1": {"id": "d1", "content": "Inline", "segments": []}}
+        self.assertEqual(migrate_inline_content(docs), (0, 1))
+        self.assertEqual(docs["d1"]["content"], "Inline")
+
+    def test_edits_are_refused_while_transcribing(self):
+        builder = start_transcript("doc")
+        builder.append("Hello")
+        self.assertTrue(is_transcribing("doc"))
+        builder.finalize()
+        self.assertFalse(is_transcribing("doc"))
+        self.assertEqual(load_content("doc")["content"], "Hello")
+
+
+if __name__ == '__main__':
+    unittest.main()
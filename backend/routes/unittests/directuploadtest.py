@@ -0,0 +1,143 @@
+import unittest
+import tempfile
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from flask import Flask
+import routes.storage_route as storage_route
+import services.direct_upload as direct_upload
+from services.storage import doc_store
+from services.storage_backend import LocalStorageBackend
+
+
+class TestDirectUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = LocalStorageBackend(os.path.join(self.tmp.name, "storage"), secret="s3cret")
+        self._saved = (storage_route.get_storage, direct_upload.get_upload_url,
+                       direct_upload.get_blob_size, direct_upload.delete_files,
+                       direct_upload.upload_sessions)
+        storage_route.get_storage = lambda: self.storage
+        direct_upload.get_upload_url = self.storage.get_upload_url
+        direct_upload.get_blob_size = self.storage.size
+        direct_upload.delete_files = self.storage.delete_files
+        direct_upload.upload_sessions = {}
+        self.created = []
+        app = Flask(__name__)
+        # Far below the size of a direct upload, like the app's 100 MB
+        app.config["MAX_CONTENT_LENGTH"] = 4
+        app.register_blueprint(storage_route.storage_bp)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        (storage_route.get_storage, direct_upload.get_upload_url,
+         direct_upload.get_blob_size, direct_upload.delete_files,
+         direct_upload.upload_sessions) = self._saved
+        for doc_id in self.created:
+            if doc_store.get(doc_id):
+                doc_store.remove(doc_id)
+        self.tmp.cleanup()
+
+    def put(self, upload, data):
+        return self.client.put(upload["url"], data=data, headers=upload["headers"])
+
+    def complete(self, user_id, upload_id):
+        return direct_upload.complete_upload(user_id, upload_id, lambda session: session)
+
+    def insert_doc(self, doc_id, owner):
+        doc_store.insert({"id": doc_id, "owner": owner})
+        self.created.append(doc_id)
+
+    def test_upload_and_complete(self):
+        upload = direct_upload.create_upload("alice", "talk.mp3", "audio/mpeg", 10)
+        self.assertEqual(upload["method"], "PUT")
+
+        with self.assertRaises(direct_upload.UploadError) as cm:
+            self.complete("alice", upload["upload_id"])
+        self.assertEqual(cm.exception.status, 409)
+
+        self.assertEqual(self.put(upload, b"0123456789").status_code, 200)
+        with self.assertRaises(direct_upload.UploadError) as cm:
+            self.complete("bob", upload["upload_id"])
+        self.assertEqual(cm.exception.status, 403)
+
+        session = self.complete("alice", upload["upload_id"])
+        self.assertEqual(session["storagePath"], f"users/alice/uploads/{upload['upload_id']}_talk.mp3")
+        with open(self.storage.path(session["storagePath"]), "rb") as f:
+            self.assertEqual(f.read(), b"0123456789")
+        self.assertEqual(self.storage.records[session["filename"]]["ownerId"], "alice")
+
+        # The session is gone once completed
+        with self.assertRaises(direct_upload.UploadError) as cm:
+            self.complete("alice", upload["upload_id"])
+        self.assertEqual(cm.exception.status, 404)
+
+    def test_session_is_kept_until_the_document_is_created(self):
+        upload = direct_upload.create_upload("alice", "talk.mp3", "audio/mpeg", 10)
+        self.assertEqual(self.put(upload, b"0123456789").status_code, 200)
+
+        def fail(session):
+            raise RuntimeError("doc store unavailable")
+
+        with self.assertRaises(RuntimeError):
+            direct_upload.complete_upload("alice", upload["upload_id"], fail)
+        self.assertNotIn("completingAt", direct_upload.upload_sessions[upload["upload_id"]])
+
+        # Only one of two concurrent completions creates the document
+        def complete_again(session):
+            with self.assertRaises(direct_upload.UploadError) as cm:
+                self.complete("alice", upload["upload_id"])
+            self.assertEqual(cm.exception.status, 409)
+            self.insert_doc(upload["upload_id"], "alice")
+            return "created"
+
+        self.assertEqual(direct_upload.complete_upload("alice", upload["upload_id"], complete_again), "created")
+        self.assertEqual(direct_upload.upload_sessions, {})
+
+    def test_expired_session_deletes_its_file(self):
+        abandoned = direct_upload.create_upload("alice", "a.mp3", "audio/mpeg", 10)
+        completed = direct_upload.create_upload("alice", "b.mp3", "audio/mpeg", 10)
+        for upload in (abandoned, completed):
+            self.assertEqual(self.put(upload, b"0123456789").status_code, 200)
+        # The document of this one was created by a completion that died
+        self.insert_doc(completed["upload_id"], "alice")
+
+        later = direct_upload.upload_sessions[abandoned["upload_id"]]["expiresAt"] + direct_upload.COMPLETE_GRACE + 1
+        direct_upload._expire_sessions(later)
+        self.assertEqual(direct_upload.upload_sessions, {})
+        self.assertIsNone(self.storage.size(f"users/alice/uploads/{abandoned['upload_id']}_a.mp3"))
+        self.assertEqual(self.storage.size(f"users/alice/uploads/{completed['upload_id']}_b.mp3"), 10)
+
+    def test_put_is_not_limited_by_max_content_length(self):
+        upload = direct_upload.create_upload("alice", "talk.mp3", "audio/mpeg", 10)
+        self.assertEqual(self.put(upload, b"0123456789").status_code, 200)
+        self.assertEqual(self.storage.size(f"users/alice/uploads/{upload['upload_id']}_talk.mp3"), 10)
+
+    def test_put_must_match_signed_size_and_path(self):
+        upload = direct_upload.create_upload("alice", "talk.mp3", "audio/mpeg", 10)
+        self.assertEqual(self.put(upload, b"too short").status_code, 400)
+        self.assertIsNone(self.storage.size(f"users/alice/uploads/{upload['upload_id']}_talk.mp3"))
+
+        other = upload["url"].replace("/users/alice/", "/users/bob/")
+        self.assertEqual(self.client.put(other, data=b"0123456789").status_code, 403)
+        bigger = upload["url"].replace("size=10", "size=11")
+        self.assertEqual(self.client.put(bigger, data=b"01234567890").status_code, 403)
+
+        # A download URL can't be used to upload
+        self.storage.upload_file_by_path(__file__, "users/alice/uploads/x.py")
+        self.assertEqual(self.client.put(self.storage.get_signed_url("users/alice/uploads/x.py"),
+                                         data=b"0123456789").status_code, 403)
+
+    def test_invalid_requests(self):
+        for filename, size in (("", 10), ("../x.mp3", 10), ("a.mp3", 0), ("a.mp3", "10")):
+            with self.assertRaises(direct_upload.UploadError):
+                direct_upload.create_upload("alice", filename, "audio/mpeg", size)
+        with self.assertRaises(direct_upload.UploadError) as cm:
+            direct_upload.create_upload("alice", "a.mp3", "audio/mpeg", direct_upload.DIRECT_UPLOAD_MAX_BYTES + 1)
+        self.assertEqual(cm.exception.status, 413)
+        self.assertEqual(direct_upload.upload_sessions, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
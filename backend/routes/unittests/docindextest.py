@@ -0,0 +1,93 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from services.doc_index import DocIndex, InvalidQuery, ANY_FOLDER
+from services.doc_record import Document
+
+
+def make_doc(n, owner="alice", **extra):
+    doc = {
+        "id": f"doc-{n:03d}",
+        "name": f"Doc{n}",
+        "owner": owner,
+        "createdAt": f"2025-01-01T00:00:{n:02d}.000+00:00",
+        "updatedAt": f"2025-01-02T00:00:{n:02d}.000+00:00",
+        "transcription_status": "completed",
+        "deleted": False,
+        "audioTrashed": False,
+    }
+    doc.update(extra)
+    return Document.from_dict(doc)
+
+
+class TestDocIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = DocIndex()
+        self.docs = [make_doc(n) for n in range(25)]
+        self.docs.append(make_doc(50, owner="bob"))
+        self.docs.append(make_doc(51, folderName="work"))
+        self.docs.append(make_doc(52, deleted=True, audioTrashed=True))
+        self.index.rebuild(self.docs)
+
+    def test_pages_cover_all_docs_in_order(self):
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = self.index.query(owner="alice", limit=10, cursor=cursor)
+            seen.extend(page)
+            if not cursor:
+                break
+        # Home, non-trashed docs of alice only, newest first
+        self.assertEqual(seen, [f"doc-{n:03d}" for n in range(24, -1, -1)])
+
+    def test_filters(self):
+        page, _ = self.index.query(owner="alice", folder="work")
+        self.assertEqual(page, ["doc-051"])
+        page, _ = self.index.query(owner="alice", folder=ANY_FOLDER, trashed=True)
+        self.assertEqual(page, ["doc-052"])
+        page, _ = self.index.query(owner="alice", status="pending")
+        self.assertEqual(page, [])
+        self.index.add(Document.from_dict(dict(self.docs[3], transcription_status="pending")))
+        page, _ = self.index.query(owner="alice", status="pending")
+        self.assertEqual(page, ["doc-003"])
+        page, _ = self.index.query(
+            owner="alice", sort="createdAt", order="asc",
+            created_after="2025-01-01T00:00:05", created_before="2025-01-01T00:00:07.999",
+        )
+        self.assertEqual(page, ["doc-005", "doc-006", "doc-007"])
+
+    def test_reindex_moves_doc_between_buckets(self):
+        doc = Document.from_dict(dict(self.docs[0], folderName="work"))
+        self.index.add(doc)
+        page, _ = self.index.query(owner="alice", folder="work", sort="name", order="asc")
+        self.assertEqual(page, ["doc-000", "doc-051"])
+        self.index.remove("doc-000")
+        page, _ = self.index.query(owner="alice", folder="work")
+        self.assertEqual(page, ["doc-051"])
+
+    def test_owner_query_only_sees_owner_buckets(self):
+        for i in range(20):
+            self.index.add(Document(id=f"other-{i}", owner=f"user-{i}", name="x",
+                                    createdAt="2025-01-01", updatedAt="2025-01-01"))
+        alice = list(self.index._select_buckets("alice", ANY_FOLDER, None, None))
+        self.assertEqual(len(alice), len(self.index._buckets["alice"]))
+        self.assertEqual(list(self.index._select_buckets("nobody", ANY_FOLDER, None, None)), [])
+        self.index.remove("other-0")
+        self.assertNotIn("user-0", self.index._buckets)
+
+    def test_range_must_be_on_sort_field(self):
+        with self.assertRaises(InvalidQuery):
+            self.index.query(owner="alice", sort="name", updated_after="2025-01-02T00:00:05")
+        page, _ = self.index.query(owner="alice", sort="updatedAt", updated_after="2025-01-02T00:00:22")
+        self.assertEqual(page, ["doc-024", "doc-023", "doc-022"])
+
+    def test_cursor_must_match_sort(self):
+        _, cursor = self.index.query(owner="alice", limit=5)
+        with self.assertRaises(InvalidQuery):
+            self.index.query(owner="alice", sort="name", cursor=cursor)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import pickle
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from services.doc_record import Document, TranscriptionStatus
+
+
+class TestDocument(unittest.TestCase):
+
+    def test_round_trip_keeps_exact_fields(self):
+        data = {"id": "a", "name": "A", "owner": "alice", "firebaseUrl": None, "custom": [1]}
+        doc = Document.from_dict(data)
+        self.assertEqual(doc.to_dict(), data)
+        self.assertEqual(dict(doc), data)
+        self.assertEqual(pickle.loads(pickle.dumps(doc)).to_dict(), data)
+
+    def test_unset_fields_read_as_defaults_but_are_absent(self):
+        doc = Document(id="a")
+        self.assertFalse(doc.deleted)
+        self.assertIsNone(doc.folderName)
+        self.assertNotIn("deleted", doc)
+        self.assertEqual(doc.get("deleted", "missing"), "missing")
+        with self.assertRaises(KeyError):
+            doc["folderName"]
+        with self.assertRaises(AttributeError):
+            doc.no_such_field
+
+    def test_read_only_and_interned(self):
+        doc = Document(id="a", owner="".join(["ali", "ce"]),
+                       transcription_status="".join(["comp", "leted"]))
+        with self.assertRaises(AttributeError):
+            doc.name = "B"
+        self.assertIs(doc.owner, Document(id="b", owner="alice").owner)
+        self.assertIs(doc.transcription_status, TranscriptionStatus.COMPLETED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import tempfile
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from services.doc_record import Document
+import struct
+import marshal
+import array
+import services.doc_snapshot as doc_snapshot
+import services.storage as storage
+from services.doc_snapshot import SnapshotReader, SnapshotError, write_snapshot
+
+
+class TestDocSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "doc_store.bin")
+        self.docs = {
+            "a": Document(id="a", name="A", owner="alice", deleted=False, version=3),
+            "b": Document(id="b", owner="bob", folderName="Work", custom={"x": [1, 2]}),
+        }
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        write_snapshot(self.path, self.docs, 42)
+        for use_mmap in (True, False):
+            with SnapshotReader(self.path, use_mmap=use_mmap) as reader:
+                self.assertEqual(reader.counter, 42)
+                self.assertEqual(len(reader), 2)
+                docs = reader.documents()
+            self.assertEqual({k: d.to_dict() for k, d in docs.items()},
+                             {k: d.to_dict() for k, d in self.docs.items()})
+            self.assertNotIn("name", docs["b"])
+
+    def test_get_reads_one_record(self):
+        write_snapshot(self.path, self.docs, 2)
+        with SnapshotReader(self.path) as reader:
+            self.assertEqual(reader.get("b").extra, {"custom": {"x": [1, 2]}})
+            self.assertIsNone(reader.get("missing"))
+
+    def test_truncated_file_is_rejected(self):
+        write_snapshot(self.path, self.docs, 2)
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 5)
+        with self.assertRaises(SnapshotError):
+            SnapshotReader(self.path)
+
+    def test_newer_format_is_rejected(self):
+        write_snapshot(self.path, self.docs, 2)
+        with open(self.path, "r+b") as f:
+            f.seek(len(doc_snapshot.MAGIC))
+            f.write(struct.pack("<I", doc_snapshot.FORMAT_VERSION + 1))
+        with self.assertRaises(SnapshotError):
+            SnapshotReader(self.path)
+
+    def test_marshal_snapshot_is_still_read(self):
+        # The first format, as written before snapshots were JSON records
+        records = [marshal.dumps(doc.to_tuple()) for doc in self.docs.values()]
+        offsets = array.array("Q")
+        position = len(doc_snapshot.MAGIC_V1) + 16
+        for record in records:
+            offsets.append(position)
+            position += len(record)
+        offsets.append(position)
+        index = marshal.dumps((7, doc_snapshot.FIELDS, list(self.docs), offsets.tobytes()))
+        with open(self.path, "wb") as f:
+            f.write(doc_snapshot.MAGIC_V1 + struct.pack("<QQ", position, len(index)))
+            f.write(b"".join(records) + index)
+        with SnapshotReader(self.path) as reader:
+            self.assertEqual(reader.counter, 7)
+            self.assertEqual(reader.get("b").folderName, "Work")
+
+    def test_other_file_is_rejected(self):
+        with open(self.path, "w") as f:
+            f.write('{"docs": {}, "counter": 0}')
+        with self.assertRaises(SnapshotError):
+            SnapshotReader(self.path)
+
+    def test_failed_snapshot_write_is_not_shadowed(self):
+        json_path = os.path.join(self.tmp.name, "doc_store.json")
+        write_snapshot(self.path, self.docs, 42)
+        saved = (storage.DOC_STORE_FORMAT, storage.DOC_STORE_SNAPSHOT, storage.DOC_STORE_FILE,
+                 storage.write_snapshot)
+
+        def fail(path, docs, counter):
+            raise OSError("disk full")
+
+        (storage.DOC_STORE_FORMAT, storage.DOC_STORE_SNAPSHOT, storage.DOC_STORE_FILE,
+         storage.write_snapshot) = ("binary", self.path, json_path, fail)
+        try:
+            storage.save_doc_store()
+        finally:
+            (storage.DOC_STORE_FORMAT, storage.DOC_STORE_SNAPSHOT, storage.DOC_STORE_FILE,
+             storage.write_snapshot) = saved
+        # The next load reads the JSON written instead of the old snapshot
+        self.assertIsNone(storage._read_snapshot(self.path))
+        self.assertTrue(os.path.exists(json_path))
+        self.assertTrue(os.path.exists(f"{self.path}.stale"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import threading
+import time
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from services.doc_store import DocStore, VersionConflict
+from services.doc_index import DocIndex
+from services.socketio_instance import parse_version
+from routes.docmanage import _expected_version
+
+
+class TestDocStore(unittest.TestCase):
+
+    def setUp(self):
+        self.index = DocIndex()
+        self.store = DocStore(index=self.index)
+        self.store.insert({"id": "a", "name": "A", "owner": "alice", "counter": 0})
+
+    def test_patch_is_copy_on_write(self):
+        before = self.store.get("a")
+        after = self.store.patch("a", {"name": "B"})
+        self.assertEqual(before["name"], "A")
+        self.assertEqual(after["name"], "B")
+        self.assertEqual(after["version"], before["version"] + 1)
+        self.assertEqual(self.index.query(owner="alice", sort="name")[0], ["a"])
+
+    def test_socket_versions_are_validated(self):
+        self.assertIsNone(parse_version(None))
+        self.assertEqual(parse_version(3), 3)
+        self.assertEqual(parse_version(" 4"), 4)
+        for value in ("abc", "-1", -1, 1.5, True, [], {}):
+            with self.assertRaises(ValueError):
+                parse_version(value)
+
+    def test_http_versions_are_validated(self):
+        self.assertIsNone(_expected_version(None))
+        self.assertEqual(_expected_version(3), 3)
+        self.assertEqual(_expected_version('"4"'), 4)
+        for value in ("abc", 1.5, True, [], {}):
+            with self.assertRaises(ValueError):
+                _expected_version(value)
+
+    def test_removed_lock_is_not_shared(self):
+        # A writer got the lock of "a" just before remove() dropped it
+        old = self.store._lock_for("a")
+        old.acquire()
+        entered = threading.Event()
+
+        def write():
+            with self.store._locked("a"):
+                entered.set()
+
+        waiter = threading.Thread(target=write)
+        waiter.start()
+        time.sleep(0.05)
+        self.store._locks.pop("a")
+        with self.store._locked("a"):
+            old.release()
+            # The waiter woke up on the dropped lock and now waits for the current one
+            self.assertFalse(entered.wait(0.1))
+        waiter.join(5)
+        self.assertTrue(entered.is_set())
+
+    def test_compare_and_set(self):
+        version = self.store.get("a")["version"]
+        self.store.patch("a", {"name": "B"}, expected_version=version)
+        with self.assertRaises(VersionConflict):
+            self.store.patch("a", {"name": "C"}, expected_version=version)
+        self.assertEqual(self.store.get("a")["name"], "B")
+
+    def test_concurrent_mutations_are_not_lost(self):
+        def increment(record):
+            record["counter"] += 1
+
+        def worker():
+            for _ in range(200):
+                self.store.mutate("a", increment)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.store.get("a")["counter"], 1600)
+
+    def test_iteration_survives_concurrent_inserts(self):
+        for n in range(100):
+            self.store.insert({"id": f"d{n}", "owner": "alice"})
+        seen = 0
+        for doc_id in self.store.keys():
+            self.store.insert({"id": f"new-{doc_id}", "owner": "alice"})
+            seen += 1
+        self.assertEqual(seen, 101)
+        self.assertIsNotNone(self.store.remove("a"))
+        self.assertNotIn("a", self.store)
+
+
+if __name__ == '__main__':
+    unittest.main()
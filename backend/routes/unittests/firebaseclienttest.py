@@ -0,0 +1,55 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import firebase_admin
+import services.firebase_client as firebase_client
+
+
+class FakeBucket:
+    name = "test-bucket"
+
+    def blob(self, path):
+        return path
+
+
+class TestFirebaseClient(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = (firebase_client._app, firebase_client._bucket, firebase_client._failed_at,
+                       firebase_client.FIREBASE_SERVICE_ACCOUNT_KEY)
+        firebase_client._failed_at = None
+        firebase_client.FIREBASE_SERVICE_ACCOUNT_KEY = "/nonexistent/Accesskey.json"
+
+    def tearDown(self):
+        (firebase_client._app, firebase_client._bucket, firebase_client._failed_at,
+         firebase_client.FIREBASE_SERVICE_ACCOUNT_KEY) = self._saved
+
+    def test_importing_clients_does_not_initialize(self):
+        import services.firebase_service
+        import firebase_helper
+        self.assertEqual(firebase_admin._apps, {})
+        self.assertIsNone(firebase_client._bucket)
+
+    def test_unavailable_until_retry_interval(self):
+        self.assertIsNone(firebase_client.get_bucket())
+        self.assertFalse(firebase_client.bucket)
+        failed_at = firebase_client._failed_at
+        self.assertIsNotNone(failed_at)
+        # Not retried on every call
+        self.assertIsNone(firebase_client.get_db())
+        self.assertEqual(firebase_client._failed_at, failed_at)
+        with self.assertRaises(RuntimeError):
+            firebase_client.bucket.blob("users/alice/uploads/a.mp3")
+
+    def test_lazy_client_forwards_to_shared_client(self):
+        bucket = FakeBucket()
+        firebase_client._bucket = bucket
+        self.assertIs(firebase_client.get_bucket(), bucket)
+        self.assertTrue(firebase_client.bucket)
+        self.assertEqual(firebase_client.bucket.name, "test-bucket")
+        self.assertEqual(firebase_client.bucket.blob("a.mp3"), "a.mp3")
+
+
+if __name__ == '__main__':
+    unittest.main()
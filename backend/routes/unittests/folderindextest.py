@@ -0,0 +1,111 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import services.folder_index as folder_index
+import services.firebase_service as firebase_service
+from services.storage import doc_store
+
+
+class FakeBlob:
+
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeBucket:
+
+    def __init__(self, names):
+        self.names = list(names)
+
+    def list_blobs(self, prefix):
+        return [FakeBlob(name) for name in self.names if name.startswith(prefix)]
+
+
+class TestFolderIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = (folder_index.save_doc_store, firebase_service.bucket, firebase_service.move_file,
+                       firebase_service.delete_files, folder_index.socketio.start_background_task)
+        self.started = []
+        folder_index.save_doc_store = lambda: None
+        folder_index.socketio.start_background_task = lambda fn, *args: self.started.append((fn, args))
+        folder_index.folder_index.clear()
+        for i in range(3):
+            doc_store.insert({"id": f"f{i}", "owner": "alice", "audioFilename": f"a{i}.mp3"})
+
+    def tearDown(self):
+        (folder_index.save_doc_store, firebase_service.bucket, firebase_service.move_file,
+         firebase_service.delete_files, folder_index.socketio.start_background_task) = self._saved
+        folder_index._migrating.clear()
+        folder_index.folder_index.clear()
+        for i in range(3):
+            doc_store.remove(f"f{i}")
+
+    def test_move_is_a_metadata_write(self):
+        self.assertTrue(folder_index.add_folder("alice", "Work"))
+        self.assertFalse(folder_index.add_folder("alice", "Work"))
+        self.assertEqual(folder_index.move_docs(["f0", "f2", "missing"], "Work"), ["f0", "f2"])
+        self.assertEqual({d.id for d in folder_index.docs_in_folder("alice", "Work")}, {"f0", "f2"})
+        folder_index.move_docs(["f2"], None)
+        self.assertEqual([d.id for d in folder_index.docs_in_folder("alice", "Work")], ["f0"])
+        self.assertIsNone(doc_store.get("f2").folderName)
+        self.assertTrue(folder_index.remove_folder("alice", "Work"))
+        self.assertEqual(folder_index.list_folders("alice"), [])
+
+    def test_migrates_storage_folders_once(self):
+        bucket = FakeBucket([
+            "users/alice/folders/.Work",
+            "users/alice/folders/.Empty",
+            "users/alice/folders/Work/",
+            "users/alice/folders/Work/a1.mp3",
+            "users/alice/uploads/a0.mp3",
+        ])
+        moves = []
+
+        def move_file(source, dest, uid):
+            moves.append((source, dest))
+            bucket.names.remove(source)
+            bucket.names.append(dest)
+            return True
+
+        def delete_files(paths, uid):
+            for path in paths:
+                bucket.names.remove(path)
+            return {"deleted": paths, "failed": {}}
+
+        firebase_service.bucket = bucket
+        firebase_service.move_file = move_file
+        firebase_service.delete_files = delete_files
+        # The request doesn't wait for the migration; it runs in the background
+        self.assertEqual(folder_index.list_folders("alice"), [])
+        self.assertEqual(len(self.started), 1)
+        self.assertEqual(folder_index.list_folders("alice"), [])
+        self.assertEqual(len(self.started), 1)
+        fn, args = self.started[0]
+        fn(*args)
+        self.assertEqual(folder_index.list_folders("alice"), ["Empty", "Work"])
+        self.assertEqual(moves, [("users/alice/folders/Work/a1.mp3", "users/alice/uploads/a1.mp3")])
+        self.assertEqual(doc_store.get("f1").folderName, "Work")
+        self.assertEqual(doc_store.get("f1").firebasePath, "users/alice/uploads/a1.mp3")
+        self.assertEqual(sorted(bucket.names), ["users/alice/uploads/a0.mp3", "users/alice/uploads/a1.mp3"])
+        # Marked as migrated: the bucket is not listed again
+        bucket.names.append("users/alice/folders/.Late")
+        self.assertEqual(folder_index.list_folders("alice"), ["Empty", "Work"])
+        self.assertEqual(len(self.started), 1)
+
+    def test_failed_migration_backs_off(self):
+        firebase_service.bucket = None
+        folder_index.migrate_all_users()
+        entry = folder_index.folder_index["alice"]
+        self.assertEqual((entry["migrated"], entry["attempts"]), (False, 1))
+        # Not retried by requests until the backoff has passed
+        folder_index.list_folders("alice")
+        self.assertEqual(self.started, [])
+        entry["failedAt"] -= folder_index.MIGRATION_RETRY_DELAY
+        folder_index.list_folders("alice")
+        self.assertEqual(len(self.started), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
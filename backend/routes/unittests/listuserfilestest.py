@@ -0,0 +1,143 @@
+import unittest
+import sys
+import time
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import services.firebase_service as firebase_service
+import services.blob_index as blob_index
+from services.shared_state import InMemoryStateBackend, SharedMapping
+
+
+class FakeBlob:
+
+    def __init__(self, name):
+        self.name = name
+        self.metadata = {"ownerId": "u1", "originalFilename": name.split("/")[-1] + ".mp3"}
+        self.content_type = "audio/mpeg"
+        self.size = 10
+        self.time_created = None
+
+    def reload(self):
+        raise AssertionError("listing must not reload blobs")
+
+
+class FakePage(list):
+    prefixes = ()
+
+
+class FakeIterator:
+
+    def __init__(self, page, next_page_token):
+        self.pages = iter([page])
+        self.next_page_token = next_page_token
+
+
+class FakeBucket:
+    """Lists blobs like GCS, two per page"""
+
+    def __init__(self, names):
+        self.names = sorted(names)
+        self.requests = 0
+
+    def list_blobs(self, prefix, delimiter=None, max_results=None, page_token=None, fields=None):
+        self.requests += 1
+        names = [n for n in self.names if n.startswith(prefix)]
+        page = FakePage()
+        prefixes = set()
+        for name in names:
+            cut = name.find(delimiter, len(prefix)) if delimiter else -1
+            if cut != -1:
+                prefixes.add(name[:cut + 1])
+            else:
+                page.append(FakeBlob(name))
+        start = int(page_token or 0)
+        result = FakePage(page[start:start + 2])
+        result.prefixes = tuple(prefixes)
+        more = start + 2 < len(page)
+        return FakeIterator(result, str(start + 2) if more else None)
+
+
+class TestListUserFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.bucket = FakeBucket([
+            "users/u1/uploads/.folder_marker",
+            "users/u1/uploads/a", "users/u1/uploads/b", "users/u1/uploads/c",
+            "users/u1/folders/.work", "users/u1/folders/work/a",
+        ])
+        self._saved = (firebase_service.bucket, blob_index.BLOB_LISTING_INDEX, blob_index.blob_index,
+                       blob_index._file_maps, blob_index.BLOB_LISTING_INDEX_TTL)
+        firebase_service.bucket = self.bucket
+        blob_index.blob_index = {}
+        blob_index._file_maps = {}
+
+    def tearDown(self):
+        (firebase_service.bucket, blob_index.BLOB_LISTING_INDEX, blob_index.blob_index,
+         blob_index._file_maps, blob_index.BLOB_LISTING_INDEX_TTL) = self._saved
+
+    def test_one_request_per_page(self):
+        files = firebase_service.list_user_files("u1", "uploads")
+        self.assertEqual([f["filename"] for f in files], ["a", "b", "c"])
+        self.assertEqual(files[0]["originalFilename"], "a.mp3")
+        self.assertEqual(self.bucket.requests, 2)
+
+    def test_delimiter(self):
+        page = firebase_service.list_user_files_page("u1", "folders/", delimiter="/")
+        self.assertEqual([f["filename"] for f in page["files"]], [".work"])
+        self.assertEqual(page["prefixes"], ["users/u1/folders/work/"])
+
+    def test_index_serves_listed_prefixes(self):
+        blob_index.BLOB_LISTING_INDEX = True
+        firebase_service.list_user_files("u1", "")
+        requests = self.bucket.requests
+        blob_index.forget_blob("users/u1/uploads/b")
+        files = firebase_service.list_user_files("u1", "uploads")
+        self.assertEqual([f["filename"] for f in files], ["a", "c"])
+        folders = firebase_service.list_user_files("u1", "folders/", delimiter="/")
+        self.assertEqual([f["filename"] for f in folders], [".work"])
+        self.assertEqual(self.bucket.requests, requests)
+
+    def test_index_expires(self):
+        blob_index.BLOB_LISTING_INDEX = True
+        firebase_service.list_user_files("u1", "uploads")
+        requests = self.bucket.requests
+        blob_index.BLOB_LISTING_INDEX_TTL = -1
+        self.bucket.names.remove("users/u1/uploads/c")
+        files = firebase_service.list_user_files("u1", "uploads")
+        self.assertEqual([f["filename"] for f in files], ["a", "b"])
+        self.assertGreater(self.bucket.requests, requests)
+        self.assertNotIn("users/u1/uploads/c", blob_index._files("u1"))
+
+    def test_listing_keeps_blobs_recorded_while_it_ran(self):
+        blob_index.BLOB_LISTING_INDEX = True
+        firebase_service.list_user_files("u1", "uploads")
+        time.sleep(0.01)
+        started = time.time()
+        info = {"storagePath": "users/u1/uploads/d", "filename": "d"}
+        blob_index.record_blob(info)
+        # A listing that started before the upload doesn't see the new blob
+        blob_index.store_listing("u1", "users/u1/uploads/", [], listed_at=started)
+        files, _ = blob_index.lookup("u1", "users/u1/uploads/")
+        self.assertEqual(files, [info])
+
+    def test_shared_index(self):
+        blob_index.BLOB_LISTING_INDEX = True
+        backend = InMemoryStateBackend()
+        blob_index.blob_index = SharedMapping(backend, "blob_index")
+        saved = blob_index.shared_mapping
+        blob_index.shared_mapping = lambda namespace: SharedMapping(backend, namespace)
+        try:
+            firebase_service.list_user_files("u1", "uploads")
+            blob_index.store_listing("u1", "users/u1/folders/", [])
+            blob_index.forget_blob("users/u1/uploads/a")
+            files, _ = blob_index.lookup("u1", "users/u1/uploads/")
+            self.assertEqual([f["filename"] for f in files], ["b", "c"])
+            self.assertEqual(set(backend.items("blob_index")["u1"]["complete"]),
+                             {"users/u1/uploads", "users/u1/folders/"})
+            self.assertIn("users/u1/uploads/b", backend.items("blob_index:u1"))
+        finally:
+            blob_index.shared_mapping = saved
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import tempfile
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import services.reconciler as reconciler_module
+from services.reconciler import Reconciler
+from services.storage import doc_store
+from services.doc_record import StorageStatus
+
+
+class FakeBlob:
+
+    def __init__(self, name, generation):
+        self.name = name
+        self.generation = generation
+
+
+class FakeBucket:
+
+    def __init__(self, blobs):
+        self.blobs = dict(blobs)
+        self.listings = 0
+
+    def list_blobs(self, prefix, fields=None, start_offset=None, max_results=None):
+        self.listings += 1
+        names = sorted(name for name in self.blobs
+                       if name.startswith(prefix) and (start_offset is None or name >= start_offset))
+        return [FakeBlob(name, self.blobs[name]) for name in names[:max_results]]
+
+
+class TestReconciler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.uploads = []
+        self._saved = (reconciler_module.save_doc_store, reconciler_module.start_storage_upload,
+                       reconciler_module.UPLOAD_FOLDER)
+        reconciler_module.save_doc_store = lambda: None
+        reconciler_module.start_storage_upload = lambda *args: self.uploads.append(args)
+        reconciler_module.UPLOAD_FOLDER = self.tmp.name
+        self.local = os.path.join(self.tmp.name, "r2.mp3")
+        with open(self.local, "wb") as f:
+            f.write(b"audio")
+        doc_store.insert({"id": "r1", "owner": "alice", "audioFilename": "r1.mp3",
+                          "storage_status": StorageStatus.FAILED, "storage_error": "timeout"})
+        doc_store.insert({"id": "r2", "owner": "alice", "audioFilename": "r2.mp3",
+                          "storage_status": StorageStatus.UPLOADED,
+                          "firebasePath": "users/alice/uploads/r2.mp3", "localPath": self.local})
+        doc_store.insert({"id": "r3", "owner": "alice", "audioFilename": "r3.mp3",
+                          "firebasePath": "users/alice/uploads/r3.mp3",
+                          "localPath": os.path.join(self.tmp.name, "gone.mp3")})
+        self.bucket = FakeBucket({
+            "users/alice/uploads/r1.mp3": 1,
+            "users/alice/uploads/stray.mp3": 7,
+            "users/alice/trash/old.mp3": 3,
+        })
+        self.reconciler = Reconciler()
+
+    def tearDown(self):
+        (reconciler_module.save_doc_store, reconciler_module.start_storage_upload,
+         reconciler_module.UPLOAD_FOLDER) = self._saved
+        for doc_id in ("r1", "r2", "r3"):
+            doc_store.remove(doc_id)
+        self.tmp.cleanup()
+
+    def test_repairs_and_reports_drift(self):
+        self.reconciler.run(self.bucket)
+        doc = doc_store.get("r1")
+        self.assertEqual(doc.storage_status, StorageStatus.UPLOADED)
+        self.assertEqual(doc.firebasePath, "users/alice/uploads/r1.mp3")
+        self.assertIsNone(doc.storage_error)
+        self.assertEqual(self.uploads, [("r2", self.local, "users/alice/uploads/r2.mp3")])
+        self.assertIsNone(doc_store.get("r3").localPath)
+        stats = self.reconciler.stats()
+        self.assertEqual(stats["drift"], {"orphan_blob": 1, "missing_audio": 1})
+        self.assertEqual(stats["repairs"], {"storage_status": 1, "reupload": 1, "stale_local_path": 1})
+
+    def test_only_changed_paths_are_checked(self):
+        self.reconciler.run(self.bucket)
+        # The repairs bumped two document versions
+        self.assertEqual(self.reconciler.run(self.bucket), 2)
+        self.assertEqual(self.reconciler.run(self.bucket), 0)
+        self.bucket.blobs["users/alice/uploads/r3.mp3"] = 1
+        del self.bucket.blobs["users/alice/uploads/stray.mp3"]
+        self.assertEqual(self.reconciler.run(self.bucket), 2)
+        self.assertEqual(self.reconciler.stats()["drift"], {})
+
+    def test_bucket_is_swept_incrementally(self):
+        self.reconciler.list_batch = 1
+        # users/alice/trash/old.mp3 and users/alice/uploads/r1.mp3: r2 and r3
+        # sort after the sweep position, so they are not checked yet
+        self.reconciler.run(self.bucket)
+        self.reconciler.run(self.bucket)
+        self.assertEqual(doc_store.get("r1").storage_status, StorageStatus.UPLOADED)
+        self.assertEqual(self.uploads, [])
+        # users/alice/uploads/stray.mp3, then the end of the blobs/ prefix
+        self.reconciler.run(self.bucket)
+        self.reconciler.run(self.bucket)
+        self.assertEqual(self.reconciler.stats()["sweeps"], 1)
+        self.assertEqual(self.uploads, [("r2", self.local, "users/alice/uploads/r2.mp3")])
+        self.assertEqual(self.reconciler.stats()["drift"], {"orphan_blob": 1, "missing_audio": 1})
+
+        # A blob deleted behind the sweep is noticed when the next sweep completes
+        del self.bucket.blobs["users/alice/uploads/stray.mp3"]
+        for _ in range(4):
+            self.reconciler.run(self.bucket)
+        self.assertEqual(self.reconciler.stats()["drift"], {"missing_audio": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
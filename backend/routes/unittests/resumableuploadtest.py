@@ -0,0 +1,57 @@
+import unittest
+import tempfile
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from services.resumable_upload import upload_file_resumable, UploadError, CHUNK_ALIGNMENT
+
+
+class FakeBlob:
+    """Records how the client library upload is called"""
+
+    content_type = "audio/mpeg"
+
+    def __init__(self, error=None):
+        self.chunk_size = None
+        self.error = error
+        self.calls = []
+
+    def upload_from_filename(self, filename, content_type=None, timeout=None, retry=None):
+        self.calls.append((filename, content_type, timeout, retry))
+        if self.error:
+            raise self.error
+
+
+class TestResumableUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "audio.mp3")
+        with open(self.path, "wb") as f:
+            f.write(b"audio")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_streams_in_aligned_chunks_with_timeouts(self):
+        blob = FakeBlob()
+        self.assertIs(upload_file_resumable(blob, self.path, chunk_size=CHUNK_ALIGNMENT + 1,
+                                            timeout=30, retry_timeout=120), blob)
+        self.assertEqual(blob.chunk_size, CHUNK_ALIGNMENT * 2)
+        filename, content_type, timeout, retry = blob.calls[0]
+        self.assertEqual((filename, content_type, timeout), (self.path, "audio/mpeg", 30))
+        self.assertEqual(retry.timeout, 120)
+
+    def test_small_chunk_size_is_rounded_up(self):
+        blob = FakeBlob()
+        upload_file_resumable(blob, self.path, content_type="audio/wav", chunk_size=1)
+        self.assertEqual(blob.chunk_size, CHUNK_ALIGNMENT)
+        self.assertEqual(blob.calls[0][1], "audio/wav")
+
+    def test_failure_raises_upload_error(self):
+        with self.assertRaises(UploadError):
+            upload_file_resumable(FakeBlob(ConnectionError("connection reset")), self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import tempfile
+import sqlite3
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from flask import Flask
+import auth
+import routes.search as search_route
+from services.storage import doc_store
+from services.content_store import ContentCorruptError
+from services.search_index import SearchIndex, InvalidSearch, build_match, hit_timestamps
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index = SearchIndex(os.path.join(self.tmpdir.name, "search.db"))
+        self.index.index_document("a", "alice", "The quarterly budget meeting ran long. " * 40)
+        self.index.index_document("b", "bob", "Budget talks with <b>vendors</b>.")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_results_are_scoped_to_owner(self):
+        results = self.index.search("budget", owner="alice")
+        self.assertEqual([r["doc_id"] for r in results], ["a"])
+        self.assertIn("<mark>budget</mark>", results[0]["hits"][0]["snippet"])
+        self.assertEqual(len(self.index.search("budget")), 2)
+
+    def test_snippets_are_escaped(self):
+        hit = self.index.search("vendors", owner="bob")[0]["hits"][0]
+        self.assertIn("&lt;b&gt;<mark>vendors</mark>&lt;/b&gt;", hit["snippet"])
+
+    def test_incremental_updates(self):
+        self.index.append_text("c", "alice", "Old transcription about giraffes", start=0, end=30)
+        self.index.start_document("c", "alice", has_segments=True)
+        self.index.append_text("c", "alice", "First chunk about zebras", start=0, end=30)
+        self.index.append_text("c", "alice", "Second chunk about giraffes", start=30, end=60)
+        results = self.index.search("giraffes", owner="alice")
+        self.assertEqual(len(results[0]["hits"]), 1)
+        self.assertEqual((results[0]["hits"][0]["start"], results[0]["hits"][0]["end"]), (30, 60))
+        self.assertTrue(results[0]["has_segments"])
+        self.index.index_document("c", "alice", "Edited to mention only lions")
+        self.assertEqual(self.index.search("giraffes", owner="alice"), [])
+        self.assertEqual(len(self.index.search("lions", owner="alice")), 1)
+        self.index.remove_document("c")
+        self.assertEqual(self.index.search("lions", owner="alice"), [])
+
+    def test_older_schema_is_rebuilt(self):
+        path = os.path.join(self.tmpdir.name, "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE docs (num INTEGER PRIMARY KEY, doc_id TEXT)")
+        conn.execute("CREATE VIRTUAL TABLE passages USING fts5(owner, text, start UNINDEXED)")
+        conn.commit()
+        conn.close()
+        index = SearchIndex(path)
+        index.append_text("d", "alice", "timed chunk", start=0, end=30)
+        self.assertEqual(index.search("timed", owner="alice")[0]["hits"][0]["end"], 30)
+
+    def test_query_parsing(self):
+        self.assertEqual(build_match('budg* "ran long" OR'), '"budg"* "ran long" "OR"')
+        with self.assertRaises(InvalidSearch):
+            build_match('"" * -')
+        segments = [{"start": 0, "text": "hello"}, {"start": 12.5, "text": "the Budget"}]
+        self.assertEqual(hit_timestamps(["budget"], segments), [12.5])
+
+    def test_corrupt_content_does_not_fail_the_search(self):
+        saved = (auth.auth.verify_id_token, auth.get_app, search_route.get_search_index,
+                 search_route.load_content)
+
+        def load_content(doc_id):
+            raise ContentCorruptError(f"Content of doc {doc_id} is corrupt")
+
+        auth.auth.verify_id_token = lambda token, app=None: {"uid": token}
+        auth.get_app = lambda: None
+        search_route.get_search_index = lambda: self.index
+        search_route.load_content = load_content
+        self.index.index_document("c", "carol", "Budget review", [{"start": 2.0, "text": "Budget review"}])
+        doc_store.insert({"id": "c", "owner": "carol", "name": "C"})
+        try:
+            app = Flask(__name__)
+            app.register_blueprint(search_route.search_bp)
+            response = app.test_client().get("/api/search?q=budget",
+                                             headers={"Authorization": "Bearer carol"})
+        finally:
+            (auth.auth.verify_id_token, auth.get_app, search_route.get_search_index,
+             search_route.load_content) = saved
+            doc_store.remove("c")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["doc_id"] for r in response.get_json()["results"]], ["c"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import unittest
+import tempfile
+import threading
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from services.shared_state import (
+    SQLiteStateBackend, InMemoryStateBackend, StateConflict, SharedMapping, update_entry, claim_host,
+    hold_lease,
+)
+from services.doc_store import DocStore, VersionConflict
+from flask import Flask
+import auth
+import routes.user_settings as user_settings
+
+
+class SharedStateTests:
+    """Runs against each StateBackend; two DocStores play two workers"""
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.backend = self.make_backend()
+        self.worker_a = DocStore(backend=self.backend, sync_interval=0)
+        self.worker_b = DocStore(backend=self.make_peer(), sync_interval=0)
+
+    def make_peer(self):
+        return self.backend
+
+    def test_compare_and_set(self):
+        version = self.backend.put("settings", "alice", {"mode": "local-cpu"})
+        self.backend.put("settings", "alice", {"mode": "replicate"}, expected_version=version)
+        with self.assertRaises(StateConflict):
+            self.backend.put("settings", "alice", {"mode": "x"}, expected_version=version)
+        self.assertEqual(self.backend.get("settings", "alice")[0], {"mode": "replicate"})
+
+    def test_settings_updates_of_workers_are_merged(self):
+        saved = (auth.auth.verify_id_token, auth.get_app, user_settings.user_settings_store)
+        auth.auth.verify_id_token = lambda token, app=None: {"uid": token}
+        auth.get_app = lambda: None
+        app = Flask(__name__)
+        app.register_blueprint(user_settings.user_settings_bp)
+        client = app.test_client()
+        headers = {"Authorization": "Bearer alice"}
+        try:
+            for backend, data in ((self.backend, {"theme": "dark"}), (self.make_peer(), {"language": "de"})):
+                user_settings.user_settings_store = SharedMapping(backend, "settings")
+                self.assertEqual(client.post("/api/user-settings", json=data, headers=headers).status_code, 200)
+            settings = client.get("/api/user-settings", headers=headers).get_json()
+        finally:
+            (auth.auth.verify_id_token, auth.get_app, user_settings.user_settings_store) = saved
+        self.assertEqual(settings, {"theme": "dark", "language": "de"})
+
+    def test_workers_see_each_others_writes(self):
+        self.worker_a.insert({"id": "d1", "owner": "alice", "name": "Doc1"})
+        self.assertEqual(self.worker_b.get("d1")["name"], "Doc1")
+        self.worker_b.patch("d1", {"name": "Renamed"})
+        self.assertEqual(self.worker_a.get("d1")["name"], "Renamed")
+        self.worker_a.remove("d1")
+        self.assertNotIn("d1", self.worker_b)
+
+    def test_stale_worker_cannot_lose_updates(self):
+        self.worker_a.insert({"id": "d1", "owner": "alice", "count": 0})
+
+        def increment(record):
+            record["count"] += 1
+
+        def run(store):
+            for _ in range(50):
+                store.mutate("d1", increment)
+
+        threads = [threading.Thread(target=run, args=(store,))
+                   for store in (self.worker_a, self.worker_b)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.backend.get("docs", "d1")[0]["count"], 100)
+        with self.assertRaises(VersionConflict):
+            self.worker_b.patch("d1", {"count": 0}, expected_version=1)
+
+    def test_put_many_is_all_or_nothing(self):
+        self.backend.put("settings", "alice", {"mode": "a"})
+        with self.assertRaises(StateConflict):
+            self.backend.put_many("settings", [("bob", {"mode": "b"}, 0), ("alice", {"mode": "x"}, 0)])
+        self.assertEqual(self.backend.get("settings", "bob")[0], None)
+        self.assertEqual(self.backend.put_many("settings", [("bob", {"mode": "b"}, 0)]), [1])
+
+    def test_patch_many_writes_all_docs(self):
+        self.worker_a.insert({"id": "d1", "owner": "alice"})
+        self.worker_a.insert({"id": "d2", "owner": "alice"})
+        self.worker_b.patch("d2", {"name": "Renamed"})
+        updated = self.worker_a.patch_many({"d1": {"folderName": "Work"}, "d2": {"folderName": "Work"},
+                                            "missing": {"folderName": "Work"}})
+        self.assertEqual(sorted(updated), ["d1", "d2"])
+        self.assertEqual(self.worker_b.get("d2")["name"], "Renamed")
+        self.assertEqual(self.worker_b.get("d1")["folderName"], "Work")
+        self.assertEqual(self.worker_b.get("d2")["version"], 3)
+
+    def test_insert_reuses_deleted_id(self):
+        self.worker_a.insert({"id": "d1", "owner": "alice"})
+        self.worker_a.remove("d1")
+        record = self.worker_b.insert({"id": "d1", "owner": "bob"})
+        # The version continues from the tombstone, so compare-and-set keeps working
+        self.assertEqual(record["version"], self.backend.get("docs", "d1")[1])
+        self.worker_a.patch("d1", {"name": "Again"}, expected_version=record["version"])
+        self.assertEqual(self.worker_b.get("d1")["name"], "Again")
+        with self.assertRaises(VersionConflict):
+            self.worker_a.insert({"id": "d1", "owner": "carol"})
+
+    def test_update_entry_loses_no_updates(self):
+        mappings = [SharedMapping(self.backend, "jobs"), SharedMapping(self.make_peer(), "jobs")]
+
+        def run(mapping):
+            for _ in range(50):
+                update_entry(mapping, "job", lambda job: {"count": (job or {"count": 0})["count"] + 1},
+                             attempts=1000)
+
+        threads = [threading.Thread(target=run, args=(m,)) for m in mappings]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.backend.get("jobs", "job")[0], {"count": 100})
+        update_entry(mappings[0], "job", lambda job: None)
+        self.assertNotIn("job", mappings[1])
+
+    def test_backend_is_pinned_to_one_host(self):
+        claim_host(self.backend, "host-a", multi_host=False)
+        claim_host(self.make_peer(), "host-a", multi_host=False)
+        with self.assertRaises(RuntimeError):
+            claim_host(self.make_peer(), "host-b", multi_host=False)
+        claim_host(self.make_peer(), "host-b", multi_host=True)
+
+    def test_one_worker_holds_a_lease(self):
+        self.assertTrue(hold_lease(self.backend, "reconciler", 60, holder="a"))
+        self.assertFalse(hold_lease(self.make_peer(), "reconciler", 60, holder="b"))
+        # The holder renews it; it expires when it stops
+        self.assertTrue(hold_lease(self.backend, "reconciler", -1, holder="a"))
+        self.assertTrue(hold_lease(self.make_peer(), "reconciler", 60, holder="b"))
+        self.assertFalse(hold_lease(self.backend, "reconciler", 60, holder="a"))
+        self.assertTrue(hold_lease(None, "reconciler", 60))
+
+    def test_counter(self):
+        self.assertEqual([self.backend.incr("doc_counter") for _ in range(3)], [1, 2, 3])
+
+
+class TestSQLiteStateBackend(SharedStateTests, unittest.TestCase):
+
+    def make_backend(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "state.db")
+        return SQLiteStateBackend(self.path)
+
+    def make_peer(self):
+        # A second connection to the same file, as another process would have
+        return SQLiteStateBackend(self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+class TestInMemoryStateBackend(SharedStateTests, unittest.TestCase):
+
+    def make_backend(self):
+        return InMemoryStateBackend()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import threading
+import time
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from services.signed_url_cache import SignedUrlCache
+
+
+class TestSignedUrlCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = SignedUrlCache(margin=300, max_entries=100)
+        self.signed = 0
+
+    def sign(self):
+        self.signed += 1
+        return f"https://signed/{self.signed}"
+
+    def test_reuses_url_until_margin(self):
+        first = self.cache.get_url("p", self.sign, 3600)
+        self.assertEqual(self.cache.get_url("p", self.sign, 3600), first)
+        self.assertNotEqual(self.cache.get_url("p", self.sign, 3600, method="PUT"), first)
+        # Less than the margin left: sign again
+        self.cache.put("p", first, time.time() + 200)
+        self.assertNotEqual(self.cache.get_url("p", self.sign, 3600), first)
+        self.assertEqual(self.signed, 3)
+
+    def test_never_hands_out_a_longer_lived_url(self):
+        self.cache.put("p", "week-long", time.time() + 7 * 86400)
+        self.assertNotEqual(self.cache.get_url("p", self.sign, 3600), "week-long")
+        self.cache.put("q", "week-long", time.time() + 7 * 86400)
+        self.assertEqual(self.cache.get_url("q", self.sign, 7 * 86400), "week-long")
+
+    def test_missing_blob_is_not_cached(self):
+        self.assertIsNone(self.cache.get_url("p", lambda: None, 3600))
+        self.assertIsNotNone(self.cache.get_url("p", self.sign, 3600))
+
+    def test_concurrent_misses_sign_once(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_sign():
+            started.set()
+            release.wait(5)
+            return self.sign()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.cache.get_url("p", slow_sign, 3600))) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while self.cache.stats()["coalesced"] < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.signed, 1)
+        self.assertEqual(set(results), {"https://signed/1"})
+
+    def test_concurrent_misses_with_other_lifetimes_sign_their_own(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_sign():
+            started.set()
+            release.wait(5)
+            return self.sign()
+
+        results = {}
+        week = threading.Thread(target=lambda: results.setdefault(
+            "week", self.cache.get_url("p", slow_sign, 7 * 86400)))
+        week.start()
+        started.wait(5)
+        # Doesn't wait for the week-long URL in flight
+        results["hour"] = self.cache.get_url("p", self.sign, 3600)
+        release.set()
+        week.join()
+        self.assertEqual(self.signed, 2)
+        self.assertNotEqual(results["hour"], results["week"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import tempfile
+import sys
+import os
+from urllib.parse import urlsplit, parse_qs
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from flask import Flask
+import routes.storage_route as storage_route
+import services.storage_backend as storage_backend
+from services.storage_backend import LocalStorageBackend
+
+
+class TestLocalStorageBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = LocalStorageBackend(os.path.join(self.tmp.name, "storage"), secret="s3cret")
+        self.local = os.path.join(self.tmp.name, "a.mp3")
+        with open(self.local, "wb") as f:
+            f.write(b"0123456789")
+        self.storage.upload_file_by_path(self.local, "users/alice/uploads/a.mp3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_upload_list_move_delete(self):
+        self.assertTrue(self.storage.exists("users/alice/uploads/a.mp3"))
+        files = self.storage.list_user_files("alice", "uploads/")
+        self.assertEqual([(f["filename"], f["size"], f["ownerId"]) for f in files], [("a.mp3", 10, "alice")])
+        self.assertEqual([b.name for b in self.storage.list_blobs("users/")], ["users/alice/uploads/a.mp3"])
+
+        self.assertFalse(self.storage.move_file("users/alice/uploads/a.mp3", "users/alice/trash/a.mp3", "bob"))
+        self.assertTrue(self.storage.move_file("users/alice/uploads/a.mp3", "users/alice/trash/a.mp3", "alice"))
+        self.assertFalse(self.storage.exists("users/alice/uploads/a.mp3"))
+
+        result = self.storage.delete_files(["users/alice/trash/a.mp3", "users/carol/uploads/c.mp3"], "alice")
+        self.assertEqual(result, {"deleted": ["users/alice/trash/a.mp3"],
+                                  "failed": {"users/carol/uploads/c.mp3": "Access denied"}})
+        self.assertFalse(self.storage.exists("users/alice/trash/a.mp3"))
+
+    def test_generated_secret_is_shared_by_the_install(self):
+        secret_file = os.path.join(self.tmp.name, "storage_url_secret")
+        saved = storage_backend.STORAGE_URL_SECRET, storage_backend.STORAGE_URL_SECRET_FILE
+        storage_backend.STORAGE_URL_SECRET, storage_backend.STORAGE_URL_SECRET_FILE = None, secret_file
+        try:
+            first = LocalStorageBackend(self.storage.root)
+            second = LocalStorageBackend(self.storage.root)
+        finally:
+            storage_backend.STORAGE_URL_SECRET, storage_backend.STORAGE_URL_SECRET_FILE = saved
+        self.assertEqual(first.signature("p", 1), second.signature("p", 1))
+        self.assertNotEqual(first.signature("p", 1), self.storage.signature("p", 1))
+        with open(secret_file) as f:
+            self.assertEqual(len(f.read()), 64)
+        self.assertEqual(os.listdir(self.tmp.name).count("storage_url_secret"), 1)
+
+    def test_paths_stay_inside_root(self):
+        with self.assertRaises(ValueError):
+            self.storage.path("../outside.mp3")
+        self.assertFalse(self.storage.exists("users/../../outside.mp3"))
+
+    def test_signed_url_is_served_until_it_expires(self):
+        app = Flask(__name__)
+        app.register_blueprint(storage_route.storage_bp)
+        saved = storage_route.get_storage
+        storage_route.get_storage = lambda: self.storage
+        try:
+            client = app.test_client()
+            url = self.storage.get_signed_url("users/alice/uploads/a.mp3")
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, b"0123456789")
+            response.close()
+
+            response = client.get(url, headers={"Range": "bytes=2-4"})
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response.data, b"234")
+            response.close()
+
+            query = parse_qs(urlsplit(url).query)
+            other = f"/api/storage/users/bob/uploads/a.mp3?expires={query['expires'][0]}" \
+                    f"&signature={query['signature'][0]}"
+            self.assertEqual(client.get(other).status_code, 403)
+            expired = self.storage.signature("users/alice/uploads/a.mp3", 1)
+            self.assertEqual(
+                client.get(f"/api/storage/users/alice/uploads/a.mp3?expires=1&signature={expired}").status_code,
+                403,
+            )
+            self.assertIsNone(self.storage.get_signed_url("users/alice/uploads/missing.mp3"))
+        finally:
+            storage_route.get_storage = saved
+
+
+if __name__ == '__main__':
+    unittest.main()
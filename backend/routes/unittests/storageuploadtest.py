@@ -0,0 +1,92 @@
+import unittest
+import tempfile
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import services.storage_upload as storage_upload
+import services.job_registry as job_registry
+from services.storage import doc_store
+from services.doc_record import StorageStatus
+
+
+class TestStorageUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.local_path = os.path.join(self.tmp.name, "audio.mp3")
+        with open(self.local_path, "wb") as f:
+            f.write(b"audio")
+        self.events = []
+        self._saved = (storage_upload.save_doc_store, storage_upload.socketio.emit,
+                       storage_upload.socketio.sleep)
+        storage_upload.save_doc_store = lambda: None
+        storage_upload.socketio.emit = lambda event, data, room=None: self.events.append(data["storage_status"])
+        storage_upload.socketio.sleep = lambda seconds: None
+        doc_store.insert({"id": "up1", "owner": "alice", "storage_status": StorageStatus.PENDING})
+        self.calls = 0
+
+    def tearDown(self):
+        (storage_upload.save_doc_store, storage_upload.socketio.emit,
+         storage_upload.socketio.sleep) = self._saved
+        doc_store.remove("up1")
+        self.tmp.cleanup()
+
+    def flaky_upload(self, failures):
+        def upload(local_path, firebase_path):
+            self.calls += 1
+            if self.calls <= failures:
+                raise ConnectionError("network down")
+        return upload
+
+    def test_retries_then_records_url(self):
+        ok = storage_upload.upload_to_storage(
+            "up1", self.local_path, "users/alice/uploads/a.mp3",
+            upload=self.flaky_upload(1), sign=lambda path: f"https://signed/{path}",
+        )
+        self.assertTrue(ok)
+        doc = doc_store.get("up1")
+        self.assertEqual(doc.storage_status, StorageStatus.UPLOADED)
+        self.assertEqual(doc.firebaseUrl, "https://signed/users/alice/uploads/a.mp3")
+        self.assertEqual(self.events[-1], StorageStatus.UPLOADED)
+
+    def test_marks_failed_after_last_attempt(self):
+        ok = storage_upload.upload_to_storage(
+            "up1", self.local_path, "users/alice/uploads/a.mp3",
+            upload=self.flaky_upload(100), sign=lambda path: "unused",
+        )
+        self.assertFalse(ok)
+        doc = doc_store.get("up1")
+        self.assertEqual(doc.storage_status, StorageStatus.FAILED)
+        self.assertEqual(doc.storage_error, "network down")
+        self.assertEqual(self.calls, storage_upload.STORAGE_UPLOAD_ATTEMPTS)
+
+    def test_deleted_doc_is_not_uploaded(self):
+        os.remove(self.local_path)
+        ok = storage_upload.upload_to_storage(
+            "up1", self.local_path, "users/alice/uploads/a.mp3",
+            upload=self.flaky_upload(0), sign=lambda path: "unused",
+        )
+        self.assertFalse(ok)
+        self.assertEqual(self.calls, 0)
+
+    def test_resume_is_claimed_by_one_worker(self):
+        doc_store.patch("up1", {"localPath": self.local_path, "firebasePath": "users/alice/uploads/a.mp3"})
+        started = []
+        saved = (storage_upload.start_storage_upload, job_registry.job_registry)
+        storage_upload.start_storage_upload = lambda *args: started.append(args)
+        job_registry.job_registry = {}
+        try:
+            self.assertEqual(storage_upload.resume_storage_uploads(), 1)
+            # Another worker starting now finds the upload running
+            self.assertEqual(storage_upload.resume_storage_uploads(), 0)
+            self.assertEqual(started, [("up1", self.local_path, "users/alice/uploads/a.mp3")])
+
+            # An upload whose worker stopped long ago is resumed
+            job_registry.job_registry["storage_upload:up1"]["updatedAt"] = "2000-01-01T00:00:00.000+00:00"
+            self.assertEqual(storage_upload.resume_storage_uploads(), 1)
+        finally:
+            storage_upload.start_storage_upload, job_registry.job_registry = saved
+
+
+if __name__ == '__main__':
+    unittest.main()
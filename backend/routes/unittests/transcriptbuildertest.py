@@ -0,0 +1,75 @@
+import unittest
+import tempfile
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import services.content_store as content_store
+from services.content_store import load_content, save_content, ContentCorruptError
+from services.transcript_builder import (
+    start_transcript, get_builder, normalize_transcript,
+)
+
+
+class TestTranscriptBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self._saved = content_store.CONTENT_STORE_DIR
+        content_store.CONTENT_STORE_DIR = self.tmpdir.name
+
+    def tearDown(self):
+        content_store.CONTENT_STORE_DIR = self._saved
+        self.tmpdir.cleanup()
+
+    def test_chunks_are_joined_like_before(self):
+        builder = start_transcript("doc")
+        for chunk in [" Hello", "world ", ", again", "  ", "(aside)", "end ."]:
+            builder.append(chunk)
+        self.assertEqual(builder.text(), "Hello world, again(aside)end .")
+        # Readers see the chunks before the transcript is finalized
+        self.assertEqual(load_content("doc")["content"], builder.text())
+        self.assertEqual(builder.finalize(), "Hello world, again(aside)end.")
+        self.assertEqual(load_content("doc")["content"], "Hello world, again(aside)end.")
+        self.assertEqual(os.listdir(self.tmpdir.name), ["doc.json"])
+
+    def test_appends_only_write_new_chunks(self):
+        save_content("doc", content="Stored text", segments=[{"start": 0}])
+        size = os.path.getsize(os.path.join(self.tmpdir.name, "doc.json"))
+        builder = get_builder("doc")
+        builder.append("more")
+        builder.append("words")
+        self.assertEqual(os.path.getsize(os.path.join(self.tmpdir.name, "doc.json")), size)
+        self.assertEqual(load_content("doc"),
+                         {"content": "Stored text more words", "segments": [{"start": 0}]})
+
+    def test_corrupt_content_is_not_overwritten(self):
+        save_content("doc", content="Stored text", segments=[{"start": 0}])
+        self.assertEqual(os.listdir(self.tmpdir.name), ["doc.json"])
+        path = os.path.join(self.tmpdir.name, "doc.json")
+        with open(path, "r+") as f:
+            f.truncate(10)
+        with self.assertRaises(ContentCorruptError):
+            load_content("doc")
+        # A partial save would need the stored segments; it must not replace the file
+        with self.assertRaises(ContentCorruptError):
+            save_content("doc", content="New text")
+        self.assertEqual(os.path.getsize(path), 10)
+
+    def test_timed_chunks_become_segments(self):
+        save_content("doc", content="Old", segments=[{"start": 5, "text": "Old"}])
+        builder = start_transcript("doc")
+        builder.append("Hello", 0, 30)
+        builder.append("again", 30, 60)
+        builder.finalize()
+        self.assertEqual(load_content("doc"), {
+            "content": "Hello again",
+            "segments": [{"start": 0, "end": 30, "text": "Hello"},
+                         {"start": 30, "end": 60, "text": "again"}],
+        })
+
+    def test_normalize(self):
+        self.assertEqual(normalize_transcript("  a \n b  ,c !  "), "a b,c!")
+
+
+if __name__ == '__main__':
+    unittest.main()
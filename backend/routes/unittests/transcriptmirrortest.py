@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import services.transcript_mirror as transcript_mirror
+from services.transcript_mirror import TranscriptMirror
+
+
+class FakeRef:
+    """Document/collection reference of the in-memory Firestore stand-in"""
+
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+
+    def collection(self, name):
+        return FakeRef(self.store, self.path + (name,))
+
+    def document(self, name):
+        return FakeRef(self.store, self.path + (name,))
+
+
+class FakeBatch:
+
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref.path, data))
+
+    def commit(self):
+        if self.db.failures:
+            self.db.failures -= 1
+            raise RuntimeError("unavailable")
+        self.db.commits.append(len(self.writes))
+        for path, data in self.writes:
+            self.db.docs.setdefault(path, {}).update(data)
+
+
+class FakeFirestore:
+
+    def __init__(self):
+        self.docs = {}
+        self.commits = []
+        self.failures = 0
+
+    def collection(self, name):
+        return FakeRef(self, (name,))
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+class TestTranscriptMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeFirestore()
+        self.mirror = TranscriptMirror(self.db, flush_interval=60, retry_delay=0)
+
+    def tearDown(self):
+        self.mirror.close()
+
+    def test_chunks_are_coalesced_into_one_batch(self):
+        for i in range(1, 4):
+            self.mirror.add_chunks("doc", "url", [{"chunk_index": i, "text": f"c{i}"}])
+        self.mirror.add_chunks("other", "url2", ["plain"])
+        self.assertEqual(self.db.commits, [])
+        self.assertEqual(self.mirror.flush(), 4)
+        self.assertEqual(self.db.commits, [6])
+        chunk = self.db.docs[("transcriptions", "doc", "chunks", "000002")]
+        self.assertEqual(chunk, {"chunk_index": 2, "text": "c2"})
+        self.assertEqual(self.db.docs[("transcriptions", "other", "chunks", "000000")]["text"], "plain")
+        parent = self.db.docs[("transcriptions", "doc")]
+        self.assertEqual((parent["status"], parent["chunk_count"]), ("in_progress", 4))
+
+    def test_final_update_is_written_without_waiting(self):
+        self.mirror.add_chunks("doc", "url", ["a", "b"], final=True)
+        self.mirror.close()
+        parent = self.db.docs[("transcriptions", "doc")]
+        self.assertEqual((parent["status"], parent["chunk_count"]), ("completed", 2))
+
+    def test_failed_commit_is_retried(self):
+        self.db.failures = 2
+        self.mirror.add_chunks("doc", "url", ["a"])
+        self.mirror.flush()
+        self.assertIn(("transcriptions", "doc", "chunks", "000000"), self.db.docs)
+
+    def test_dropped_writes_keep_the_transcription_incomplete(self):
+        self.db.failures = transcript_mirror.MAX_ATTEMPTS
+        self.mirror.add_chunks("doc", "url", ["a"])
+        self.assertEqual(self.mirror.flush(), 0)
+        self.mirror.add_chunks("doc", "url", ["b"], final=True)
+        self.assertEqual(self.mirror.flush(), 1)
+        self.assertNotIn(("transcriptions", "doc", "chunks", "000000"), self.db.docs)
+        self.assertEqual(self.db.docs[("transcriptions", "doc")]["status"], "incomplete")
+
+        # A new transcription of the document starts out complete
+        self.mirror.add_chunks("doc", "url", ["a"], final=True)
+        self.mirror.flush()
+        self.assertEqual(self.db.docs[("transcriptions", "doc")]["status"], "completed")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import tempfile
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from flask import Flask
+import auth
+import services.trash as trash
+import routes.trash_route as trash_route
+from services.storage import doc_store
+
+
+class TestTrash(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self._saved = (trash.save_doc_store, trash.UPLOAD_FOLDER, trash.TRASH_FOLDER, trash.socketio.sleep,
+                       trash.delete_files)
+        self.deleted_paths = []
+        trash.save_doc_store = lambda: None
+        trash.delete_files = self.delete_files
+        trash.UPLOAD_FOLDER = self.tmp.name
+        trash.TRASH_FOLDER = os.path.join(self.tmp.name, "trash")
+        trash.socketio.sleep = lambda seconds: None
+        self.audio = os.path.join(self.tmp.name, "t1.mp3")
+        with open(self.audio, "wb") as f:
+            f.write(b"audio")
+        doc_store.insert({"id": "t1", "owner": "alice", "audioFilename": "t1.mp3"})
+        doc_store.insert({"id": "t2", "owner": "alice", "audioFilename": "t2.mp3"})
+
+    def tearDown(self):
+        (trash.save_doc_store, trash.UPLOAD_FOLDER, trash.TRASH_FOLDER, trash.socketio.sleep,
+         trash.delete_files) = self._saved
+        for doc_id in ("t1", "t2"):
+            if doc_store.get(doc_id):
+                doc_store.remove(doc_id)
+        self.tmp.cleanup()
+
+    def delete_files(self, paths, requesting_user_id=None):
+        self.deleted_paths.extend(paths)
+        failed = {path: "503" for path in paths if "t2" in path}
+        return {"deleted": [p for p in paths if p not in failed], "failed": failed}
+
+    def test_trash_and_restore_leave_audio_in_place(self):
+        doc_store.patch("t1", trash.trash_changes(delete_doc=True))
+        doc = doc_store.get("t1")
+        self.assertTrue(doc.deleted and doc.audioTrashed and doc.trashedAt)
+        self.assertFalse(trash.has_legacy_audio(doc))
+        doc_store.patch("t1", trash.restore_changes())
+        doc = doc_store.get("t1")
+        self.assertFalse(doc.deleted or doc.audioTrashed)
+        self.assertTrue(os.path.exists(self.audio))
+
+    def test_purges_only_expired_trash(self):
+        doc_store.patch("t1", trash.trash_changes())
+        doc_store.patch("t2", trash.trash_changes())
+        now = datetime.now(timezone.utc)
+        self.assertEqual(trash.purge_expired_trash(now), 0)
+
+        later = now + timedelta(days=trash.TRASH_RETENTION_DAYS, seconds=1)
+        doc_store.patch("t2", trash.restore_changes())
+        self.assertEqual(trash.purge_expired_trash(later, batch_size=1), 1)
+        self.assertIsNone(doc_store.get("t1"))
+        self.assertFalse(os.path.exists(self.audio))
+        self.assertIsNotNone(doc_store.get("t2"))
+        self.assertEqual(self.deleted_paths, ["users/alice/uploads/t1.mp3"])
+
+    def test_legacy_trash_starts_its_retention_at_the_upgrade(self):
+        # Trashed before trashedAt existed, last updated long ago
+        doc_store.patch("t1", {"deleted": True, "audioTrashed": True})
+        doc_store.patch("t2", {"deleted": True})
+        self.assertEqual(trash.expired_trash(datetime.now(timezone.utc) + timedelta(days=365)), [])
+
+        self.assertEqual(trash.purge_expired_trash(datetime.now(timezone.utc)), 0)
+        t1, t2 = doc_store.get("t1"), doc_store.get("t2")
+        self.assertTrue(t1.trashedAt and t2.trashedAt)
+        # The audio is still in the old trash locations
+        self.assertTrue(trash.has_legacy_audio(t1))
+        self.assertFalse(trash.has_legacy_audio(t2))
+        self.assertEqual(trash.stamp_legacy_trash(), 0)
+
+        later = datetime.now(timezone.utc) + timedelta(days=trash.TRASH_RETENTION_DAYS, seconds=1)
+        self.assertEqual(trash.purge_expired_trash(later), 1)
+        self.assertIn("users/alice/trash/t1.mp3", self.deleted_paths)
+        doc_store.patch("t2", trash.restore_changes())
+        self.assertFalse(trash.has_legacy_audio(doc_store.get("t2")))
+
+    def test_failed_blob_delete_keeps_the_doc(self):
+        docs = [doc_store.get("t1"), doc_store.get("t2")]
+        result = trash.purge_docs(docs)
+        self.assertEqual(result, {"purged": ["t1"], "failed": {"t2": "503"}})
+        self.assertIsNone(doc_store.get("t1"))
+        self.assertIsNotNone(doc_store.get("t2"))
+
+    def test_perm_delete_only_deletes_trash(self):
+        saved = (auth.auth.verify_id_token, auth.get_app, trash_route.save_doc_store, trash.delete_file)
+        deleted_file_paths = []
+        auth.auth.verify_id_token = lambda token, app=None: {"uid": token}
+        auth.get_app = lambda: None
+        trash_route.save_doc_store = lambda: None
+        trash.delete_file = lambda path, requesting_user_id=None: deleted_file_paths.append(path) and False
+        try:
+            app = Flask(__name__)
+            app.register_blueprint(trash_route.trash_bp)
+            client = app.test_client()
+            headers = {"Authorization": "Bearer alice"}
+
+            # A live document keeps its audio
+            response = client.delete("/perm_delete_files/t1.mp3", headers=headers)
+            self.assertEqual(response.status_code, 409)
+            self.assertIsNotNone(doc_store.get("t1"))
+            self.assertTrue(os.path.exists(self.audio))
+
+            doc_store.patch("t1", trash.trash_changes(delete_doc=True))
+            response = client.delete("/perm_delete_files/t1.mp3", headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(doc_store.get("t1"))
+
+            # Without documents only the old trash locations are tried
+            response = client.delete("/perm_delete_files/other.mp3", headers=headers)
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(deleted_file_paths, ["users/alice/trash/other.mp3"])
+        finally:
+            (auth.auth.verify_id_token, auth.get_app, trash_route.save_doc_store, trash.delete_file) = saved
+
+
+if __name__ == '__main__':
+    unittest.main()
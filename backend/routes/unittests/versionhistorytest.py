@@ -0,0 +1,67 @@
+import unittest
+import tempfile
+import random
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import services.version_history as version_history
+from services.version_history import make_delta, apply_delta
+
+
+class TestVersionHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self._saved = (version_history.VERSION_HISTORY_DIR, version_history.VERSION_SNAPSHOT_INTERVAL)
+        version_history.VERSION_HISTORY_DIR = self.tmpdir.name
+        version_history.VERSION_SNAPSHOT_INTERVAL = 5
+        version_history._heads.clear()
+
+    def tearDown(self):
+        version_history.VERSION_HISTORY_DIR, version_history.VERSION_SNAPSHOT_INTERVAL = self._saved
+        version_history._heads.clear()
+        self.tmpdir.cleanup()
+
+    def test_delta_round_trip(self):
+        rng = random.Random(7)
+        words = [rng.choice(["alpha", "beta", "gamma.", "delta?", "epsilon"]) + str(n % 7)
+                 for n in range(3000)]
+        old = " ".join(words)
+        for _ in range(20):
+            edited = list(words)
+            for _ in range(rng.randint(1, 6)):
+                edited[rng.randrange(len(edited))] = "EDIT"
+            new = " ".join(edited)
+            delta = make_delta(old, new)
+            self.assertEqual(apply_delta(old, delta), new)
+            # Scattered edits are stored as small splices, not the text in between
+            self.assertLess(sum(len(ins) for _, _, ins in delta), len(new) // 4)
+
+    def test_versions_are_rebuilt_from_nearest_snapshot(self):
+        texts = {}
+        text = "one two three four five six seven eight nine ten " * 20
+        for version in range(1, 13):
+            text = text.replace("two", f"v{version}", 1)
+            texts[version] = text
+            version_history.record_version("doc", version, text, "alice")
+
+        segments = version_history._segments("doc")
+        self.assertEqual(segments, [1, 6, 11])
+        version_history._heads.clear()
+        for version, expected in texts.items():
+            self.assertEqual(version_history.get_version("doc", version), expected)
+        listed = version_history.list_versions("doc")
+        self.assertEqual([v["version"] for v in listed], list(range(12, 0, -1)))
+        self.assertIsNone(version_history.get_version("doc", 99))
+
+        version_history.delete_history("doc")
+        self.assertEqual(version_history.list_versions("doc"), [])
+
+    def test_previous_text_seeds_an_empty_history(self):
+        version_history.record_version("doc", 4, "edited text", "alice", previous=(3, "original text"))
+        self.assertEqual(version_history.get_version("doc", 3), "original text")
+        self.assertEqual(version_history.get_version("doc", 4), "edited text")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,19 +1,23 @@
 import logging
 from flask import request, jsonify, Blueprint
 from auth import verify_firebase_token
+from services.shared_state import shared_mapping, update_entry
 
 logger = logging.getLogger(__name__)
 
 user_settings_bp = Blueprint('user_settings', __name__)
 
-user_settings_store = {}
+# Plain dict in local mode, backed by the shared state backend otherwise.
+# Values are replaced as a whole, never mutated in place.
+user_settings_store = shared_mapping("settings")
 
 @user_settings_bp.route('/api/user-settings', methods=['GET'])
 @verify_firebase_token
 def get_user_settings():
     user_id = request.uid
+    settings = user_settings_store.get(user_id)
     
-    if user_id not in user_settings_store:
+    if settings is None:
         default_settings = {
             "transcriptionConfig": {
                 "mode": "local-cpu",
@@ -22,9 +26,10 @@ def get_user_settings():
                 "whisperModel": "small"
             }
         }
-        user_settings_store[user_id] = default_settings
+        # Keeps settings another worker stored in the meantime
+        settings = update_entry(user_settings_store, user_id, lambda current: current or default_settings)
     
-    return jsonify(user_settings_store[user_id]), 200
+    return jsonify(settings), 200
 
 @user_settings_bp.route('/api/user-settings', methods=['POST'])
 @verify_firebase_token
@@ -35,15 +40,10 @@ def update_user_settings():
     if not data:
         return jsonify({"error": "No data provided"}), 400
     
-    if user_id not in user_settings_store:
-        user_settings_store[user_id] = {}
-    
     # IMPORTANT FIX: Log the updated settings for debugging
     logger.info(f"Updating settings for user {user_id}: {data}")
     
     for key, value in data.items():
-        user_settings_store[user_id][key] = value
-        
         # Log if we're changing the transcription mode
         if key == "transcriptionConfig" and "mode" in value:
             logger.info(f"Transcription mode set to: {value['mode']}")
@@ -51,6 +51,8 @@ def update_user_settings():
                 api_key = value['replicateApiKey']
                 logger.info(f"Replicate API key set: {api_key[:5]}...")
     
+    # Compare-and-set, so concurrent updates of other keys are not lost
+    update_entry(user_settings_store, user_id, lambda current: dict(current or {}, **data))
     return jsonify({"message": "Settings updated successfully"}), 200
 
 def register_user_settings_routes(app):
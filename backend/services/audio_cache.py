@@ -0,0 +1,230 @@
+# backend/services/audio_cache.py
+"""
+UPLOAD_FOLDER as a size-capped LRU cache of audio.
+
+Every upload used to stay on local disk forever. Now, once the total size
+passes AUDIO_CACHE_MAX_BYTES, the least recently used files are deleted,
+but only those that are safely in blob storage and not waiting for or
+in the middle of a transcription. get_path() brings an evicted file back
+when transcription or /local-audio needs it, downloading the blob to a
+temporary file and renaming it into place.
+Concurrent requests for the same file share one download.
+
+Hits, misses, bytes served and rehydrated, and evictions are reported by
+stats() on /api/metrics.
+"""
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from services.storage import doc_store
+from services.doc_record import StorageStatus, TranscriptionStatus
+from services.storage_backend import download_file
+
+# Get configuration
+try:
+    from config import UPLOAD_FOLDER, AUDIO_CACHE_MAX_BYTES
+except ImportError:
+    # Default values if config can't be imported
+    UPLOAD_FOLDER = "uploads"
+    AUDIO_CACHE_MAX_BYTES = 10 * 1024 ** 3
+
+logger = logging.getLogger(__name__)
+
+# Transcription states that still need the local file
+_TRANSCRIBING = (TranscriptionStatus.PENDING, TranscriptionStatus.IN_PROGRESS)
+
+
+def _evictable_files():
+    """Audio filenames whose local copy can be dropped and fetched again later"""
+    evictable = set()
+    busy = set()
+    for doc in doc_store.values():
+        if not doc.audioFilename:
+            continue
+        in_storage = doc.storage_status == StorageStatus.UPLOADED or (
+            doc.storage_status is None and doc.firebaseUrl
+        )
+        if in_storage and doc.transcription_status not in _TRANSCRIBING:
+            evictable.add(doc.audioFilename)
+        else:
+            busy.add(doc.audioFilename)
+    return evictable - busy
+
+
+class AudioCache:
+    """LRU accounting over the audio files of one directory"""
+
+    def __init__(self, folder=UPLOAD_FOLDER, max_bytes=AUDIO_CACHE_MAX_BYTES,
+                 download=download_file, evictable=_evictable_files):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._download = download
+        self._evictable = evictable
+        self._files = OrderedDict()  # filename -> size, least recently used first
+        self._size = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self._hits = 0
+        self._misses = 0
+        self._bytes_served = 0
+        self._bytes_rehydrated = 0
+        self._evictions = 0
+        self._bytes_evicted = 0
+
+    def _ensure_loaded(self):
+        # Called with self._lock held
+        if self._loaded:
+            return
+        entries = []
+        if os.path.isdir(self.folder):
+            for entry in os.scandir(self.folder):
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._size += size
+        self._loaded = True
+
+    def _set(self, filename, size):
+        # Called with self._lock held
+        self._size += size - self._files.pop(filename, 0)
+        self._files[filename] = size
+
+    def path(self, filename):
+        return os.path.join(self.folder, filename)
+
+    def add(self, filename):
+        """Account for a file just written to the folder, then trim"""
+        try:
+            size = os.path.getsize(self.path(filename))
+        except OSError:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            self._set(filename, size)
+        self.trim(keep=filename)
+
+    def forget(self, filename):
+        """Stop tracking a file deleted by someone else"""
+        with self._lock:
+            self._size -= self._files.pop(filename, 0)
+
+    def get_path(self, filename, storage_path):
+        """
+        Return the local path of an audio file, downloading it if it was evicted.
+
+        Args:
+            filename: audioFilename
+            storage_path: Blob to rehydrate from
+
+        Returns:
+            str: Local path, or None if the file is neither on disk nor in Storage
+        """
+        local_path = self.path(filename)
+        with self._lock:
+            self._ensure_loaded()
+            if os.path.exists(local_path):
+                self._hits += 1
+                if filename in self._files:
+                    self._files.move_to_end(filename)
+                else:
+                    self._set(filename, os.path.getsize(local_path))
+                return local_path
+            self._misses += 1
+            self._size -= self._files.pop(filename, 0)
+            fetch_lock = self._fetch_locks.setdefault(filename, threading.Lock())
+
+        with fetch_lock:
+            try:
+                # Another request may have fetched it while we waited
+                if not os.path.exists(local_path):
+                    os.makedirs(self.folder, exist_ok=True)
+                    tmp_path = os.path.join(self.folder, f".{filename}.{uuid.uuid4().hex}.part")
+                    try:
+                        if not self._download(storage_path, tmp_path):
+                            return None
+                        os.replace(tmp_path, local_path)
+                    finally:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                    size = os.path.getsize(local_path)
+                    with self._lock:
+                        self._bytes_rehydrated += size
+                    logger.info(f"Rehydrated {filename} ({size} bytes) from {storage_path}")
+            finally:
+                with self._lock:
+                    self._fetch_locks.pop(filename, None)
+
+        self.add(filename)
+        return local_path if os.path.exists(local_path) else None
+
+    def note_served(self, nbytes):
+        """Count bytes sent to clients from the cache"""
+        with self._lock:
+            self._bytes_served += nbytes
+
+    def trim(self, keep=None):
+        """
+        Evict least recently used files until the cache fits max_bytes.
+
+        Args:
+            keep: Filename never to evict (the one just added)
+
+        Returns:
+            int: Number of files evicted
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._size <= self.max_bytes:
+                return 0
+            candidates = list(self._files)
+
+        evictable = self._evictable()
+        evicted = 0
+        for filename in candidates:
+            with self._lock:
+                if self._size <= self.max_bytes:
+                    break
+                if filename == keep or filename not in evictable or filename in self._fetch_locks:
+                    continue
+                size = self._files.pop(filename, None)
+                if size is None:
+                    continue
+                self._size -= size
+            try:
+                os.remove(self.path(filename))
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.error(f"Could not evict {filename}: {e}")
+                continue
+            evicted += 1
+            with self._lock:
+                self._evictions += 1
+                self._bytes_evicted += size
+        if evicted:
+            logger.info(f"Evicted {evicted} audio files from the local cache")
+        return evicted
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "files": len(self._files),
+                "bytes": self._size,
+                "maxBytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hitRate": round(self._hits / lookups, 4) if lookups else None,
+                "bytesServed": self._bytes_served,
+                "bytesRehydrated": self._bytes_rehydrated,
+                "evictions": self._evictions,
+                "bytesEvicted": self._bytes_evicted,
+            }
+
+
+audio_cache = AudioCache()
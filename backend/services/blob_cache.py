@@ -0,0 +1,168 @@
+# backend/services/blob_cache.py
+"""
+TTL cache of Firebase Storage blob existence and metadata.
+
+A single request used to check the same path several times (delete_doc
+looks in uploads, then trash, then move_file checks both again), each check
+a round trip to Storage. lookup() answers from a per-process cache: one
+bucket.get_blob() fills in both whether the blob exists and its metadata,
+and the answer is reused for BLOB_CACHE_TTL seconds (BLOB_CACHE_NEGATIVE_TTL
+for "does not exist", since another worker may upload it).
+
+Writes made through this code base are written through: note_uploaded(),
+note_deleted() and note_moved() update the entry instead of waiting for it
+to expire. A fetch runs outside the lock, so a note made while it is in
+flight bumps the path's generation and the (now stale) fetched answer is
+not stored over it. stats() reports hits and misses, i.e. the round trips
+saved.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# Get configuration
+try:
+    from config import BLOB_CACHE_TTL, BLOB_CACHE_NEGATIVE_TTL, BLOB_CACHE_MAX_ENTRIES
+except ImportError:
+    # Default values if config can't be imported
+    BLOB_CACHE_TTL = 60.0
+    BLOB_CACHE_NEGATIVE_TTL = 5.0
+    BLOB_CACHE_MAX_ENTRIES = 10000
+
+logger = logging.getLogger(__name__)
+
+
+class BlobInfo:
+    """Cached metadata of an existing blob"""
+
+    __slots__ = ("name", "size", "content_type", "metadata", "time_created", "generation")
+
+    def __init__(self, blob):
+        self.name = blob.name
+        self.size = blob.size
+        self.content_type = blob.content_type
+        self.metadata = dict(blob.metadata or {})
+        self.time_created = blob.time_created
+        self.generation = blob.generation
+
+
+class BlobCache:
+    """Thread-safe LRU of path -> (expires_at, BlobInfo or None)"""
+
+    def __init__(self, ttl=BLOB_CACHE_TTL, negative_ttl=BLOB_CACHE_NEGATIVE_TTL,
+                 max_entries=BLOB_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # path -> [generation, fetches in flight], only while a fetch is in flight
+        self._fetching = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def lookup(self, bucket, path):
+        """
+        Return cached info for a blob, fetching it on a miss.
+
+        Args:
+            bucket: Storage bucket the path belongs to
+            path: Blob name
+
+        Returns:
+            BlobInfo: The blob's metadata, or None if it does not exist
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(path)
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+            fetching = self._fetching.setdefault(path, [0, 0])
+            fetching[1] += 1
+            generation = fetching[0]
+
+        info = None
+        try:
+            blob = bucket.get_blob(path)
+            info = BlobInfo(blob) if blob is not None else None
+        finally:
+            with self._lock:
+                fetching[1] -= 1
+                if fetching[1] == 0:
+                    del self._fetching[path]
+                stale = fetching[0] != generation
+                if not stale:
+                    self._put(path, info)
+                elif path in self._entries:
+                    # A write noted during the fetch is newer than its answer
+                    info = self._entries[path][1]
+        return info
+
+    def exists(self, bucket, path):
+        """Whether a blob exists, answered from the cache when possible"""
+        return self.lookup(bucket, path) is not None
+
+    def _put(self, path, info):
+        # Called with self._lock held
+        ttl = self.ttl if info is not None else self.negative_ttl
+        self._entries[path] = (time.monotonic() + ttl, info)
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _bump(self, path):
+        # Called with self._lock held: answers of fetches in flight are stale
+        fetching = self._fetching.get(path)
+        if fetching is not None:
+            fetching[0] += 1
+
+    def _store(self, path, info):
+        with self._lock:
+            self._bump(path)
+            self._put(path, info)
+
+    def note_uploaded(self, blob):
+        """Record a blob this process just wrote (upload or metadata patch)"""
+        self._store(blob.name, BlobInfo(blob))
+
+    def note_deleted(self, path):
+        """Record that a blob is gone"""
+        self._store(path, None)
+
+    def note_moved(self, source_path, dest_blob):
+        """Record a move: the source is gone and the destination exists"""
+        self.note_deleted(source_path)
+        self.note_uploaded(dest_blob)
+
+    def invalidate(self, path=None):
+        """Forget one path, or everything when path is None"""
+        with self._lock:
+            if path is None:
+                for fetching in self._fetching.values():
+                    fetching[0] += 1
+                self._invalidations += len(self._entries)
+                self._entries.clear()
+            else:
+                self._bump(path)
+                if self._entries.pop(path, None) is not None:
+                    self._invalidations += 1
+
+    def stats(self):
+        """Hit/miss counters; every hit is a Storage round trip saved"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+                "hitRate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+blob_cache = BlobCache()
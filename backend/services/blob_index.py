@@ -0,0 +1,155 @@
+# backend/services/blob_index.py
+"""
+Local index of Firebase Storage listings.
+
+list_user_files() can answer from here instead of listing the bucket. Each
+user has a listing record of the prefixes that have been listed in full
+(and when), and one entry per blob seen under them; uploads, moves and
+deletes made through services.firebase_service update it as they happen.
+Prefixes that were never listed in full, or not within
+BLOB_LISTING_INDEX_TTL seconds, fall through to the bucket, whose listing
+then refreshes the index; that also picks up changes made to the bucket
+by anything other than this server.
+
+Enabled with BLOB_LISTING_INDEX. Kept in the shared state backend when one
+is configured, so every worker sees the same index. Blob entries live in a
+namespace per user, one key per blob, so an upload or delete writes one
+small value instead of the user's whole listing; the listing record is
+changed with a compare-and-set (update_entry), so concurrent workers don't
+lose each other's updates.
+"""
+import logging
+import threading
+import time
+from services.shared_state import shared_mapping, update_entry
+
+# Get configuration
+try:
+    from config import BLOB_LISTING_INDEX, BLOB_LISTING_INDEX_TTL
+except ImportError:
+    # Default values if config can't be imported
+    BLOB_LISTING_INDEX = False
+    BLOB_LISTING_INDEX_TTL = 3600
+
+logger = logging.getLogger(__name__)
+
+# uid -> {"complete": {prefix: time listed in full}}
+blob_index = shared_mapping("blob_index")
+# uid -> mapping of storage path -> {"info": file info, "at": time recorded}
+_file_maps = {}
+_lock = threading.Lock()
+
+
+def _files(user_id):
+    with _lock:
+        files = _file_maps.get(user_id)
+        if files is None:
+            files = _file_maps[user_id] = shared_mapping(f"blob_index:{user_id}")
+        return files
+
+
+def _owner(storage_path):
+    parts = storage_path.split("/")
+    if len(parts) >= 3 and parts[0] == "users":
+        return parts[1]
+    return None
+
+
+def _complete(entry, prefix, now):
+    """Whether a fresh listing covers prefix"""
+    return any(
+        prefix.startswith(done) and now - listed_at <= BLOB_LISTING_INDEX_TTL
+        for done, listed_at in entry["complete"].items()
+    )
+
+
+def lookup(user_id, prefix, delimiter=None):
+    """
+    List a prefix from the index.
+
+    Args:
+        user_id: Owner uid
+        prefix: Full storage prefix (users/<uid>/...)
+        delimiter: Group names past the next delimiter into prefixes, as the
+                   bucket listing does
+
+    Returns:
+        tuple: (files, prefixes) sorted by path, or None if the prefix has
+               not been listed in full within BLOB_LISTING_INDEX_TTL
+    """
+    if not BLOB_LISTING_INDEX:
+        return None
+    entry = blob_index.get(user_id)
+    if not entry or not _complete(entry, prefix, time.time()):
+        return None
+    indexed = dict(_files(user_id).items())
+    files = []
+    prefixes = set()
+    for path in sorted(indexed):
+        if not path.startswith(prefix):
+            continue
+        if delimiter:
+            cut = path.find(delimiter, len(prefix))
+            if cut != -1:
+                prefixes.add(path[:cut + len(delimiter)])
+                continue
+        files.append(indexed[path]["info"])
+    return files, sorted(prefixes)
+
+
+def store_listing(user_id, prefix, files, listed_at=None):
+    """
+    Record the complete listing of a prefix, replacing what was indexed under it.
+
+    Args:
+        user_id: Owner uid
+        prefix: Full storage prefix that was listed
+        files: File infos of every blob under prefix
+        listed_at: When the listing started; blobs recorded after that by
+                   record_blob are kept even if the listing missed them
+    """
+    if not BLOB_LISTING_INDEX:
+        return
+    now = time.time()
+    listed_at = now if listed_at is None else listed_at
+    indexed = _files(user_id)
+    listed = {info["storagePath"] for info in files}
+    for path, entry in list(indexed.items()):
+        if path.startswith(prefix) and path not in listed and entry["at"] < listed_at:
+            update_entry(indexed, path, lambda current: None)
+    for info in files:
+        indexed[info["storagePath"]] = {"info": info, "at": now}
+
+    def mark(entry):
+        complete = {
+            done: at for done, at in (entry or {"complete": {}})["complete"].items()
+            if not done.startswith(prefix)
+        }
+        complete[prefix] = listed_at
+        return {"complete": complete}
+
+    update_entry(blob_index, user_id, mark)
+
+
+def record_blob(info):
+    """Add or update one file after an upload or move"""
+    _update(info["storagePath"], info)
+
+
+def forget_blob(storage_path):
+    """Drop one file after a delete or move"""
+    _update(storage_path, None)
+
+
+def _update(storage_path, info):
+    if not BLOB_LISTING_INDEX:
+        return
+    user_id = _owner(storage_path)
+    if user_id is None or not blob_index.get(user_id):
+        # Nothing of this user is indexed; the next listing sees the change
+        return
+    indexed = _files(user_id)
+    if info is None:
+        update_entry(indexed, storage_path, lambda current: None)
+    else:
+        indexed[storage_path] = {"info": info, "at": time.time()}
@@ -0,0 +1,226 @@
+# backend/services/blob_store.py
+"""
+Content-addressed audio blobs.
+
+Uploads used to be named f"{uuid4()}_{original_filename}", so the same
+recording uploaded five times was kept five times on disk and five times
+in Storage. Now save_upload() hashes the upload with SHA-256 while
+streaming it to a temporary file, and the audio is named after the hash
+of its owner and that content hash:
+
+    UPLOAD_FOLDER/<key><ext>            local copy
+    blobs/<key><ext>                    Storage path
+
+If that content is already on disk the temporary file is dropped instead
+of being made durable, and the Storage upload finds the blob already
+there and skips the transfer. Every document of the same user and content
+has the same audioFilename and firebasePath, and its contentHash set.
+Uploads are only deduplicated per user: a shared key would let anyone
+find out, from the response or its timing, whether another user has
+uploaded a recording.
+
+blob_refs counts the documents that reference each blob. Purging a
+document only deletes the blob (and the local copy) when no other
+document still references it. The counts are built from doc_store on
+first use, and a count that drops to zero is checked against doc_store
+before anything is deleted, so a document created by another worker is
+never left without its audio. save_upload() takes the new document's
+reference before it looks for the blob on disk, under the lock the purge
+checks and reserves blobs with, so a purge running at the same time
+either sees the reference or finishes deleting the blob first.
+
+Documents uploaded before this keep their users/<uid>/uploads/ paths.
+"""
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from services.storage import doc_store
+
+# Get configuration
+try:
+    from config import UPLOAD_FOLDER, UPLOAD_CHUNK_SIZE
+except ImportError:
+    # Default values if config can't be imported
+    UPLOAD_FOLDER = "uploads"
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = "blobs/"
+
+
+def blob_name(content_hash, original_filename, owner):
+    """Filename of a user's content blob; keeps the extension for content types"""
+    key = hashlib.sha256(f"{owner}\0{content_hash}".encode("utf-8")).hexdigest()
+    ext = os.path.splitext(original_filename or "")[1].lower()
+    if not ext[1:].isalnum() or len(ext) > 10:
+        ext = ""
+    return f"{key}{ext}"
+
+
+def blob_path(filename):
+    """Storage path of a content blob"""
+    return f"{BLOB_PREFIX}{filename}"
+
+
+def is_blob_path(storage_path):
+    return bool(storage_path) and storage_path.startswith(BLOB_PREFIX)
+
+
+def audio_storage_path(doc):
+    """Storage path of a document's audio, content-addressed or per user"""
+    if doc.contentHash:
+        return blob_path(doc.audioFilename)
+    return f"users/{doc.owner}/uploads/{doc.audioFilename}"
+
+
+def save_upload(stream, original_filename, owner, doc_id, folder=UPLOAD_FOLDER):
+    """
+    Store an uploaded file under its owner's content key.
+
+    The reference of doc_id to the blob is taken before the blob is looked
+    for; drop it with blob_refs.discard() if the document is not created.
+
+    Args:
+        stream: Readable binary file object
+        original_filename: Name the client gave the file (for the extension)
+        owner: Uid of the uploading user
+        doc_id: Id of the document that will reference the blob
+        folder: Local audio folder
+
+    Returns:
+        tuple: (filename, content_hash, size, duplicate) where duplicate
+               means the content was already on disk and nothing was kept
+    """
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = os.path.join(folder, f".upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+            content_hash = digest.hexdigest()
+            filename = blob_name(content_hash, original_filename, owner)
+            # Waits for a purge of this blob; none can start after this
+            blob_refs.add(filename, doc_id)
+            local_path = os.path.join(folder, filename)
+            duplicate = os.path.exists(local_path)
+            if not duplicate:
+                f.flush()
+                # The response promises the audio is kept, so make it durable
+                os.fsync(f.fileno())
+        if not duplicate:
+            os.replace(tmp_path, local_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    if duplicate:
+        logger.info(f"Upload of {original_filename} is a duplicate of {filename}")
+    return filename, content_hash, size, duplicate
+
+
+class BlobRefs:
+    """Number of documents referencing each content blob"""
+
+    def __init__(self):
+        self._refs = None  # filename -> set of doc ids
+        self._purging = set()  # filenames reserved by claim_purge
+        self._lock = threading.Condition()
+
+    def _load(self):
+        # Called with self._lock held
+        if self._refs is None:
+            self._refs = {}
+            for doc in doc_store.values():
+                if doc.contentHash and doc.audioFilename:
+                    self._refs.setdefault(doc.audioFilename, set()).add(doc.id)
+        return self._refs
+
+    def add(self, filename, doc_id):
+        """Reference a blob, waiting until a purge of it has finished"""
+        with self._lock:
+            while filename in self._purging:
+                self._lock.wait()
+            self._load().setdefault(filename, set()).add(doc_id)
+
+    def count(self, filename):
+        with self._lock:
+            return len(self._load().get(filename, ()))
+
+    def others(self, filename, doc_ids):
+        """
+        Documents other than doc_ids that still reference a blob.
+
+        When the count says none, doc_store is scanned to make sure, and
+        references found there (written by another worker) are counted.
+        """
+        doc_ids = set(doc_ids)
+        with self._lock:
+            refs = self._load().get(filename, set())
+            remaining = refs - doc_ids
+            if remaining:
+                return remaining
+        found = {
+            doc.id for doc in doc_store.values()
+            if doc.audioFilename == filename and doc.contentHash and doc.id not in doc_ids
+        }
+        if found:
+            with self._lock:
+                self._load().setdefault(filename, set()).update(found)
+        return found
+
+    def claim_purge(self, filename, doc_ids):
+        """
+        Reserve a blob for deletion unless other documents reference it.
+
+        Args:
+            filename: Blob filename
+            doc_ids: Documents being purged
+
+        Returns:
+            set: Other documents referencing the blob. When empty, the blob
+                 is reserved and add() waits until release_purge()
+        """
+        doc_ids = set(doc_ids)
+        found = self.others(filename, doc_ids)
+        if found:
+            return found
+        with self._lock:
+            # A reference may have been added while doc_store was scanned
+            remaining = self._load().get(filename, set()) - doc_ids
+            if not remaining:
+                self._purging.add(filename)
+            return remaining
+
+    def release_purge(self, filenames):
+        """End the purge of blobs reserved by claim_purge"""
+        with self._lock:
+            self._purging.difference_update(filenames)
+            self._lock.notify_all()
+
+    def discard(self, filename, doc_id):
+        with self._lock:
+            refs = self._load().get(filename)
+            if refs is not None:
+                refs.discard(doc_id)
+                if not refs:
+                    del self._refs[filename]
+
+    def stats(self):
+        with self._lock:
+            refs = self._load()
+            return {
+                "blobs": len(refs),
+                "references": sum(len(r) for r in refs.values()),
+            }
+
+
+blob_refs = BlobRefs()
@@ -0,0 +1,238 @@
+# backend/services/content_store.py
+"""
+Out-of-line storage for transcript bodies.
+
+doc_store only keeps small metadata records. The transcript ``content`` and
+timing ``segments`` of a document can be several megabytes, so they are kept
+here in one file per doc_id and only read when a single document is opened.
+
+A transcript that is still being produced also has a chunk log next to its
+content file: append_chunks() adds one JSON line per chunk instead of
+rewriting the whole body, and load_content() joins the log onto the stored
+text. The builder's final save_content() folds it back into a single
+file; edits are not accepted while a transcription is running (see
+transcript_builder.is_transcribing), since the builder's final text would
+replace them.
+
+Content files are written to a temporary file and renamed into place, so
+a crash leaves the old body or the new one, never a truncated file. A
+content file that can't be parsed anyway raises ContentCorruptError
+instead of reading as an empty transcript, which the next partial save
+would otherwise write back over the damaged file.
+"""
+import os
+import json
+import logging
+import uuid
+
+# Get configuration
+try:
+    from config import CONTENT_STORE_DIR
+except ImportError:
+    # Default value if config can't be imported
+    CONTENT_STORE_DIR = "doc_content"
+
+logger = logging.getLogger(__name__)
+
+# Keys that belong to the content store rather than the metadata record
+CONTENT_KEYS = ("content", "segments")
+
+
+class ContentCorruptError(Exception):
+    """Raised when a stored transcript body can't be read"""
+
+
+def _content_path(doc_id):
+    """Return the path of the content file for a document"""
+    # doc ids are uuids, but never let one escape the content directory
+    safe_id = os.path.basename(str(doc_id))
+    return os.path.join(CONTENT_STORE_DIR, f"{safe_id}.json")
+
+
+def _chunk_log_path(doc_id):
+    """Return the path of the pending chunk log for a document"""
+    safe_id = os.path.basename(str(doc_id))
+    return os.path.join(CONTENT_STORE_DIR, f"{safe_id}.chunks.jsonl")
+
+
+def _read_chunk_log(doc_id):
+    """Return the text pieces appended since the content file was last written"""
+    path = _chunk_log_path(doc_id)
+    if not os.path.exists(path):
+        return []
+    pieces = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    pieces.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by a crash; everything before it is intact
+                    break
+    except Exception as e:
+        logger.error(f"Error loading chunk log for doc {doc_id}: {e}")
+    return pieces
+
+
+def load_content(doc_id):
+    """
+    Load the transcript body of a document.
+
+    Args:
+        doc_id: Document ID
+
+    Returns:
+        dict: {"content": str, "segments": list}, empty if nothing is stored
+
+    Raises:
+        ContentCorruptError: If the content file exists but can't be parsed
+    """
+    path = _content_path(doc_id)
+    body = {"content": "", "segments": []}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            body = {
+                "content": data.get("content", ""),
+                "segments": data.get("segments", []),
+            }
+        except (ValueError, AttributeError) as e:
+            logger.error(f"Content file of doc {doc_id} is corrupt: {e}")
+            raise ContentCorruptError(f"Content of doc {doc_id} is corrupt: {e}") from e
+        except OSError as e:
+            logger.error(f"Error loading content for doc {doc_id}: {e}")
+            raise ContentCorruptError(f"Content of doc {doc_id} can't be read: {e}") from e
+
+    pieces = _read_chunk_log(doc_id)
+    if pieces:
+        body["content"] += "".join(pieces)
+    return body
+
+
+def save_content(doc_id, content=None, segments=None):
+    """
+    Store the transcript body of a document.
+
+    Args:
+        doc_id: Document ID
+        content: New transcript text, or None to keep the stored text
+        segments: New timing segments, or None to keep the stored segments
+
+    Returns:
+        dict: The stored {"content": str, "segments": list}
+
+    Raises:
+        ContentCorruptError: If only one of content and segments is given
+                             and the stored body can't be read
+        OSError: If the body can't be written; the stored body is unchanged
+    """
+    if content is None or segments is None:
+        existing = load_content(doc_id)
+        if content is None:
+            content = existing["content"]
+        if segments is None:
+            segments = existing["segments"]
+
+    path = _content_path(doc_id)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.makedirs(CONTENT_STORE_DIR, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"content": content, "segments": segments}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        # The full body now includes (or replaces) any pending chunks
+        _remove(_chunk_log_path(doc_id))
+    except Exception as e:
+        logger.error(f"Error saving content for doc {doc_id}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return {"content": content, "segments": segments}
+
+
+def append_chunks(doc_id, pieces):
+    """
+    Append text to a document's body without rewriting it.
+
+    Args:
+        doc_id: Document ID
+        pieces: Strings to add to the end of the content, already joined
+                with whatever separator they need
+    """
+    if not pieces:
+        return
+    try:
+        os.makedirs(CONTENT_STORE_DIR, exist_ok=True)
+        with open(_chunk_log_path(doc_id), "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(piece, ensure_ascii=False) + "\n" for piece in pieces))
+            f.flush()
+            os.fsync(f.fileno())
+    except Exception as e:
+        logger.error(f"Error appending chunks for doc {doc_id}: {e}")
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def delete_content(doc_id):
+    """Remove the stored transcript body of a document"""
+    try:
+        _remove(_content_path(doc_id))
+        _remove(_chunk_log_path(doc_id))
+    except Exception as e:
+        logger.error(f"Error deleting content for doc {doc_id}: {e}")
+
+
+def with_content(doc):
+    """
+    Return a metadata record as a dict with its transcript body attached.
+    Used for the single-document views (GET /api/docs/<doc_id>, join_doc).
+    """
+    full_doc = doc.to_dict()
+    full_doc.update(load_content(doc.id))
+    return full_doc
+
+
+def migrate_inline_content(docs):
+    """
+    Move any ``content``/``segments`` still stored inline in metadata records
+    out to the content store.
+
+    A record whose body can't be saved keeps it inline, so the migration is
+    retried on the next load; the caller must not write the records back
+    without it while any save failed.
+
+    Args:
+        docs: Mapping of doc_id -> metadata record, modified in place
+
+    Returns:
+        tuple: (number of documents migrated, number that failed)
+    """
+    migrated = 0
+    failed = 0
+    for doc_id, doc in docs.items():
+        if not any(key in doc for key in CONTENT_KEYS):
+            continue
+        try:
+            save_content(
+                doc_id,
+                content=doc.get("content", ""),
+                segments=doc.get("segments", []),
+            )
+        except Exception as e:
+            logger.error(f"Keeping inline content of doc {doc_id}: {e}")
+            failed += 1
+            continue
+        for key in CONTENT_KEYS:
+            doc.pop(key, None)
+        migrated += 1
+
+    if migrated:
+        logger.info(f"Moved inline content of {migrated} documents to {CONTENT_STORE_DIR}")
+    return migrated, failed
@@ -0,0 +1,216 @@
+# backend/services/direct_upload.py
+"""
+Uploads that go from the client straight to Storage.
+
+With /upload-audio every recording passes through this server twice: in
+the request body and again in the background upload to Storage. A direct
+upload takes neither trip:
+
+1. POST /api/uploads: create_upload() records an upload session and
+   returns a signed URL the client PUTs the file to (Firebase Storage, or
+   PUT /api/storage/<path> of the local backend). The URL is only valid
+   for the declared size and content type.
+2. POST /api/uploads/<id>/complete: complete_upload() checks that the blob
+   is in Storage with the declared size, has the route create the document
+   and start the transcription (which fetches the audio through
+   audio_cache), and only then ends the session.
+
+Direct uploads are stored at users/<uid>/uploads/<upload_id>_<filename>,
+not as content blobs: the server never sees the bytes, so it can't hash
+them, and a hash claimed by the client can't be trusted to name a blob
+shared with other users. The upload id becomes the document id, so
+completing an upload twice creates one document.
+
+Sessions live in the shared "uploads" mapping, so the request that
+completes an upload may go to another worker than the one that created
+it. A completion claims its session with a compare-and-set, so only one
+of two concurrent completions creates the document; a claim left by a
+worker that died is taken over after COMPLETE_TIMEOUT seconds. Sessions
+are dropped once completed, or when they expire, together with a file
+that was uploaded but never completed.
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from services.shared_state import SharedMapping, shared_mapping, update_entry
+from services.storage import doc_store
+from services.storage_backend import get_upload_url, get_blob_size, delete_files
+
+# Get configuration
+try:
+    from config import DIRECT_UPLOAD_EXPIRATION, DIRECT_UPLOAD_MAX_BYTES
+except ImportError:
+    # Default values if config can't be imported
+    DIRECT_UPLOAD_EXPIRATION = 3600
+    DIRECT_UPLOAD_MAX_BYTES = 2 * 1024 ** 3
+
+logger = logging.getLogger(__name__)
+
+# Seconds a session outlives its URL, for an upload finished just in time
+COMPLETE_GRACE = 600
+# Seconds a completion may take before another request can take it over
+COMPLETE_TIMEOUT = 300
+
+# upload_id -> session
+upload_sessions = shared_mapping("uploads")
+_lock = threading.Lock()
+
+
+class UploadError(ValueError):
+    """Raised for an upload request that can't be served; status is the HTTP status"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def upload_storage_path(user_id, filename):
+    return f"users/{user_id}/uploads/{filename}"
+
+
+def _expired(session, now):
+    return session["expiresAt"] + COMPLETE_GRACE < now
+
+
+def _completing(session, now):
+    return session.get("completingAt") is not None and session["completingAt"] + COMPLETE_TIMEOUT > now
+
+
+def _discard(upload_id, session):
+    """Delete a session only if it is unchanged; returns whether it was deleted"""
+    if isinstance(upload_sessions, SharedMapping):
+        current, version = upload_sessions.get_versioned(upload_id)
+        return current == session and upload_sessions.delete_if(upload_id, version)
+    with _lock:
+        if upload_sessions.get(upload_id) != session:
+            return False
+        del upload_sessions[upload_id]
+        return True
+
+
+def _expire_sessions(now):
+    for upload_id, session in list(upload_sessions.items()):
+        if not _expired(session, now) or _completing(session, now):
+            continue
+        # A completion that created the document but died before ending the
+        # session leaves the file to the document
+        if doc_store.get(upload_id) is None:
+            result = delete_files([session["storagePath"]], session["owner"])
+            if result["failed"]:
+                logger.error(f"Could not delete the file of expired upload {upload_id}: "
+                             f"{result['failed'][session['storagePath']]}")
+                continue
+        if _discard(upload_id, session):
+            logger.info(f"Direct upload {upload_id} expired")
+
+
+def create_upload(user_id, original_filename, content_type, size):
+    """
+    Start a direct upload.
+
+    Args:
+        user_id: Uploading user
+        original_filename: Name of the file on the client
+        content_type: Content type the client will PUT
+        size: Size of the file in bytes
+
+    Returns:
+        dict: {"upload_id", "url", "method", "headers", "expiresAt"}; the
+              client PUTs the file to url with the given headers
+
+    Raises:
+        UploadError: If the filename, content type or size is invalid
+    """
+    if not original_filename or not isinstance(original_filename, str) \
+            or "/" in original_filename or "\\" in original_filename:
+        raise UploadError("Invalid filename")
+    if not content_type or not isinstance(content_type, str):
+        raise UploadError("Invalid content type")
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        raise UploadError("size must be a positive number of bytes")
+    if size > DIRECT_UPLOAD_MAX_BYTES:
+        raise UploadError(f"Files larger than {DIRECT_UPLOAD_MAX_BYTES} bytes can't be uploaded", 413)
+
+    upload_id = str(uuid.uuid4())
+    filename = f"{upload_id}_{original_filename}"
+    storage_path = upload_storage_path(user_id, filename)
+    signed = get_upload_url(storage_path, content_type, size, DIRECT_UPLOAD_EXPIRATION)
+
+    now = time.time()
+    expires_at = now + DIRECT_UPLOAD_EXPIRATION
+    upload_sessions[upload_id] = {
+        "owner": user_id,
+        "filename": filename,
+        "originalFilename": original_filename,
+        "storagePath": storage_path,
+        "contentType": content_type,
+        "size": size,
+        "expiresAt": expires_at,
+    }
+    _expire_sessions(now)
+    logger.info(f"Direct upload {upload_id} of {original_filename} ({size} bytes) by {user_id}")
+    return {
+        "upload_id": upload_id,
+        "url": signed["url"],
+        "method": "PUT",
+        "headers": signed["headers"],
+        "expiresAt": datetime.fromtimestamp(expires_at, timezone.utc).isoformat(),
+    }
+
+
+def complete_upload(user_id, upload_id, create):
+    """
+    End a direct upload whose file is in Storage.
+
+    The session is only dropped after create() returned, so a failure to
+    create the document leaves the upload to be completed again.
+
+    Args:
+        user_id: Requesting user; must be the one who started the upload
+        upload_id: ID returned by create_upload
+        create: Called with the session (owner, filename, originalFilename,
+                storagePath, contentType, size, expiresAt) to create the
+                document; must not fail if the document already exists
+
+    Returns:
+        The result of create
+
+    Raises:
+        UploadError: 404 for an unknown or expired upload, 403 for another
+                     user's, 409 if the file is not in Storage (yet), has
+                     another size or is being completed by another request
+    """
+    session = upload_sessions.get(upload_id)
+    if session is None or _expired(session, time.time()):
+        raise UploadError("Upload not found", 404)
+    if session["owner"] != user_id:
+        raise UploadError("Access denied", 403)
+
+    stored_size = get_blob_size(session["storagePath"])
+    if stored_size is None:
+        raise UploadError("File has not been uploaded", 409)
+    if stored_size != session["size"]:
+        raise UploadError(f"Uploaded file has {stored_size} bytes, expected {session['size']}", 409)
+
+    # Only one of two concurrent completions gets the session
+    def claim(current):
+        now = time.time()
+        if current is None or _expired(current, now):
+            raise UploadError("Upload not found", 404)
+        if _completing(current, now):
+            raise UploadError("Upload is being completed", 409)
+        return dict(current, completingAt=now)
+
+    claimed = update_entry(upload_sessions, upload_id, claim)
+    try:
+        result = create(session)
+    except Exception:
+        # Let the upload be completed again
+        update_entry(upload_sessions, upload_id,
+                     lambda current: current and {k: v for k, v in current.items() if k != "completingAt"})
+        raise
+    _discard(upload_id, claimed)
+    logger.info(f"Direct upload {upload_id} completed")
+    return result
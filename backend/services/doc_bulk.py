@@ -0,0 +1,156 @@
+# backend/services/doc_bulk.py
+"""
+Bulk document operations for POST /api/docs/bulk.
+
+Moving, trashing or restoring N documents used to take N requests, each
+re-authenticating, scanning doc_store and saving it. apply_bulk() checks
+access to all documents up front, writes every metadata change with one
+doc_store.patch_many() transaction and saves once. Storage side effects
+run concurrently: audio trashed the old way is moved back by a thread pool,
+and deletes go to Storage as one bulk delete (purge_docs). Only documents
+in the trash can be deleted, as with the trash routes; a live document has
+to be trashed first.
+
+Each document gets its own result, so one missing or foreign document does
+not fail the others.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from services.storage import doc_store, save_doc_store
+from services.folder_index import add_folder
+from services.storage_backend import get_file_url
+from services.trash import (
+    delete_changes, restore_changes, has_legacy_audio, restore_legacy_audio,
+    purge_docs, upload_path,
+)
+
+# Get configuration
+try:
+    from config import BULK_MAX_DOCS, BULK_DELETE_WORKERS
+except ImportError:
+    # Default values if config can't be imported
+    BULK_MAX_DOCS = 1000
+    BULK_DELETE_WORKERS = 8
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ("move", "trash", "restore", "delete")
+
+
+class BulkError(ValueError):
+    """Raised for a malformed bulk request"""
+
+
+def _result(doc_id, status, error=None):
+    result = {"id": doc_id, "status": status}
+    if error:
+        result["error"] = error
+    return result
+
+
+def _restore_legacy(doc):
+    """Move a document's audio out of the old trash; returns extra changes or None"""
+    if not restore_legacy_audio(doc.owner, doc.audioFilename):
+        return None
+    changes = {}
+    file_url = get_file_url(upload_path(doc.owner, doc.audioFilename))
+    if file_url:
+        changes["firebaseUrl"] = file_url
+    return changes
+
+
+def _plan_changes(docs, operation, folder, results):
+    """Metadata changes of a move, trash or restore; failures go to results"""
+    changes = {}
+    if operation == "move":
+        for doc in docs:
+            if not doc.audioFilename:
+                results[doc.id] = _result(doc.id, "failed", "Document does not have an associated audio file.")
+            else:
+                changes[doc.id] = {"folderName": folder or None}
+        if folder:
+            for owner in {doc.owner for doc in docs if doc.id in changes}:
+                add_folder(owner, folder)
+    elif operation == "trash":
+        for doc in docs:
+            if not doc.deleted:
+                changes[doc.id] = delete_changes(doc)
+            else:
+                results[doc.id] = _result(doc.id, "ok")
+    elif operation == "restore":
+        legacy = [doc for doc in docs if doc.audioFilename and has_legacy_audio(doc)]
+        restored = {}
+        if legacy:
+            with ThreadPoolExecutor(max_workers=min(BULK_DELETE_WORKERS, len(legacy))) as pool:
+                restored = dict(zip((doc.id for doc in legacy), pool.map(_restore_legacy, legacy)))
+        for doc in docs:
+            extra = restored.get(doc.id, {})
+            if extra is None:
+                results[doc.id] = _result(doc.id, "failed", "Audio not found in trash")
+            else:
+                changes[doc.id] = dict(restore_changes(), **extra)
+    return changes
+
+
+def apply_bulk(user_id, doc_ids, operation, folder=None, admin=False):
+    """
+    Apply one operation to many documents.
+
+    Args:
+        user_id: Requesting user
+        doc_ids: Document IDs; duplicates are ignored
+        operation: "move", "trash", "restore" or "delete" (of trashed documents)
+        folder: Destination of a move; None or "" for home
+        admin: Whether the user may change other users' documents
+
+    Returns:
+        list: One {"id", "status", "error"?} per document, in request order.
+              status is "ok", "not_found", "forbidden" or "failed".
+
+    Raises:
+        BulkError: If the operation or ids are invalid
+    """
+    if operation not in OPERATIONS:
+        raise BulkError(f"operation must be one of {', '.join(OPERATIONS)}")
+    if not isinstance(doc_ids, list) or not doc_ids or not all(isinstance(i, str) for i in doc_ids):
+        raise BulkError("ids must be a non-empty list of document IDs")
+    doc_ids = list(dict.fromkeys(doc_ids))
+    if len(doc_ids) > BULK_MAX_DOCS:
+        raise BulkError(f"At most {BULK_MAX_DOCS} documents per request")
+    if folder is not None and not isinstance(folder, str):
+        raise BulkError("folder must be a string")
+
+    results = {}
+    docs = []
+    for doc_id in doc_ids:
+        doc = doc_store.get(doc_id)
+        if doc is None:
+            results[doc_id] = _result(doc_id, "not_found")
+        elif doc.owner != user_id and not admin:
+            results[doc_id] = _result(doc_id, "forbidden")
+        else:
+            docs.append(doc)
+
+    if operation == "delete":
+        trashed = []
+        for doc in docs:
+            if doc.deleted:
+                trashed.append(doc)
+            else:
+                results[doc.id] = _result(doc.id, "failed", "Document is not in the trash")
+        outcome = purge_docs(trashed, user_id) if trashed else {"purged": [], "failed": {}}
+        for doc_id in outcome["purged"]:
+            results[doc_id] = _result(doc_id, "ok")
+        for doc_id, error in outcome["failed"].items():
+            results[doc_id] = _result(doc_id, "failed", error)
+    else:
+        changes = _plan_changes(docs, operation, folder, results)
+        updated = doc_store.patch_many(changes) if changes else {}
+        for doc_id in changes:
+            results[doc_id] = _result(doc_id, "ok") if doc_id in updated else _result(doc_id, "not_found")
+
+    if docs:
+        save_doc_store()
+    failed = sum(1 for r in results.values() if r["status"] != "ok")
+    logger.info(f"Bulk {operation} by {user_id}: {len(doc_ids) - failed} ok, {failed} not applied")
+    return [results[doc_id] for doc_id in doc_ids]
@@ -0,0 +1,258 @@
+# backend/services/doc_index.py
+"""
+In-memory secondary indexes over document metadata.
+
+Documents are grouped into buckets by (owner, folder, trashed, status) and
+each bucket keeps one sorted list per sort field. Buckets are kept per
+owner, so a user's listing never looks at other users' buckets. A listing
+query picks the matching buckets, seeks to the cursor with bisect and
+lazily merges the buckets, so the cost of a page depends on the page size
+and not on how many documents a user, or everyone, has.
+
+Every filter is answered by the bucket choice or by a seek, never by
+skipping documents: a date range has to be on the sort field, and ranges
+on another field are rejected.
+"""
+import base64
+import bisect
+import heapq
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SORT_FIELDS = ("createdAt", "updatedAt", "name")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Special folder filter values
+HOME_FOLDER = ""
+ANY_FOLDER = "*"
+
+
+class InvalidQuery(ValueError):
+    """Raised for malformed listing parameters (bad cursor, sort field, ...)"""
+
+
+def _sort_key(doc, field):
+    if field == "name":
+        return (doc.name or "").casefold()
+    return getattr(doc, field) or ""
+
+
+def is_trashed(doc):
+    """A document is in the trash once it or its audio has been deleted"""
+    return bool(doc.deleted or doc.audioTrashed)
+
+
+def encode_cursor(sort, order, key, doc_id):
+    raw = json.dumps([sort, order, key, doc_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor, sort, order):
+    try:
+        cur_sort, cur_order, key, doc_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii"))
+        )
+    except Exception:
+        raise InvalidQuery("Invalid cursor")
+    if cur_sort != sort or cur_order != order:
+        raise InvalidQuery("Cursor does not match the requested sort order")
+    return (key, doc_id)
+
+
+class DocIndex:
+    """Sorted per-bucket indexes over doc_store Documents"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # owner -> {(folder, trashed, status) -> {sort field: sorted [(key, doc_id), ...]}}
+        self._buckets = {}
+        # doc_id -> (owner, bucket key, {sort field: key})
+        self._entries = {}
+
+    def _unindex(self, doc_id):
+        entry = self._entries.pop(doc_id, None)
+        if not entry:
+            return
+        owner, bucket_key, keys = entry
+        owner_buckets = self._buckets.get(owner)
+        bucket = owner_buckets.get(bucket_key) if owner_buckets else None
+        if not bucket:
+            return
+        for field, key in keys.items():
+            items = bucket[field]
+            pos = bisect.bisect_left(items, (key, doc_id))
+            if pos < len(items) and items[pos] == (key, doc_id):
+                del items[pos]
+        if not bucket[SORT_FIELDS[0]]:
+            del owner_buckets[bucket_key]
+            if not owner_buckets:
+                del self._buckets[owner]
+
+    def _index(self, doc, presorted=False):
+        doc_id = doc.id
+        bucket_key = (doc.folderName or HOME_FOLDER, is_trashed(doc), doc.transcription_status)
+        keys = {field: _sort_key(doc, field) for field in SORT_FIELDS}
+        bucket = self._buckets.setdefault(doc.owner, {}).setdefault(
+            bucket_key, {field: [] for field in SORT_FIELDS}
+        )
+        for field, key in keys.items():
+            if presorted:
+                bucket[field].append((key, doc_id))
+            else:
+                bisect.insort(bucket[field], (key, doc_id))
+        self._entries[doc_id] = (doc.owner, bucket_key, keys)
+
+    def add(self, doc):
+        """Index a Document, replacing any previous entry for it"""
+        with self._lock:
+            self._unindex(doc.id)
+            self._index(doc)
+
+    def remove(self, doc_id):
+        """Drop a document from the index"""
+        with self._lock:
+            self._unindex(doc_id)
+
+    def rebuild(self, docs):
+        """Rebuild the whole index from an iterable of Documents"""
+        with self._lock:
+            self._buckets = {}
+            self._entries = {}
+            for doc in docs:
+                self._index(doc, presorted=True)
+            # One sort per list instead of an insort per document
+            for owner_buckets in self._buckets.values():
+                for bucket in owner_buckets.values():
+                    for items in bucket.values():
+                        items.sort()
+        logger.info(f"Built document index over {len(self._entries)} documents")
+
+    def _select_buckets(self, owner, folder, trashed, status):
+        """Yield the buckets matching the filters; an owner's query only sees that owner's"""
+        if owner is None:
+            owners = list(self._buckets.values())
+        else:
+            owners = [self._buckets.get(owner, {})]
+        for owner_buckets in owners:
+            for (folder_key, trashed_key, status_key), bucket in owner_buckets.items():
+                if folder != ANY_FOLDER and folder_key != folder:
+                    continue
+                if trashed is not None and trashed_key != trashed:
+                    continue
+                if status and status_key != status:
+                    continue
+                yield bucket
+
+    @staticmethod
+    def _walk(items, start, descending):
+        """Yield (key, doc_id) from a sorted list starting after `start`"""
+        if descending:
+            pos = len(items) if start is None else bisect.bisect_left(items, start)
+            for i in range(pos - 1, -1, -1):
+                yield items[i]
+        else:
+            pos = 0 if start is None else bisect.bisect_right(items, start)
+            for i in range(pos, len(items)):
+                yield items[i]
+
+    def query(
+        self,
+        owner=None,
+        folder=HOME_FOLDER,
+        trashed=False,
+        status=None,
+        created_after=None,
+        created_before=None,
+        updated_after=None,
+        updated_before=None,
+        sort="createdAt",
+        order="desc",
+        cursor=None,
+        limit=DEFAULT_PAGE_SIZE,
+    ):
+        """
+        Return one page of doc ids matching the filters.
+
+        Args:
+            owner: Owner uid, or None for every owner (admins)
+            folder: Folder name, HOME_FOLDER for unfiled docs, ANY_FOLDER for all
+            trashed: True/False to filter on trash state, None for both
+            status: Optional transcription_status to match
+            created_after/created_before/updated_after/updated_before:
+                Optional inclusive ISO-8601 bounds; only on the sort field
+            sort: One of SORT_FIELDS
+            order: "asc" or "desc"
+            cursor: nextCursor returned by the previous page
+            limit: Page size
+
+        Returns:
+            tuple: (list of doc ids, next cursor or None)
+
+        Raises:
+            InvalidQuery: For a bad sort, order or cursor, or a date range
+                          on a field the listing is not sorted by
+        """
+        if sort not in SORT_FIELDS:
+            raise InvalidQuery(f"Unsupported sort field: {sort}")
+        if order not in ("asc", "desc"):
+            raise InvalidQuery(f"Unsupported sort order: {order}")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        descending = order == "desc"
+        start = decode_cursor(cursor, sort, order) if cursor else None
+
+        bounds = {
+            "createdAt": (created_after, created_before),
+            "updatedAt": (updated_after, updated_before),
+        }
+        for field, (low, high) in bounds.items():
+            if (low or high) and field != sort:
+                # Would mean skipping over every document outside the range
+                raise InvalidQuery(f"A {field} range requires sort={field}")
+
+        # Seek straight to a range bound on the sort field
+        low, high = bounds.get(sort, (None, None))
+        if low or high:
+            if descending and high:
+                seek = (high, "\U0010ffff")
+                start = seek if start is None else min(start, seek)
+            elif not descending and low:
+                seek = (low, "")
+                start = seek if start is None else max(start, seek)
+
+        with self._lock:
+            streams = [
+                self._walk(bucket[sort], start, descending)
+                for bucket in self._select_buckets(owner, folder, trashed, status)
+            ]
+            merged = heapq.merge(*streams, reverse=descending)
+
+            page = []
+            last = None
+            for item in merged:
+                key, doc_id = item
+
+                # Range on the sort field: stop as soon as we leave it
+                if (low and key < low) or (high and key > high):
+                    break
+
+                if len(page) == limit:
+                    return page, encode_cursor(sort, order, last[0], last[1])
+                page.append(doc_id)
+                last = item
+
+        return page, None
+
+
+def project(doc, fields):
+    """Return a Document as a dict with only the requested fields (id is always kept)"""
+    if not fields:
+        return doc.to_dict()
+    projected = {"id": doc.id}
+    for field in fields:
+        if field in doc:
+            projected[field] = doc[field]
+    return projected
@@ -0,0 +1,222 @@
+# backend/services/doc_record.py
+"""
+Compact document metadata records.
+
+Every document used to be a free-form dict, so each of them paid for its own
+hash table and its own copies of owner uids and status strings. A Document
+keeps the known fields in ``__slots__`` and interns the low-cardinality
+string values (owner, status, folder), so 100k+ documents share one copy of
+each. Fields that are not part of the schema are kept in a small ``extra``
+dict, which stays None for the usual record.
+
+Documents are read-only once published in doc_store: use doc_store.patch()
+or doc_store.mutate() to change one. They still support read access by key
+(``doc["name"]``, ``doc.get("owner")``) for code that treats records as
+mappings, and to_dict()/from_dict() are the explicit (de)serialization used
+for JSON responses and persistence.
+"""
+import sys
+from collections.abc import Mapping
+from functools import lru_cache
+
+
+class TranscriptionStatus:
+    """Values of Document.transcription_status"""
+
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class StorageStatus:
+    """Values of Document.storage_status (upload of the audio to Firebase)"""
+
+    PENDING = "pending"
+    UPLOADING = "uploading"
+    UPLOADED = "uploaded"
+    FAILED = "failed"
+
+
+# Schema fields and the value attribute access returns while they are unset
+FIELD_DEFAULTS = {
+    "id": None,
+    "name": None,
+    "owner": None,
+    "audioFilename": None,
+    "originalFilename": None,
+    "audioTrashed": False,
+    "deleted": False,
+    "folderName": None,
+    "firebaseUrl": None,
+    "firebasePath": None,
+    "localPath": None,
+    "transcription_status": None,
+    "is_replicate": False,
+    "requires_prompt": False,
+    "error": None,
+    "createdAt": None,
+    "updatedAt": None,
+    "version": 0,
+    "storage_status": None,
+    "storage_error": None,
+    "trashedAt": None,
+    "contentHash": None,
+    "legacyTrash": False,
+}
+FIELDS = tuple(FIELD_DEFAULTS)
+
+# Repetitive string fields that are stored once per distinct value
+INTERNED_FIELDS = frozenset(("owner", "transcription_status", "folderName", "storage_status"))
+
+
+class Document(Mapping):
+    """
+    Slotted, read-only document metadata record.
+
+    A schema field that was never set is absent: attribute access returns its
+    default from FIELD_DEFAULTS, but it is left out of keys() and to_dict(),
+    so a record round-trips to exactly the JSON it was built from.
+    """
+
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, **fields):
+        extra = None
+        for key, value in fields.items():
+            if key in FIELD_DEFAULTS:
+                if key in INTERNED_FIELDS and type(value) is str:
+                    value = sys.intern(value)
+                object.__setattr__(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        object.__setattr__(self, "extra", extra)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a Document from a JSON-style dict (or another Document)"""
+        if isinstance(data, Document):
+            return data
+        return cls(**data)
+
+    def to_dict(self):
+        """Return the record as a plain dict, ready for jsonify/json.dump"""
+        data = {}
+        for key in FIELDS:
+            try:
+                data[key] = _SLOT_GETTERS[key](self)
+            except AttributeError:
+                pass
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def to_tuple(self):
+        """
+        Compact positional form used by the binary doc store snapshot.
+
+        Returns:
+            tuple: (bitmask of the FIELDS present, their values, extra dict or None)
+        """
+        mask = 0
+        values = []
+        for bit, key in enumerate(FIELDS):
+            try:
+                values.append(_SLOT_GETTERS[key](self))
+            except AttributeError:
+                continue
+            mask |= 1 << bit
+        return mask, tuple(values), self.extra
+
+    @classmethod
+    def from_tuple(cls, mask, values, extra=None, fields=FIELDS):
+        """
+        Rebuild a Document from to_tuple() output.
+
+        Args:
+            fields: Field order the tuple was written with (FIELDS of the writer)
+        """
+        doc = cls.__new__(cls)
+        extra = dict(extra) if extra else None
+        for key, value in zip(_present_fields(mask, fields), values):
+            setter = _SLOT_SETTERS.get(key)
+            if setter is None:
+                # A field the writer knew and this schema doesn't
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            if key in INTERNED_FIELDS and type(value) is str:
+                value = sys.intern(value)
+            setter(doc, value)
+        object.__setattr__(doc, "extra", extra)
+        return doc
+
+    def __getattr__(self, name):
+        # Only reached for unset slots (and genuinely unknown attributes)
+        try:
+            return FIELD_DEFAULTS[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Document records are read-only; use doc_store.patch()")
+
+    def __delattr__(self, name):
+        raise AttributeError("Document records are read-only; use doc_store.patch()")
+
+    def __reduce__(self):
+        return (_from_dict, (self.to_dict(),))
+
+    # --- Mapping interface ---
+
+    def __getitem__(self, key):
+        getter = _SLOT_GETTERS.get(key)
+        if getter is not None:
+            try:
+                return getter(self)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for key in FIELDS:
+            try:
+                _SLOT_GETTERS[key](self)
+            except AttributeError:
+                continue
+            yield key
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Document({self.to_dict()!r})"
+
+
+def _from_dict(data):
+    return Document.from_dict(data)
+
+
+@lru_cache(maxsize=1024)
+def _present_fields(mask, fields):
+    """Names of the fields whose bits are set in a to_tuple() mask"""
+    return tuple(key for bit, key in enumerate(fields) if mask >> bit & 1)
+
+
+# Raw slot descriptors: reading through them skips __getattr__'s defaults
+_SLOT_GETTERS = {key: Document.__dict__[key].__get__ for key in FIELDS}
+_SLOT_SETTERS = {key: Document.__dict__[key].__set__ for key in FIELDS}
@@ -0,0 +1,177 @@
+# backend/services/doc_snapshot.py
+"""
+Binary doc store snapshots.
+
+doc_store.json is pretty-printed JSON that has to be parsed in full before
+the first request can be served. A snapshot file holds the same data as
+one compact JSON record per Document (see Document.to_tuple), followed by
+an offset index:
+
+    MAGIC | format version (u32) | count (u32) | offsets at (u64) | meta length (u64)
+    record 0 | record 1 | ... | offsets (count + 1 x u64) | meta
+    meta = JSON {"counter", "fields", "ids"}
+
+Records are JSON, which every Python version reads the same way, and the
+format version in the header is checked before anything is decoded, so a
+snapshot written by another version of this code fails loudly instead of
+being misread. A single record can be read through the index without
+decoding the others.
+
+Snapshots of the first format (MAGIC_V1) were marshal data, which is not
+stable across Python versions; they are still read, to migrate them, but
+raise SnapshotError if this interpreter can't decode them.
+"""
+import array
+import json
+import logging
+import marshal
+import mmap
+import os
+import struct
+from services.doc_record import Document, FIELDS
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"YDOCSNAP"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<IIQQ")
+_HEADER_SIZE = len(MAGIC) + _HEADER.size
+
+# First format: marshal records and index
+MAGIC_V1 = b"YDOCSNP1"
+_HEADER_V1 = struct.Struct("<QQ")
+
+
+class SnapshotError(Exception):
+    """Raised for files that are not valid doc store snapshots"""
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_snapshot(path, docs, counter):
+    """
+    Write a snapshot of the doc store.
+
+    Args:
+        path: Target file path
+        docs: Mapping of doc_id -> Document
+        counter: Document counter to store with it
+    """
+    doc_ids = []
+    offsets = array.array("Q")
+    # A half-written snapshot would lose every document, so write a temp
+    # file and swap it in; open memory maps of the old file stay valid
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * _HEADER_SIZE)
+        position = _HEADER_SIZE
+        for doc_id, doc in docs.items():
+            record = _encode(doc.to_tuple())
+            doc_ids.append(doc_id)
+            offsets.append(position)
+            f.write(record)
+            position += len(record)
+        offsets.append(position)
+        f.write(offsets.tobytes())
+        meta = _encode({"counter": counter, "fields": list(FIELDS), "ids": doc_ids})
+        f.write(meta)
+        # Header last: an incomplete file never looks like a valid snapshot
+        f.seek(0)
+        f.write(MAGIC + _HEADER.pack(FORMAT_VERSION, len(doc_ids), position, len(meta)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SnapshotReader:
+    """Read access to a snapshot file through its offset index"""
+
+    def __init__(self, path, use_mmap=True):
+        self.path = path
+        with open(path, "rb") as f:
+            if use_mmap and os.path.getsize(path) > 0:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._data = f.read()
+        self._view = memoryview(self._data)
+        try:
+            magic = bytes(self._view[:len(MAGIC)])
+            if magic == MAGIC:
+                self._open()
+            elif magic == MAGIC_V1:
+                self._open_v1()
+            else:
+                raise SnapshotError(f"{path} is not a doc store snapshot")
+        except SnapshotError:
+            self.close()
+            raise
+        except Exception as e:
+            self.close()
+            raise SnapshotError(f"{path} is corrupted: {e}")
+        self._positions = None
+
+    def _open(self):
+        version, count, offsets_at, meta_length = _HEADER.unpack_from(self._view, len(MAGIC))
+        if version != FORMAT_VERSION:
+            raise SnapshotError(
+                f"{self.path} has snapshot format {version}; this version reads format {FORMAT_VERSION}"
+            )
+        meta_at = offsets_at + (count + 1) * 8
+        if meta_at + meta_length != len(self._view):
+            raise SnapshotError(f"{self.path} is truncated")
+        self._offsets = array.array("Q")
+        self._offsets.frombytes(self._view[offsets_at:meta_at])
+        meta = json.loads(bytes(self._view[meta_at:]))
+        self.counter, self._fields, self._doc_ids = meta["counter"], tuple(meta["fields"]), meta["ids"]
+        self._decode = json.loads
+
+    def _open_v1(self):
+        index_offset, index_length = _HEADER_V1.unpack_from(self._view, len(MAGIC_V1))
+        with self._view[index_offset:index_offset + index_length] as index:
+            if len(index) != index_length:
+                raise SnapshotError(f"{self.path} is truncated")
+            try:
+                self.counter, self._fields, self._doc_ids, raw_offsets = marshal.loads(index)
+            except (ValueError, EOFError, TypeError) as e:
+                raise SnapshotError(
+                    f"{self.path} is a marshal snapshot this Python version can't read: {e}"
+                )
+        self._offsets = array.array("Q")
+        self._offsets.frombytes(raw_offsets)
+        self._decode = marshal.loads
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def _record(self, i):
+        start, end = self._offsets[i], self._offsets[i + 1]
+        with self._view[start:end] as record:
+            mask, values, extra = self._decode(bytes(record))
+        return Document.from_tuple(mask, values, extra, self._fields)
+
+    def get(self, doc_id):
+        """Decode a single document, or None if it isn't in the snapshot"""
+        if self._positions is None:
+            self._positions = {doc_id: i for i, doc_id in enumerate(self._doc_ids)}
+        i = self._positions.get(doc_id)
+        return None if i is None else self._record(i)
+
+    def documents(self):
+        """Decode every document, returning {doc_id: Document}"""
+        try:
+            return {doc_id: self._record(i) for i, doc_id in enumerate(self._doc_ids)}
+        except Exception as e:
+            raise SnapshotError(f"{self.path} has an unreadable record: {e}")
+
+    def close(self):
+        self._view.release()
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
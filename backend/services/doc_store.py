@@ -0,0 +1,369 @@
+# backend/services/doc_store.py
+"""
+Concurrency-safe document metadata store.
+
+Request handlers, Socket.IO handlers and background transcription tasks all
+write to the store at the same time. Published records are never mutated in
+place: every write builds a new Document under a per-document lock and swaps
+it in, bumping its ``version``. Readers and the serializer therefore only ever
+see complete records and never need a lock, and writers to different
+documents never wait on each other.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+from services.shared_state import StateConflict
+from services.doc_record import Document
+
+logger = logging.getLogger(__name__)
+
+
+class VersionConflict(Exception):
+    """Raised when a compare-and-set write finds a newer version of the doc"""
+
+    def __init__(self, doc_id, expected, current):
+        super().__init__(
+            f"Version conflict on doc {doc_id}: expected {expected}, found {current}"
+        )
+        self.doc_id = doc_id
+        self.expected = expected
+        self.current = current
+
+
+def now_iso():
+    """Current UTC time as a sortable ISO-8601 string"""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+class DocStore:
+    """
+    Mapping of doc_id -> Document record with per-document write locks.
+
+    Records returned by get()/values()/items() are read-only Documents;
+    use patch() or mutate() to change them.
+
+    With a shared StateBackend every write is a compare-and-set against the
+    backend, so workers in other processes can't lose each other's updates,
+    and reads pull the changes other workers made at most every
+    `sync_interval` seconds.
+    """
+
+    # Attempts at a shared-backend write before giving up on a hot document
+    MAX_WRITE_ATTEMPTS = 5
+
+    def __init__(self, index=None, backend=None, namespace="docs", sync_interval=0.5):
+        self._docs = {}
+        self._locks = {}
+        self._index = index
+        self._backend = backend
+        self._namespace = namespace
+        self._sync_interval = sync_interval
+        self._seq = 0
+        self._last_sync = 0.0
+        self._sync_lock = threading.Lock()
+
+    # --- Read side (lock-free) ---
+
+    def get(self, doc_id, default=None):
+        self._maybe_sync()
+        return self._docs.get(doc_id, default)
+
+    def __getitem__(self, doc_id):
+        self._maybe_sync()
+        return self._docs[doc_id]
+
+    def __contains__(self, doc_id):
+        self._maybe_sync()
+        return doc_id in self._docs
+
+    def __len__(self):
+        self._maybe_sync()
+        return len(self._docs)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def keys(self):
+        return self.snapshot().keys()
+
+    def values(self):
+        return self.snapshot().values()
+
+    def items(self):
+        return self.snapshot().items()
+
+    def snapshot(self):
+        """
+        Return a point-in-time copy of the store.
+
+        Copying the top-level dict is a single C-level operation, and the
+        records it references are immutable, so the snapshot can be iterated
+        or serialized while writers keep going.
+        """
+        self._maybe_sync()
+        return dict(self._docs)
+
+    # --- Shared state ---
+
+    @property
+    def shared(self):
+        return self._backend is not None
+
+    def _maybe_sync(self):
+        if self._backend is not None and time.monotonic() - self._last_sync >= self._sync_interval:
+            self.sync()
+
+    def sync(self):
+        """Apply the changes other workers wrote to the shared backend since the last sync"""
+        if self._backend is None:
+            return
+        # Only one thread pulls at a time; the others keep serving the current view
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sync = time.monotonic()
+            seq, changes = self._backend.changes_since(self._seq)
+            for namespace, doc_id, record, _ in changes:
+                if namespace != self._namespace:
+                    continue
+                with self._locked(doc_id):
+                    if record is None:
+                        self._unpublish(doc_id)
+                        continue
+                    local = self._docs.get(doc_id)
+                    if local is None or local.version < record.get("version", 0):
+                        self._publish(Document.from_dict(record))
+            self._seq = seq
+        except Exception as e:
+            logger.error(f"Error syncing doc store from shared state: {e}")
+        finally:
+            self._sync_lock.release()
+
+    def load_shared(self):
+        """Load the whole store from the shared backend"""
+        self._seq, _ = self._backend.changes_since(0)
+        self.replace_all(self._backend.items(self._namespace))
+        self._last_sync = time.monotonic()
+
+    # --- Write side ---
+
+    def _lock_for(self, doc_id):
+        lock = self._locks.get(doc_id)
+        if lock is None:
+            lock = self._locks.setdefault(doc_id, threading.Lock())
+        return lock
+
+    @contextmanager
+    def _locked(self, doc_id):
+        """
+        Hold the write lock of a document.
+
+        remove() drops the lock from the table while holding it; a thread
+        that was waiting on the dropped lock starts over with the current
+        one, so two writers never hold different locks for the same id.
+        """
+        while True:
+            lock = self._lock_for(doc_id)
+            lock.acquire()
+            if self._locks.get(doc_id) is lock:
+                break
+            lock.release()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def _publish(self, doc):
+        self._docs[doc.id] = doc
+        if self._index is not None:
+            self._index.add(doc)
+
+    def _unpublish(self, doc_id):
+        doc = self._docs.pop(doc_id, None)
+        if self._index is not None:
+            self._index.remove(doc_id)
+        return doc
+
+    def insert(self, doc):
+        """
+        Add a new document, stamping version and createdAt/updatedAt.
+
+        In shared mode a deleted document's id can be reused: its version
+        continues from the tombstone's, so versions keep matching the
+        backend's for compare-and-set.
+
+        Raises:
+            VersionConflict: In shared mode, if a live document has the id
+        """
+        data = dict(doc)
+        timestamp = now_iso()
+        data.setdefault("createdAt", timestamp)
+        data["updatedAt"] = timestamp
+        data["version"] = 1
+        doc_id = Document.from_dict(data).id
+        with self._locked(doc_id):
+            if self._backend is not None:
+                for _ in range(self.MAX_WRITE_ATTEMPTS):
+                    current, version = self._backend.get(self._namespace, doc_id)
+                    if current is not None:
+                        raise VersionConflict(doc_id, 0, version)
+                    data["version"] = version + 1
+                    try:
+                        self._backend.put(self._namespace, doc_id, data, expected_version=version)
+                        break
+                    except StateConflict:
+                        continue
+                else:
+                    raise VersionConflict(doc_id, 0, None)
+            record = Document.from_dict(data)
+            self._publish(record)
+        return record
+
+    def mutate(self, doc_id, fn, expected_version=None):
+        """
+        Apply fn to a private copy of the document and publish the result.
+
+        Args:
+            doc_id: Document ID
+            fn: Callable receiving the copy as a dict; may modify it in place
+            expected_version: If given, only write when the stored version matches
+
+        Returns:
+            Document: The new record, or None if the document does not exist
+
+        Raises:
+            VersionConflict: If expected_version does not match
+        """
+        with self._locked(doc_id):
+            for _ in range(self.MAX_WRITE_ATTEMPTS):
+                if self._backend is not None:
+                    # Always start from the latest shared version, not our cached copy
+                    current, _ = self._backend.get(self._namespace, doc_id)
+                    if current is None:
+                        self._unpublish(doc_id)
+                        return None
+                else:
+                    current = self._docs.get(doc_id)
+                    if current is None:
+                        return None
+                    current = current.to_dict()
+
+                current_version = current.get("version", 0)
+                if expected_version is not None and int(expected_version) != current_version:
+                    raise VersionConflict(doc_id, expected_version, current_version)
+
+                data = current
+                fn(data)
+                data["id"] = doc_id
+                data["version"] = current_version + 1
+                data["updatedAt"] = now_iso()
+
+                if self._backend is not None:
+                    try:
+                        self._backend.put(
+                            self._namespace, doc_id, data, expected_version=current_version
+                        )
+                    except StateConflict:
+                        # Another worker wrote in between: re-read and re-apply
+                        continue
+
+                record = Document.from_dict(data)
+                self._publish(record)
+                return record
+
+            raise VersionConflict(doc_id, expected_version, None)
+
+    def patch(self, doc_id, changes, expected_version=None):
+        """Merge `changes` into a document (see mutate)"""
+        return self.mutate(doc_id, lambda record: record.update(changes), expected_version)
+
+    def patch_many(self, changes_by_id):
+        """
+        Merge changes into several documents as one transaction.
+
+        The documents' locks are taken in sorted order, so concurrent calls
+        can't deadlock. With a shared backend all records are written with
+        a single put_many() and retried together on a conflict, so other
+        workers see either none or all of the changes.
+
+        Args:
+            changes_by_id: {doc_id: changes}
+
+        Returns:
+            dict: {doc_id: new Document}, without the ids that do not exist
+        """
+        doc_ids = sorted(changes_by_id)
+        with ExitStack() as stack:
+            for doc_id in doc_ids:
+                stack.enter_context(self._locked(doc_id))
+            for _ in range(self.MAX_WRITE_ATTEMPTS):
+                entries = []
+                for doc_id in doc_ids:
+                    if self._backend is not None:
+                        current, _ = self._backend.get(self._namespace, doc_id)
+                        if current is None:
+                            self._unpublish(doc_id)
+                            continue
+                    else:
+                        current = self._docs.get(doc_id)
+                        if current is None:
+                            continue
+                        current = current.to_dict()
+                    current_version = current.get("version", 0)
+                    data = dict(current, **changes_by_id[doc_id])
+                    data["id"] = doc_id
+                    data["version"] = current_version + 1
+                    data["updatedAt"] = now_iso()
+                    entries.append((doc_id, data, current_version))
+
+                if self._backend is not None and entries:
+                    try:
+                        self._backend.put_many(self._namespace, entries)
+                    except StateConflict:
+                        continue
+
+                records = {}
+                for doc_id, data, _ in entries:
+                    records[doc_id] = Document.from_dict(data)
+                    self._publish(records[doc_id])
+                return records
+
+            raise VersionConflict(None, None, None)
+
+    def remove(self, doc_id):
+        """Remove a document, returning its last record"""
+        with self._locked(doc_id):
+            if self._backend is not None:
+                self._backend.delete(self._namespace, doc_id)
+            doc = self._unpublish(doc_id)
+            self._locks.pop(doc_id, None)
+        return doc
+
+    def replace_all(self, docs):
+        """Replace the whole store contents (used when loading from disk)"""
+        self._docs = {
+            doc_id: doc if isinstance(doc, Document) and doc.id == doc_id
+            else Document.from_dict(dict(doc, id=doc_id))
+            for doc_id, doc in docs.items()
+        }
+        if self._index is not None:
+            self._index.rebuild(self._docs.values())
+
+    def to_dicts(self):
+        """Serialize a snapshot of the store as {doc_id: dict} for persistence"""
+        return {doc_id: doc.to_dict() for doc_id, doc in self.snapshot().items()}
+
+    def import_docs(self, docs):
+        """Copy records into the shared backend, skipping ids it already has"""
+        imported = 0
+        for doc_id, doc in docs.items():
+            try:
+                self._backend.put(
+                    self._namespace, doc_id, dict(doc, id=doc_id, version=1), expected_version=0
+                )
+                imported += 1
+            except StateConflict:
+                pass
+        return imported
@@ -0,0 +1,140 @@
+# backend/services/firebase_client.py
+"""
+The one Firebase app, Storage bucket and Firestore client of the process.
+
+Firebase used to be initialized at import by services/firebase_service.py,
+Firestore_implementation.py and firebase_helper.py, each its own way, and
+again by create_app(). Now every module gets its clients from here, and
+nothing is created until the first call that needs one: importing the app
+reads no credentials and opens no connections.
+
+get_bucket() and get_db() return the shared clients, or None if Firebase
+can't be initialized (a failure is retried after INIT_RETRY_INTERVAL
+seconds, not on every call). The Storage client's HTTP session keeps a
+pool of HTTP_POOL_SIZE connections, enough for the parallel bulk deletes
+and uploads to reuse connections instead of opening new ones.
+
+`bucket` and `db` are lazy stand-ins for modules that keep a module-level
+client: attribute access goes to the real client, and they are falsy
+while Firebase is unavailable.
+"""
+import logging
+import os
+import threading
+import time
+from firebase_config import FIREBASE_SERVICE_ACCOUNT_KEY, FIREBASE_STORAGE_BUCKET
+
+# Get configuration
+try:
+    from config import FIREBASE_HTTP_POOL_SIZE
+except ImportError:
+    # Default value if config can't be imported
+    FIREBASE_HTTP_POOL_SIZE = 32
+
+logger = logging.getLogger(__name__)
+
+# Seconds before initialization is tried again after a failure
+INIT_RETRY_INTERVAL = 60
+
+_lock = threading.Lock()
+_app = None
+_bucket = None
+_db = None
+_failed_at = None
+
+
+def _initialize():
+    """Create the Firebase app; called with _lock held"""
+    global _app, _failed_at
+    # Imported here so that importing this module stays cheap
+    import firebase_admin
+    from firebase_admin import credentials
+
+    if _app is not None:
+        return _app
+    if _failed_at is not None and time.monotonic() - _failed_at < INIT_RETRY_INTERVAL:
+        return None
+    try:
+        try:
+            # Initialized elsewhere (e.g. by a script)
+            _app = firebase_admin.get_app()
+        except ValueError:
+            if not os.path.exists(FIREBASE_SERVICE_ACCOUNT_KEY):
+                raise FileNotFoundError(
+                    f"Firebase service account key not found: {FIREBASE_SERVICE_ACCOUNT_KEY}"
+                )
+            cred = credentials.Certificate(FIREBASE_SERVICE_ACCOUNT_KEY)
+            _app = firebase_admin.initialize_app(cred, {"storageBucket": FIREBASE_STORAGE_BUCKET})
+            logger.info("Firebase initialized successfully")
+        _failed_at = None
+    except Exception as e:
+        logger.error(f"Error initializing Firebase: {e}")
+        _failed_at = time.monotonic()
+    return _app
+
+
+def _pool_connections(client):
+    """Give a Storage client's HTTP session a larger connection pool"""
+    try:
+        from requests.adapters import HTTPAdapter
+        adapter = HTTPAdapter(pool_connections=FIREBASE_HTTP_POOL_SIZE, pool_maxsize=FIREBASE_HTTP_POOL_SIZE)
+        client._http.mount("https://", adapter)
+    except Exception as e:
+        logger.warning(f"Could not resize the Storage connection pool: {e}")
+
+
+def get_app():
+    """Return the Firebase app, initializing it on first use; None if unavailable"""
+    if _app is not None:
+        return _app
+    with _lock:
+        return _initialize()
+
+
+def get_bucket():
+    """Return the shared Storage bucket, or None if Firebase is unavailable"""
+    global _bucket
+    if _bucket is not None:
+        return _bucket
+    with _lock:
+        if _bucket is None and _initialize() is not None:
+            from firebase_admin import storage
+            _bucket = storage.bucket(app=_app)
+            _pool_connections(_bucket.client)
+        return _bucket
+
+
+def get_db():
+    """Return the shared Firestore client, or None if Firebase is unavailable"""
+    global _db
+    if _db is not None:
+        return _db
+    with _lock:
+        if _db is None and _initialize() is not None:
+            from firebase_admin import firestore
+            _db = firestore.client(app=_app)
+        return _db
+
+
+class LazyClient:
+    """Stand-in for a client that is created on first attribute access"""
+
+    def __init__(self, getter, name):
+        self._getter = getter
+        self._name = name
+
+    def __getattr__(self, attr):
+        client = self._getter()
+        if client is None:
+            raise RuntimeError(f"Firebase {self._name} is not available")
+        return getattr(client, attr)
+
+    def __bool__(self):
+        return self._getter() is not None
+
+    def __repr__(self):
+        return f"<LazyClient {self._name}>"
+
+
+bucket = LazyClient(get_bucket, "Storage bucket")
+db = LazyClient(get_db, "Firestore client")
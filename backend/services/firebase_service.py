@@ -1,60 +1,47 @@
 import os
+import time
 import uuid
 import logging
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import firebase_admin
-from firebase_admin import credentials, storage, firestore, auth
-from firebase_config import (
-    FIREBASE_SERVICE_ACCOUNT_KEY,
-    FIREBASE_STORAGE_BUCKET,
-    ADMIN_USER_IDS,
-)
+from google.api_core.exceptions import NotFound
+from firebase_admin import firestore, auth
+from services import blob_index, firebase_client
+from services.blob_cache import blob_cache
+from services.signed_url_cache import signed_url_cache
+from firebase_config import ADMIN_USER_IDS
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Firebase clients
-bucket = None
-db = None
-firebase_app = None
+# Only the blob fields file listings report; the list response already
+# carries custom metadata, so no per-blob reload is needed
+LIST_FIELDS = "items(name,contentType,size,timeCreated,metadata),prefixes,nextPageToken"
 
+# Lifetime of the download URLs handed to clients; short for security
+URL_EXPIRATION = 3600
+UPLOAD_URL_EXPIRATION = 7 * 24 * 3600
 
-def initialize_firebase():
-    """Initialize Firebase Admin SDK with service account credentials"""
-    global bucket, db, firebase_app
+# Storage accepts at most 100 calls per batch request, Firestore 500 writes
+DELETE_BATCH_SIZE = 100
+FIRESTORE_BATCH_SIZE = 500
 
-    if not firebase_admin._apps:
-        try:
-            # Check if service account key file exists
-            if not os.path.exists(FIREBASE_SERVICE_ACCOUNT_KEY):
-                logger.error(
-                    f"Firebase service account key not found: {FIREBASE_SERVICE_ACCOUNT_KEY}"
-                )
-                return False
+# Get configuration
+try:
+    from config import BULK_DELETE_WORKERS
+except ImportError:
+    # Default value if config can't be imported
+    BULK_DELETE_WORKERS = 8
 
-            # Initialize with service account
-            cred = credentials.Certificate(FIREBASE_SERVICE_ACCOUNT_KEY)
-            firebase_app = firebase_admin.initialize_app(
-                cred, {"storageBucket": FIREBASE_STORAGE_BUCKET}
-            )
+# Firebase clients, created on first use by services.firebase_client
+bucket = firebase_client.bucket
+db = firebase_client.db
 
-            # Initialize services
-            bucket = storage.bucket()
-            db = firestore.client()
 
-            logger.info("Firebase initialized successfully")
-            return True
-        except Exception as e:
-            logger.error(f"Error initializing Firebase: {e}")
-            return False
-    else:
-        # Already initialized, ensure clients are set
-        if not bucket:
-            bucket = storage.bucket()
-        if not db:
-            db = firestore.client()
-        return True
+def initialize_firebase():
+    """Initialize Firebase now instead of on first use; returns whether it is available"""
+    return firebase_client.get_app() is not None
 
 
 def is_admin(user_id):
@@ -100,10 +87,10 @@ def ensure_folder_exists(user_id, folder_type="uploads"):
     try:
         # Create an empty placeholder object to ensure folder exists
         folder_path = f"users/{user_id}/{folder_type}/.folder_marker"
-        blob = bucket.blob(folder_path)
-
-        if not blob.exists():
+        if not blob_cache.exists(bucket, folder_path):
+            blob = bucket.blob(folder_path)
             blob.upload_from_string("", content_type="application/octet-stream")
+            blob_cache.note_uploaded(blob)
             logger.info(f"Created {folder_type} folder for user {user_id}")
 
         return True
@@ -119,8 +106,7 @@ def check_blob_exists(storage_path):
         return False
 
     try:
-        blob = bucket.blob(storage_path)
-        return blob.exists()
+        return blob_cache.exists(bucket, storage_path)
     except Exception as e:
         logger.error(f"Error checking blob existence: {e}")
         return False
@@ -160,11 +146,16 @@ def upload_file(
         }
         # Update the blob with new metadata
         blob.patch()
+        blob_cache.note_uploaded(blob)
+        blob_index.record_blob(_file_info(blob, user_id))
 
         # Get a signed URL that expires in 7 days
+        signed_at = time.time()
         signed_url = blob.generate_signed_url(
-            version="v4", expiration=datetime.timedelta(days=7), method="GET"
+            version="v4", expiration=UPLOAD_URL_EXPIRATION, method="GET"
         )
+        # Only reused for callers that accept a URL this long-lived
+        signed_url_cache.put(storage_path, signed_url, signed_at + UPLOAD_URL_EXPIRATION)
 
         # Store metadata in Firestore
         doc_ref = db.collection("files").document(filename.replace("/", "_"))
@@ -209,13 +200,7 @@ def get_file_url(storage_path, requesting_user_id=None):
     try:
         # If no user ID provided, skip permission check (internal use)
         if not requesting_user_id:
-            blob = bucket.blob(storage_path)
-            if blob.exists():
-                signed_url = blob.generate_signed_url(
-                    version="v4", expiration=datetime.timedelta(hours=1), method="GET"
-                )
-                return signed_url
-            return None
+            return _signed_download_url(storage_path)
 
         # Check if path belongs to user (simple path check for efficiency)
         path_owner = extract_owner_from_path(storage_path)
@@ -229,25 +214,29 @@ def get_file_url(storage_path, requesting_user_id=None):
             )
             return None
 
-        # Check file existence
-        blob = bucket.blob(storage_path)
-        if not blob.exists():
+        signed_url = _signed_download_url(storage_path)
+        if signed_url is None:
             logger.warning(f"File not found: {storage_path}")
-            return None
-
-        # Generate secure, time-limited URL
-        signed_url = blob.generate_signed_url(
-            version="v4",
-            expiration=datetime.timedelta(hours=1),  # Short expiration for security
-            method="GET",
-        )
-
         return signed_url
     except Exception as e:
         logger.error(f"Error getting file URL: {e}")
         return None
 
 
+def _signed_download_url(storage_path, expiration=URL_EXPIRATION):
+    """Signed GET URL for an existing blob (reused while valid), or None"""
+
+    def sign():
+        if not blob_cache.exists(bucket, storage_path):
+            return None
+        # Generate secure, time-limited URL
+        return bucket.blob(storage_path).generate_signed_url(
+            version="v4", expiration=expiration, method="GET"
+        )
+
+    return signed_url_cache.get_url(storage_path, sign, expiration)
+
+
 def delete_file(storage_path, requesting_user_id):
 
     if not bucket:
@@ -256,10 +245,10 @@ def delete_file(storage_path, requesting_user_id):
 
     try:
         # Check file existence first
-        blob = bucket.blob(storage_path)
-        if not blob.exists():
+        if not blob_cache.exists(bucket, storage_path):
             logger.warning(f"File not found for deletion: {storage_path}")
             return False
+        blob = bucket.blob(storage_path)
 
         # Check if path belongs to user (simple path check)
         path_owner = extract_owner_from_path(storage_path)
@@ -268,6 +257,9 @@ def delete_file(storage_path, requesting_user_id):
         ):
             # Delete from Storage
             blob.delete()
+            blob_cache.note_deleted(storage_path)
+            signed_url_cache.invalidate(storage_path)
+            blob_index.forget_blob(storage_path)
 
             # Delete metadata from Firestore
             doc_id = storage_path.split("/")[-1].replace("/", "_")
@@ -283,10 +275,94 @@ def delete_file(storage_path, requesting_user_id):
             )
             return False
     except Exception as e:
+        # The cached answer may have been stale; ask Storage next time
+        blob_cache.invalidate(storage_path)
         logger.error(f"Error deleting file: {e}")
         return False
 
 
+def _delete_chunk(paths):
+    """Delete up to DELETE_BATCH_SIZE blobs in one batch request; returns {path: error}"""
+    try:
+        with bucket.client.batch():
+            for path in paths:
+                bucket.blob(path).delete()
+        return {}
+    except Exception as e:
+        # Only the last error of a batch is raised: find the failures one by one
+        logger.warning(f"Batch delete of {len(paths)} blobs failed ({e}), retrying individually")
+    failures = {}
+    for path in paths:
+        try:
+            bucket.blob(path).delete()
+        except NotFound:
+            pass
+        except Exception as e:
+            failures[path] = str(e)
+    return failures
+
+
+def _delete_file_records(storage_paths):
+    """Remove the Firestore 'files' records of deleted blobs in batched writes"""
+    try:
+        for start in range(0, len(storage_paths), FIRESTORE_BATCH_SIZE):
+            batch = db.batch()
+            for path in storage_paths[start:start + FIRESTORE_BATCH_SIZE]:
+                batch.delete(db.collection("files").document(path.split("/")[-1]))
+            batch.commit()
+    except Exception as e:
+        logger.error(f"Error deleting file records: {e}")
+
+
+def delete_files(storage_paths, requesting_user_id=None, max_workers=BULK_DELETE_WORKERS):
+    """
+    Delete many blobs at once.
+
+    Blobs are deleted with Storage batch requests of DELETE_BATCH_SIZE calls,
+    sent from a pool of max_workers threads. Paths that no longer exist
+    count as deleted.
+
+    Args:
+        storage_paths: Blob names
+        requesting_user_id: User the paths must belong to (unless admin);
+                            None for internal jobs such as the trash purger
+        max_workers: Concurrent batch requests
+
+    Returns:
+        dict: {"deleted": [paths], "failed": {path: error}}
+    """
+    paths = list(dict.fromkeys(storage_paths))
+    if not bucket:
+        logger.error("Firebase Storage bucket not initialized")
+        return {"deleted": [], "failed": {path: "Storage not initialized" for path in paths}}
+
+    failed = {}
+    allowed = paths
+    if requesting_user_id is not None and not is_admin(requesting_user_id):
+        allowed = []
+        for path in paths:
+            if extract_owner_from_path(path) == requesting_user_id:
+                allowed.append(path)
+            else:
+                failed[path] = "Access denied"
+
+    chunks = [allowed[i:i + DELETE_BATCH_SIZE] for i in range(0, len(allowed), DELETE_BATCH_SIZE)]
+    if chunks:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+            for failures in pool.map(_delete_chunk, chunks):
+                failed.update(failures)
+
+    deleted = [path for path in allowed if path not in failed]
+    for path in deleted:
+        blob_cache.note_deleted(path)
+        signed_url_cache.invalidate(path)
+        blob_index.forget_blob(path)
+    _delete_file_records(deleted)
+    if failed:
+        logger.warning(f"Bulk delete: {len(deleted)} deleted, {len(failed)} failed")
+    return {"deleted": deleted, "failed": failed}
+
+
 def move_file(source_path, dest_path, requesting_user_id):
 
     if not bucket:
@@ -295,13 +371,12 @@ def move_file(source_path, dest_path, requesting_user_id):
 
     try:
         # Check file existence
-        source_blob = bucket.blob(source_path)
-        if not source_blob.exists():
+        source_info = blob_cache.lookup(bucket, source_path)
+        if source_info is None:
             logger.warning(f"Source file not found: {source_path}")
 
             # Double-check if dest_path already exists (might have been moved already)
-            dest_blob = bucket.blob(dest_path)
-            if dest_blob.exists():
+            if blob_cache.exists(bucket, dest_path):
                 logger.info(
                     f"Destination already exists: {dest_path}, treating as success"
                 )
@@ -330,12 +405,12 @@ def move_file(source_path, dest_path, requesting_user_id):
                 ensure_folder_exists(dest_owner, folder_type)
 
                 # Copy source to destination
+                source_blob = bucket.blob(source_path)
                 bucket.copy_blob(source_blob, bucket, dest_path)
 
-                # Get metadata to preserve
-                source_blob.reload()
-                metadata = source_blob.metadata or {}
-                content_type = source_blob.content_type
+                # Metadata to preserve, from the existence check above
+                metadata = source_info.metadata
+                content_type = source_info.content_type
 
                 # Apply metadata to destination
                 dest_blob = bucket.blob(dest_path)
@@ -345,6 +420,10 @@ def move_file(source_path, dest_path, requesting_user_id):
 
                 # Delete source blob only after successful copy
                 source_blob.delete()
+                blob_cache.note_moved(source_path, dest_blob)
+                signed_url_cache.invalidate(source_path)
+                blob_index.forget_blob(source_path)
+                blob_index.record_blob(_file_info(dest_blob, dest_owner))
 
                 # Update Firestore metadata
                 filename = dest_path.split("/")[-1].replace("/", "_")
@@ -367,17 +446,90 @@ def move_file(source_path, dest_path, requesting_user_id):
             )
             return False
     except Exception as e:
+        blob_cache.invalidate(source_path)
+        blob_cache.invalidate(dest_path)
         logger.error(f"Error moving file: {e}")
         return False
 
 
-def list_user_files(user_id, folder_path):
+def _file_info(blob, user_id):
+    """File object reported for a blob, built from the fields it was listed with"""
+    filename = blob.name.split("/")[-1]
+    metadata = blob.metadata or {}
+    return {
+        "filename": filename,
+        "storagePath": blob.name,
+        "contentType": blob.content_type,
+        "size": blob.size,
+        "timeCreated": (
+            blob.time_created.isoformat() if blob.time_created else None
+        ),
+        "originalFilename": metadata.get("originalFilename", filename),
+        "ownerId": metadata.get("ownerId", user_id),
+    }
+
+
+def _is_folder_marker(name):
+    return name.endswith(".folder_marker") or name.endswith("/")
+
+
+def list_user_files_page(
+    user_id, folder_path, page_token=None, page_size=None, delimiter=None
+):
+    """
+    List one page of a user's files in a folder.
+
+    Args:
+        user_id: User ID
+        folder_path: Folder to list (e.g., 'folders/')
+        page_token: nextPageToken of the previous page, None for the first
+        page_size: Maximum number of blobs per page (None: server default)
+        delimiter: e.g. '/' to list only the folder's own files and report
+                   its subfolders as prefixes
+
+    Returns:
+        dict: {"files": [file objects], "prefixes": [str],
+               "nextPageToken": str or None}
+    """
+    if not bucket:
+        logger.error("Firebase Storage bucket not initialized")
+        return {"files": [], "prefixes": [], "nextPageToken": None}
+
+    prefix = f"users/{user_id}/{folder_path}"
+    logger.debug(f"Listing files with prefix: {prefix}")
+    iterator = bucket.list_blobs(
+        prefix=prefix,
+        delimiter=delimiter,
+        max_results=page_size,
+        page_token=page_token,
+        fields=LIST_FIELDS,
+    )
+    page = next(iterator.pages, None)
+    if page is None:
+        return {"files": [], "prefixes": [], "nextPageToken": None}
+
+    files = [
+        _file_info(blob, user_id) for blob in page if not _is_folder_marker(blob.name)
+    ]
+    return {
+        "files": files,
+        "prefixes": sorted(page.prefixes),
+        "nextPageToken": iterator.next_page_token,
+    }
+
+
+def list_user_files(user_id, folder_path, delimiter=None):
     """
     List files owned by a user in a specific folder.
 
+    Served from the local listing index when it covers the folder,
+    otherwise listed page by page from the bucket (one request per page,
+    not per file).
+
     Args:
         user_id: User ID
         folder_path: Folder to list (e.g., 'folders/')
+        delimiter: e.g. '/' to leave out files in subfolders
 
     Returns:
         list: List of file objects
@@ -386,44 +538,28 @@ def list_user_files(user_id, folder_path):
         logger.error("Firebase Storage bucket not initialized")
         return []
 
-    try:
-        # Ensure folder_path is explicitly passed and not defaulted
-        prefix = f"users/{user_id}/{folder_path}"
-        logger.debug(f"Listing files with prefix: {prefix}")
+    prefix = f"users/{user_id}/{folder_path}"
+    indexed = blob_index.lookup(user_id, prefix, delimiter)
+    if indexed is not None:
+        files = [f for f in indexed[0] if not _is_folder_marker(f["storagePath"])]
+        logger.debug(f"Listed {len(files)} files for user {user_id} in {folder_path} from index")
+        return files
 
-        blobs = bucket.list_blobs(prefix=prefix)
+    try:
+        listed_at = time.time()
         files = []
+        page_token = None
+        while True:
+            page = list_user_files_page(
+                user_id, folder_path, page_token=page_token, delimiter=delimiter
+            )
+            files.extend(page["files"])
+            page_token = page["nextPageToken"]
+            if not page_token:
+                break
 
-        for blob in blobs:
-            logger.debug(f"Found blob: {blob.name}")
-
-            # Skip folder markers
-            if blob.name.endswith(".folder_marker") or blob.name.endswith("/"):
-                logger.debug(f"Skipping folder marker: {blob.name}")
-                continue
-
-            # Extract filename from path
-            filename = blob.name.split("/")[-1]
-
-            # Get metadata
-            blob.reload()
-            metadata = blob.metadata or {}
-            logger.debug(f"Blob metadata for {blob.name}: {metadata}")
-
-            # Create file object
-            file_obj = {
-                "filename": filename,
-                "storagePath": blob.name,
-                "contentType": blob.content_type,
-                "size": blob.size,
-                "timeCreated": (
-                    blob.time_created.isoformat() if blob.time_created else None
-                ),
-                "originalFilename": metadata.get("originalFilename", filename),
-                "ownerId": metadata.get("ownerId", user_id),
-            }
-
-            files.append(file_obj)
+        if delimiter is None:
+            blob_index.store_listing(user_id, prefix, files, listed_at)
 
         if not files:
             logger.info(f"No files found for user {user_id} in folder {folder_path}")
@@ -442,13 +578,14 @@ def list_user_files(user_id, folder_path):
 
 def verify_token(id_token):
 
-    if not firebase_app:
+    app = firebase_client.get_app()
+    if app is None:
         logger.error("Firebase not initialized")
         return None
 
     try:
         # Verify the token
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = auth.verify_id_token(id_token, app=app)
         user_id = decoded_token.get("uid")
         email = decoded_token.get("email", "")
 
@@ -456,7 +593,3 @@ def verify_token(id_token):
     except Exception as e:
         logger.error(f"Error verifying token: {e}")
         return None
-
-
-# Initialize on import
-initialize_firebase()
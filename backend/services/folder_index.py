@@ -0,0 +1,233 @@
+# backend/services/folder_index.py
+"""
+Virtual folders.
+
+A document's folder is its folderName attribute; the audio blob stays at
+users/<uid>/uploads/<audioFilename> whichever folder the document is in,
+so filing a document is a metadata write instead of a Storage copy and
+delete. The folder names of each user are kept here, which also covers
+empty folders, and doc_index already buckets documents by folder for
+listing them.
+
+Before this, folders were Storage prefixes: users/<uid>/folders/.<name>
+marked a folder and users/<uid>/folders/<name>/<file> held its audio.
+migrate_user() moves such blobs back to the uploads path, sets folderName
+on their documents and deletes the markers. It runs for every document
+owner in the background at startup, and in the background for a user
+whose folders are used before theirs ran; requests never wait for it and
+see the folders known so far. A failed migration (e.g. while Storage is
+down) is recorded on the user's entry and retried with exponential
+backoff instead of on every request.
+"""
+import logging
+import threading
+import time
+from services.shared_state import shared_mapping, update_entry
+from services.storage import doc_store, doc_index, save_doc_store
+from services.doc_index import MAX_PAGE_SIZE
+from services.storage_backend import get_storage
+from services.socketio_instance import socketio
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a failed migration is retried; doubles with every failure
+MIGRATION_RETRY_DELAY = 60
+MAX_MIGRATION_RETRY_DELAY = 3600
+
+# uid -> {"folders": [name, ...], "migrated": bool, "attempts": failed
+#         migrations, "failedAt": time of the last failure}
+folder_index = shared_mapping("folders")
+_lock = threading.Lock()
+# Users whose migration runs in the background of this process
+_migrating = set()
+
+
+def _retry_due(entry, now):
+    """Whether a user's migration should run (again)"""
+    if entry is None:
+        return True
+    if entry.get("migrated"):
+        return False
+    attempts = entry.get("attempts", 0)
+    if not attempts:
+        return True
+    delay = min(MIGRATION_RETRY_DELAY * 2 ** (attempts - 1), MAX_MIGRATION_RETRY_DELAY)
+    return now >= entry.get("failedAt", 0) + delay
+
+
+def _start_migration(user_id):
+    """Mark a user's migration as running here; False if it already is"""
+    with _lock:
+        if user_id in _migrating:
+            return False
+        _migrating.add(user_id)
+        return True
+
+
+def _run_migration(user_id):
+    try:
+        migrate_user(user_id)
+    finally:
+        with _lock:
+            _migrating.discard(user_id)
+
+
+def _entry(user_id):
+    entry = folder_index.get(user_id)
+    if _retry_due(entry, time.time()) and _start_migration(user_id):
+        socketio.start_background_task(_run_migration, user_id)
+    return entry or {"folders": [], "migrated": False}
+
+
+def list_folders(user_id):
+    """Return the sorted folder names of a user"""
+    return list(_entry(user_id)["folders"])
+
+
+def folder_exists(user_id, name):
+    return name in _entry(user_id)["folders"]
+
+
+def _change_folders(user_id, change):
+    """Apply change(folders) -> folders to a user's entry; returns whether it changed"""
+    changed = []
+
+    def apply(entry):
+        entry = entry or {"folders": [], "migrated": False}
+        folders = change(entry["folders"])
+        changed[:] = [folders != entry["folders"]]
+        return dict(entry, folders=folders)
+
+    update_entry(folder_index, user_id, apply)
+    return changed[0]
+
+
+def add_folder(user_id, name):
+    """Register a folder; returns False if it already existed"""
+    _entry(user_id)
+    return _change_folders(
+        user_id, lambda folders: folders if name in folders else sorted(folders + [name])
+    )
+
+
+def remove_folder(user_id, name):
+    """Unregister a folder; returns False if it did not exist"""
+    _entry(user_id)
+    return _change_folders(user_id, lambda folders: [f for f in folders if f != name])
+
+
+def docs_in_folder(user_id, name, trashed=False):
+    """Return the Documents filed in a folder, newest first"""
+    doc_ids = []
+    cursor = None
+    while True:
+        page, cursor = doc_index.query(
+            owner=user_id, folder=name, trashed=trashed, cursor=cursor, limit=MAX_PAGE_SIZE
+        )
+        doc_ids.extend(page)
+        if not cursor:
+            break
+    return [doc for doc in map(doc_store.get, doc_ids) if doc]
+
+
+def move_docs(doc_ids, folder_name):
+    """
+    File documents into a folder (None for home) by updating their metadata.
+
+    Returns:
+        list: The ids that were found and moved
+    """
+    moved = [
+        doc_id for doc_id in doc_ids
+        if doc_store.patch(doc_id, {"folderName": folder_name or None})
+    ]
+    if moved:
+        save_doc_store()
+    return moved
+
+
+def migrate_user(user_id):
+    """
+    Convert a user's Storage-prefix folders into virtual folders.
+
+    Blobs are moved back to the uploads path once and their documents get
+    folderName. Users whose migration fails stay unmarked, with the failure
+    counted on their entry, and are retried after a backoff.
+
+    Returns:
+        int: Number of audio blobs moved
+    """
+    storage = get_storage()
+    if not storage.available():
+        logger.warning(f"Folder migration of user {user_id} postponed: storage is unavailable")
+        _record_migration(user_id, set(), False)
+        return 0
+
+    prefix = f"users/{user_id}/folders/"
+    folders = set((folder_index.get(user_id) or {}).get("folders", []))
+    moved = 0
+    markers = []
+    try:
+        docs_by_filename = {}
+        for doc in doc_store.values():
+            if doc.owner == user_id:
+                if doc.audioFilename:
+                    docs_by_filename.setdefault(doc.audioFilename, doc)
+                if doc.folderName:
+                    folders.add(doc.folderName)
+
+        for blob in list(storage.list_blobs(prefix)):
+            rest = blob.name[len(prefix):]
+            folder, sep, filename = rest.partition("/")
+            if not sep:
+                # users/<uid>/folders/.<name> marks a folder
+                if folder.startswith("."):
+                    folders.add(folder[1:])
+                markers.append(blob.name)
+                continue
+            folders.add(folder)
+            if not filename or filename == ".keep":
+                markers.append(blob.name)
+                continue
+            dest_path = f"users/{user_id}/uploads/{filename}"
+            if not storage.move_file(blob.name, dest_path, user_id):
+                raise RuntimeError(f"could not move {blob.name}")
+            moved += 1
+            doc = docs_by_filename.get(filename)
+            if doc:
+                doc_store.patch(doc.id, {"folderName": folder, "firebasePath": dest_path})
+        failed = storage.delete_files(markers, user_id)["failed"]
+        if failed:
+            raise RuntimeError(f"could not delete {len(failed)} folder markers")
+    except Exception as e:
+        logger.error(f"Folder migration of user {user_id} failed after {moved} files: {e}")
+        migrated = False
+    else:
+        migrated = True
+        if moved:
+            logger.info(f"Migrated {moved} files of user {user_id} to virtual folders")
+
+    if moved:
+        save_doc_store()
+    _record_migration(user_id, folders, migrated)
+    return moved
+
+
+def _record_migration(user_id, folders, migrated):
+    def apply(entry):
+        entry = entry or {"folders": []}
+        record = {"folders": sorted(folders.union(entry["folders"])), "migrated": migrated}
+        if not migrated:
+            record["attempts"] = entry.get("attempts", 0) + 1
+            record["failedAt"] = time.time()
+        return record
+
+    update_entry(folder_index, user_id, apply)
+
+
+def migrate_all_users():
+    """Migrate the folders of every document owner not migrated yet (and not backing off)"""
+    owners = {doc.owner for doc in doc_store.values() if doc.owner}
+    for user_id in sorted(owners):
+        if _retry_due(folder_index.get(user_id), time.time()) and _start_migration(user_id):
+            _run_migration(user_id)
@@ -0,0 +1,92 @@
+# backend/services/job_registry.py
+"""
+Registry of background jobs (transcriptions, ...).
+
+Lives in the shared state backend when one is configured, so any worker can
+report on a job started by another. Each record notes which worker runs it.
+"""
+import logging
+from datetime import datetime, timezone
+from services.shared_state import shared_mapping, update_entry, WORKER_ID
+from services.doc_store import now_iso
+
+logger = logging.getLogger(__name__)
+
+job_registry = shared_mapping("jobs")
+
+
+def start_job(job_id, kind, **info):
+    """Register a job as running on this worker"""
+    record = {
+        "id": job_id,
+        "kind": kind,
+        "status": "running",
+        "worker": WORKER_ID,
+        "startedAt": now_iso(),
+        "updatedAt": now_iso(),
+    }
+    record.update(info)
+    job_registry[job_id] = record
+    return record
+
+
+def _running(record, stale_after):
+    """Whether a job record is running on a worker that updated it within stale_after seconds"""
+    if not record or record.get("status") != "running":
+        return False
+    updated = datetime.fromisoformat(record["updatedAt"])
+    return (datetime.now(timezone.utc) - updated).total_seconds() < stale_after
+
+
+def claim_job(job_id, kind, stale_after, **info):
+    """
+    Register a job as running on this worker, unless a worker already runs it.
+
+    A running job whose record was not updated for stale_after seconds is
+    taken to belong to a worker that stopped, and can be claimed. The claim
+    is a compare-and-set, so of several workers claiming the same job at
+    once only one gets it.
+
+    Returns:
+        dict: The new record, or None if the job is running elsewhere
+    """
+    if _running(job_registry.get(job_id), stale_after):
+        return None
+    claimed = {}
+
+    def apply(current):
+        claimed.clear()
+        if _running(current, stale_after):
+            # Claimed by another worker since the check above
+            return current
+        record = {
+            "id": job_id,
+            "kind": kind,
+            "status": "running",
+            "worker": WORKER_ID,
+            "startedAt": now_iso(),
+            "updatedAt": now_iso(),
+        }
+        record.update(info)
+        claimed.update(record)
+        return record
+
+    update_entry(job_registry, job_id, apply)
+    return claimed or None
+
+
+def update_job(job_id, **changes):
+    """Update a job record (e.g. status="completed" or "failed", error=...)"""
+    def apply(current):
+        record = dict(current or {"id": job_id})
+        record.update(changes)
+        record["updatedAt"] = now_iso()
+        return record
+
+    # Compare-and-set, so updates from several workers or threads are not lost
+    return update_entry(job_registry, job_id, apply)
+
+
+def get_job(job_id):
+    """Return a job record or None"""
+    return job_registry.get(job_id)
@@ -0,0 +1,265 @@
+# backend/services/reconciler.py
+"""
+Background reconciliation of doc_store, local disk and Firebase Storage.
+
+The trash and upload listings used to reconcile on every GET, so a read
+listed the bucket, rewrote flags and saved doc_store. Now a Reconciler
+runs every RECONCILE_INTERVAL seconds and keeps a manifest of what it has
+already checked: the generation of every blob under users/*/uploads/ and
+blobs/ (content-addressed audio, possibly shared by several documents) and
+the version of every document. Only the paths whose blob generation or
+document version changed since they were last checked are checked again.
+
+The bucket is listed incrementally: each run continues a sweep of the
+bucket in name order for at most RECONCILE_LIST_BATCH blobs, so a run
+costs the same however large the bucket is. A blob that is gone is noticed
+when the sweep that should have seen it completes. Until the first sweep
+completes, documents whose path the sweep has not reached yet are checked
+once it has.
+
+A check repairs what it safely can:
+
+- storage_status: the blob exists but the document says the upload failed
+- reupload: the document's blob is gone but the local copy is still there
+- stale_local_path: localPath points at a file that no longer exists
+
+and records what it can't as drift (orphan_blob, missing_audio,
+upload_failed), which stats() reports on /api/metrics. The manifest lives
+in memory, so the first sweep after a start checks everything.
+
+Only one worker reconciles: the loop runs a pass only while it holds the
+"reconciler" lease of the shared state backend.
+"""
+import logging
+import os
+import time
+from collections import Counter
+from services.storage import doc_store, save_doc_store
+from services.doc_record import StorageStatus
+from services.trash import has_legacy_audio
+from services.blob_store import BLOB_PREFIX, audio_storage_path
+from services.storage_upload import start_storage_upload
+from services.storage_backend import get_storage
+from services.shared_state import get_state_backend, hold_lease
+from services.socketio_instance import socketio
+
+# Get configuration
+try:
+    from config import UPLOAD_FOLDER, RECONCILE_INTERVAL, RECONCILE_LIST_BATCH
+except ImportError:
+    # Default values if config can't be imported
+    UPLOAD_FOLDER = "uploads"
+    RECONCILE_INTERVAL = 300
+    RECONCILE_LIST_BATCH = 5000
+
+logger = logging.getLogger(__name__)
+
+# Only name and generation are needed to detect changes
+MANIFEST_FIELDS = "items(name,generation),nextPageToken"
+# Prefixes swept, in this order
+SWEEP_PREFIXES = ("users/", BLOB_PREFIX)
+
+
+def _is_upload_path(name):
+    parts = name.split("/")
+    if len(parts) == 2 and parts[0] + "/" == BLOB_PREFIX:
+        return bool(parts[1])
+    return len(parts) == 4 and parts[0] == "users" and parts[2] == "uploads" and parts[3]
+
+
+class Reconciler:
+    """Incremental doc_store / disk / Storage consistency checker"""
+
+    def __init__(self, list_batch=RECONCILE_LIST_BATCH):
+        self.list_batch = list_batch
+        # Manifest of the last run
+        self._blobs = {}  # upload path -> blob generation
+        self._docs = {}  # doc_id -> (version, upload path)
+        self._path_docs = {}  # upload path -> [doc_id, ...]
+        self._drift = {}  # upload path -> drift kind
+        # Position of the sweep: index into SWEEP_PREFIXES and last name listed
+        self._prefix = 0
+        self._after = None
+        self._seen = set()  # upload paths listed by the current sweep
+        self._swept = False  # whether a sweep has completed
+        self._deferred = set()  # paths to check once the first sweep reaches them
+        self._sweeps = 0
+        self._repairs = Counter()
+        self._runs = 0
+        self._last_run = None
+        self._last_duration = 0.0
+        self._last_checked = 0
+
+    def run(self, bucket):
+        """
+        Reconcile the paths that changed since they were last checked.
+
+        Returns:
+            int: Number of paths checked
+        """
+        started = time.time()
+        dirty = self._sweep(bucket)
+
+        docs = {}
+        for doc in doc_store.values():
+            if doc.audioFilename and doc.owner:
+                docs[doc.id] = (doc.version, audio_storage_path(doc))
+        for doc_id, entry in docs.items():
+            previous = self._docs.get(doc_id)
+            if previous != entry:
+                dirty.add(entry[1])
+                if previous:
+                    dirty.add(previous[1])
+        dirty.update(self._docs[doc_id][1] for doc_id in self._docs.keys() - docs.keys())
+        self._docs = docs
+        self._path_docs = {}
+        for doc_id, (_, path) in docs.items():
+            self._path_docs.setdefault(path, []).append(doc_id)
+
+        # Whether a blob exists is only known once the sweep has been past it
+        dirty.update(self._deferred)
+        self._deferred = {path for path in dirty if not self._covered(path)}
+        dirty -= self._deferred
+
+        changed = False
+        for path in dirty:
+            changed = self._check(path) or changed
+        if changed:
+            save_doc_store()
+
+        self._runs += 1
+        self._last_run = started
+        self._last_duration = time.time() - started
+        self._last_checked = len(dirty)
+        if self._drift:
+            logger.warning(f"Reconciliation found {len(self._drift)} inconsistent paths")
+        return len(dirty)
+
+    def _sweep(self, bucket):
+        """List the next RECONCILE_LIST_BATCH blobs; returns the upload paths that changed"""
+        dirty = set()
+        budget = self.list_batch
+        while budget > 0:
+            prefix = SWEEP_PREFIXES[self._prefix]
+            # One more than the budget tells whether the prefix goes on, and
+            # one more again for the last name listed: start_offset is inclusive
+            wanted = budget + 1 + (self._after is not None)
+            blobs = list(bucket.list_blobs(prefix, fields=MANIFEST_FIELDS,
+                                           start_offset=self._after, max_results=wanted))
+            if blobs and blobs[0].name == self._after:
+                blobs = blobs[1:]
+            more = len(blobs) > budget
+            blobs = blobs[:budget]
+            budget -= len(blobs)
+            for blob in blobs:
+                if _is_upload_path(blob.name):
+                    self._seen.add(blob.name)
+                    if self._blobs.get(blob.name) != blob.generation:
+                        dirty.add(blob.name)
+                        self._blobs[blob.name] = blob.generation
+            if more:
+                self._after = blobs[-1].name
+                break
+            self._prefix += 1
+            self._after = None
+            if self._prefix == len(SWEEP_PREFIXES):
+                # Sweep complete: what it didn't list is gone
+                gone = self._blobs.keys() - self._seen
+                dirty.update(gone)
+                for path in gone:
+                    del self._blobs[path]
+                self._prefix = 0
+                self._seen = set()
+                self._swept = True
+                self._sweeps += 1
+                break
+        return dirty
+
+    def _covered(self, path):
+        """Whether the manifest knows if the blob at path exists"""
+        if self._swept:
+            return True
+        index = next((i for i, prefix in enumerate(SWEEP_PREFIXES) if path.startswith(prefix)), None)
+        if index is None or index < self._prefix:
+            return True
+        return index == self._prefix and self._after is not None and path <= self._after
+
+    def _check(self, path):
+        """Check one upload path; returns True if a document was repaired"""
+        self._drift.pop(path, None)
+        present = path in self._blobs
+        docs = [doc for doc in map(doc_store.get, self._path_docs.get(path, ())) if doc]
+        if not docs:
+            if present:
+                self._drift[path] = "orphan_blob"
+            return False
+
+        repaired = False
+        reuploading = False
+        for doc in docs:
+            changes = {}
+            local_path = doc.localPath
+            if local_path and not os.path.exists(local_path):
+                changes["localPath"] = None
+                self._repairs["stale_local_path"] += 1
+                local_path = None
+
+            # Uploads in flight and audio still in the old trash prefix are not drift
+            if doc.storage_status not in (StorageStatus.PENDING, StorageStatus.UPLOADING) \
+                    and not has_legacy_audio(doc):
+                if present:
+                    if doc.storage_status == StorageStatus.FAILED or doc.firebasePath != path:
+                        changes.update(storage_status=StorageStatus.UPLOADED, storage_error=None,
+                                       firebasePath=path)
+                        self._repairs["storage_status"] += 1
+                elif doc.storage_status == StorageStatus.FAILED:
+                    self._drift[path] = "upload_failed"
+                elif (doc.storage_status == StorageStatus.UPLOADED or doc.firebasePath) \
+                        and not reuploading and path not in self._drift:
+                    local_path = local_path or os.path.join(UPLOAD_FOLDER, doc.audioFilename)
+                    if os.path.exists(local_path):
+                        # One upload restores the blob for every document sharing it
+                        start_storage_upload(doc.id, local_path, path)
+                        self._repairs["reupload"] += 1
+                        reuploading = True
+                    else:
+                        self._drift[path] = "missing_audio"
+
+            if changes:
+                doc_store.patch(doc.id, changes)
+                repaired = True
+        return repaired
+
+    def stats(self):
+        """Drift and repair counters for /api/metrics"""
+        return {
+            "runs": self._runs,
+            "lastRun": self._last_run,
+            "lastDurationMs": round(self._last_duration * 1000, 1),
+            "lastChecked": self._last_checked,
+            "blobs": len(self._blobs),
+            "sweeps": self._sweeps,
+            "docs": len(self._docs),
+            "drift": dict(Counter(self._drift.values())),
+            "repairs": dict(self._repairs),
+        }
+
+
+reconciler = Reconciler()
+
+
+def _reconcile_loop():
+    storage = get_storage()
+    while True:
+        # A worker that stops renewing the lease is replaced after two intervals
+        if hold_lease(get_state_backend(), "reconciler", RECONCILE_INTERVAL * 2) and storage.available():
+            try:
+                reconciler.run(storage)
+            except Exception as e:
+                logger.error(f"Reconciliation failed: {e}")
+        socketio.sleep(RECONCILE_INTERVAL)
+
+
+def start_reconciler():
+    """Run the reconciler in the background every RECONCILE_INTERVAL seconds (on the lease holder)"""
+    socketio.start_background_task(_reconcile_loop)
@@ -0,0 +1,71 @@
+# backend/services/resumable_upload.py
+"""
+Chunked, resumable uploads to Cloud Storage from a file on disk.
+
+Reading a whole recording into memory and sending it in one request costs
+the file size in RAM per concurrent upload, and a dropped connection
+restarts the upload from zero. upload_file_resumable() sets the blob's
+chunk_size, which makes the client library open a resumable session and
+stream the file in UPLOAD_CHUNK_SIZE pieces, so memory stays at one chunk.
+Every request is bounded by UPLOAD_REQUEST_TIMEOUT; a failed chunk is
+retried with exponential backoff, resuming from the offset the session
+persisted, for up to UPLOAD_RETRY_TIMEOUT seconds.
+
+Protocol: https://cloud.google.com/storage/docs/performing-resumable-uploads
+"""
+import logging
+from google.cloud.storage.retry import DEFAULT_RETRY
+
+# Get configuration
+try:
+    from config import UPLOAD_CHUNK_SIZE, UPLOAD_REQUEST_TIMEOUT, UPLOAD_RETRY_TIMEOUT
+except ImportError:
+    # Default values if config can't be imported
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+    UPLOAD_REQUEST_TIMEOUT = 60
+    UPLOAD_RETRY_TIMEOUT = 600
+
+logger = logging.getLogger(__name__)
+
+# Resumable upload chunks must be multiples of 256 KiB (except the last)
+CHUNK_ALIGNMENT = 256 * 1024
+
+
+class UploadError(Exception):
+    """Raised when an upload can't be completed"""
+
+
+def upload_file_resumable(blob, local_path, content_type=None, chunk_size=UPLOAD_CHUNK_SIZE,
+                          timeout=UPLOAD_REQUEST_TIMEOUT, retry_timeout=UPLOAD_RETRY_TIMEOUT):
+    """
+    Upload a local file to a blob in chunks, resuming after failures.
+
+    blob.metadata and blob.content_type set before the call are sent with
+    the session, so no separate metadata patch is needed. The blob's
+    properties are those of the finished upload afterwards.
+
+    Args:
+        blob: Target google.cloud.storage Blob
+        local_path: File to upload
+        content_type: Content type (default: blob.content_type)
+        chunk_size: Bytes per request, rounded up to a multiple of 256 KiB
+        timeout: Seconds each HTTP request may take
+        retry_timeout: Seconds failed requests are retried before giving up
+
+    Returns:
+        The uploaded blob
+
+    Raises:
+        UploadError: If the upload keeps failing
+    """
+    blob.chunk_size = max(CHUNK_ALIGNMENT, -(-chunk_size // CHUNK_ALIGNMENT) * CHUNK_ALIGNMENT)
+    try:
+        blob.upload_from_filename(
+            local_path,
+            content_type=content_type or blob.content_type,
+            timeout=timeout,
+            retry=DEFAULT_RETRY.with_timeout(retry_timeout),
+        )
+    except Exception as e:
+        raise UploadError(f"Upload of {local_path} failed: {e}") from e
+    return blob
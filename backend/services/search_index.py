@@ -0,0 +1,399 @@
+# backend/services/search_index.py
+"""
+Full-text search over transcript bodies.
+
+Transcripts are indexed in a SQLite FTS5 table as passages: one row per
+transcription chunk while a transcript is being produced, or one row per
+~PASSAGE_CHARS characters when a whole body is (re)indexed. Each document
+gets a number when it is first indexed and its passages use the rowids
+``num << POS_BITS | position``, so appending a chunk is a single insert and
+replacing a document's text is a rowid range delete, however large the
+index grows.
+
+A transcription starts its document with start_document() and then
+appends each chunk with the audio offsets (start, end) it covers, so a hit
+in a transcript that is still being produced already has a timestamp.
+
+Every passage also carries the owner uid as an indexed column. A query for
+one user intersects the owner's posting list with the query terms inside
+FTS5, which keeps lookups in the millisecond range at 100k+ documents.
+"""
+import html
+import logging
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Get configuration
+try:
+    from config import SEARCH_INDEX_DB
+except ImportError:
+    # Default value if config can't be imported
+    SEARCH_INDEX_DB = "search_index.db"
+
+logger = logging.getLogger(__name__)
+
+# Passages per document are addressed by the low POS_BITS bits of the rowid
+POS_BITS = 20
+# Bumped when the tables change; an older index is dropped and rebuilt by
+# backfill_search_index() from the content store
+SCHEMA_VERSION = 2
+# Target passage length when indexing a whole body
+PASSAGE_CHARS = 600
+DEFAULT_RESULTS = 20
+MAX_RESULTS = 100
+# Hits (snippets) reported per document
+MAX_HITS_PER_DOC = 3
+
+# Highlight markers used inside SQLite, replaced after HTML-escaping the snippet
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+_QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r"\w+")
+_MARKED = re.compile(f"{_MARK_OPEN}(.*?){_MARK_CLOSE}")
+
+
+class InvalidSearch(ValueError):
+    """Raised when a search query contains no searchable terms"""
+
+
+def build_match(query):
+    """
+    Turn user input into a safe FTS5 expression.
+
+    Words are matched as exact tokens (all of them must occur), "quoted
+    text" as a phrase and a trailing * as a prefix. FTS5 operators typed by
+    the user are treated as plain words.
+
+    Raises:
+        InvalidSearch: If the query has no words
+    """
+    terms = []
+    for phrase, word in _QUERY_PART.findall(query or ""):
+        if phrase:
+            words = _WORD.findall(phrase)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+            continue
+        tokens = [f'"{token}"' for token in _WORD.findall(word)]
+        if tokens and word.endswith("*"):
+            tokens[-1] += "*"
+        terms.extend(tokens)
+    if not terms:
+        raise InvalidSearch("Search query has no searchable words")
+    return " ".join(terms)
+
+
+def split_passages(content):
+    """Split a transcript body into passages of about PASSAGE_CHARS characters"""
+    passages = []
+    start = 0
+    length = len(content)
+    while start < length:
+        end = min(length, start + PASSAGE_CHARS)
+        if end < length:
+            # Break on whitespace so no word is cut in half
+            space = content.rfind(" ", start, end)
+            if space > start:
+                end = space
+        passage = content[start:end].strip()
+        if passage:
+            passages.append(passage)
+        start = end
+    return passages
+
+
+class SearchIndex:
+    """FTS5 passage index of transcript bodies, shared by every worker on the host"""
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._write() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS passages")
+                conn.execute("DROP TABLE IF EXISTS docs")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                " num INTEGER PRIMARY KEY, doc_id TEXT NOT NULL UNIQUE,"
+                " owner TEXT, next_pos INTEGER NOT NULL DEFAULT 0,"
+                " has_segments INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5("
+                " owner, text, start UNINDEXED, end UNINDEXED,"
+                " tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        logger.info(f"Using search index at {path}")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _doc_row(conn, doc_id, owner):
+        """Return (num, next_pos), registering the document on first use"""
+        row = conn.execute(
+            "SELECT num, next_pos FROM docs WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        if row:
+            return row
+        cursor = conn.execute("INSERT INTO docs (doc_id, owner) VALUES (?, ?)", (doc_id, owner))
+        return cursor.lastrowid, 0
+
+    @staticmethod
+    def _clear(conn, num):
+        conn.execute(
+            "DELETE FROM passages WHERE rowid BETWEEN ? AND ?",
+            (num << POS_BITS, ((num + 1) << POS_BITS) - 1),
+        )
+
+    def index_document(self, doc_id, owner, content, segments=None):
+        """
+        Replace the indexed text of a document.
+
+        Args:
+            doc_id: Document ID
+            owner: Owner uid
+            content: Full transcript body
+            segments: Optional timing segments ({"start", "text", ...}) of the body
+        """
+        passages = split_passages(content or "")[: 1 << POS_BITS]
+        with self._write() as conn:
+            num, _ = self._doc_row(conn, doc_id, owner)
+            self._clear(conn, num)
+            conn.executemany(
+                "INSERT INTO passages (rowid, owner, text) VALUES (?, ?, ?)",
+                [((num << POS_BITS) | pos, owner, text) for pos, text in enumerate(passages)],
+            )
+            conn.execute(
+                "UPDATE docs SET owner = ?, next_pos = ?, has_segments = ? WHERE num = ?",
+                (owner, len(passages), 1 if segments else 0, num),
+            )
+
+    def start_document(self, doc_id, owner, has_segments=False):
+        """
+        Clear a document's passages before its transcription appends new ones.
+
+        Args:
+            doc_id: Document ID
+            owner: Owner uid
+            has_segments: Whether the transcript will have timing segments
+        """
+        with self._write() as conn:
+            num, _ = self._doc_row(conn, doc_id, owner)
+            self._clear(conn, num)
+            conn.execute(
+                "UPDATE docs SET owner = ?, next_pos = 0, has_segments = ? WHERE num = ?",
+                (owner, 1 if has_segments else 0, num),
+            )
+
+    def append_text(self, doc_id, owner, text, start=None, end=None):
+        """
+        Index one more chunk of a document that is still being transcribed.
+
+        Args:
+            doc_id: Document ID
+            owner: Owner uid
+            text: Text of the new chunk
+            start: Optional audio offset (seconds) where the chunk starts
+            end: Optional audio offset (seconds) where the chunk ends
+        """
+        text = (text or "").strip()
+        if not text:
+            return
+        with self._write() as conn:
+            num, pos = self._doc_row(conn, doc_id, owner)
+            if pos >= 1 << POS_BITS:
+                logger.warning(f"Search index passage limit reached for doc {doc_id}")
+                return
+            conn.execute(
+                "INSERT INTO passages (rowid, owner, text, start, end) VALUES (?, ?, ?, ?, ?)",
+                ((num << POS_BITS) | pos, owner, text, start, end),
+            )
+            conn.execute("UPDATE docs SET next_pos = ? WHERE num = ?", (pos + 1, num))
+
+    def remove_document(self, doc_id):
+        """Drop a document from the index"""
+        with self._write() as conn:
+            row = conn.execute("SELECT num FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row:
+                self._clear(conn, row[0])
+                conn.execute("DELETE FROM docs WHERE num = ?", row)
+
+    def indexed_ids(self):
+        """Return the set of doc ids present in the index"""
+        return {row[0] for row in self._conn().execute("SELECT doc_id FROM docs")}
+
+    def search(self, query, owner=None, limit=DEFAULT_RESULTS):
+        """
+        Rank documents matching a query.
+
+        Args:
+            query: User query (see build_match)
+            owner: Only search this owner's documents; None searches all (admins)
+            limit: Maximum number of documents to return
+
+        Returns:
+            list: [{"doc_id", "score", "has_segments",
+                    "hits": [{"snippet", "terms", "start", "end"}, ...]}, ...] best first.
+                  Snippets are HTML-escaped with matches wrapped in <mark>.
+
+        Raises:
+            InvalidSearch: If the query has no searchable words
+        """
+        limit = max(1, min(int(limit), MAX_RESULTS))
+        match = f"text : ({build_match(query)})"
+        if owner is not None:
+            match = f'owner : "{owner.replace(chr(34), chr(34) * 2)}" AND {match}'
+        sql = (
+            "SELECT docs.doc_id, docs.has_segments, passages.start, passages.end,"
+            f" snippet(passages, 1, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', 24),"
+            " bm25(passages, 0.0, 1.0) AS score"
+            " FROM passages JOIN docs ON docs.num = (passages.rowid >> ?)"
+            " WHERE passages MATCH ?"
+        )
+        params = [POS_BITS, match]
+        if owner is not None:
+            # The MATCH on the tokenized owner narrows; this makes it exact
+            sql += " AND docs.owner = ?"
+            params.append(owner)
+        # Over-fetch passages so documents with several hits still fill the page
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit * MAX_HITS_PER_DOC * 2)
+
+        results = {}
+        for doc_id, has_segments, start, end, snippet, score in self._conn().execute(sql, params):
+            result = results.get(doc_id)
+            if result is None:
+                if len(results) == limit:
+                    continue
+                result = results[doc_id] = {
+                    "doc_id": doc_id,
+                    # bm25 is lower-is-better; report higher-is-better
+                    "score": round(-score, 6),
+                    "has_segments": bool(has_segments),
+                    "hits": [],
+                }
+            if len(result["hits"]) < MAX_HITS_PER_DOC:
+                result["hits"].append({
+                    "snippet": _render_snippet(snippet),
+                    "terms": sorted({t.casefold() for t in _MARKED.findall(snippet)}),
+                    "start": start,
+                    "end": end,
+                })
+        return list(results.values())
+
+
+def _render_snippet(snippet):
+    escaped = html.escape(snippet)
+    return escaped.replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+
+def hit_timestamps(terms, segments, limit=MAX_HITS_PER_DOC):
+    """
+    Return the start times of the segments that contain any of the terms.
+
+    Args:
+        terms: Matched words (casefolded)
+        segments: Timing segments of a transcript ({"start", "text", ...})
+        limit: Maximum number of timestamps
+
+    Returns:
+        list: Start offsets in seconds
+    """
+    wanted = set(terms)
+    found = []
+    for segment in segments or []:
+        words = {word.casefold() for word in _WORD.findall(segment.get("text", ""))}
+        if wanted & words and segment.get("start") is not None:
+            found.append(segment["start"])
+            if len(found) == limit:
+                break
+    return found
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """Return the process-wide SearchIndex, opening it on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SearchIndex(SEARCH_INDEX_DB)
+    return _index
+
+
+def index_document(doc_id, owner, content, segments=None):
+    """Replace the indexed text of a document, logging instead of raising"""
+    try:
+        get_search_index().index_document(doc_id, owner, content, segments)
+    except Exception as e:
+        logger.error(f"Error indexing doc {doc_id} for search: {e}")
+
+
+def start_document(doc_id, owner, has_segments=False):
+    """Clear a document's passages before a transcription, logging instead of raising"""
+    try:
+        get_search_index().start_document(doc_id, owner, has_segments)
+    except Exception as e:
+        logger.error(f"Error starting search index of doc {doc_id}: {e}")
+
+
+def append_text(doc_id, owner, text, start=None, end=None):
+    """Index a newly transcribed chunk, logging instead of raising"""
+    try:
+        get_search_index().append_text(doc_id, owner, text, start, end)
+    except Exception as e:
+        logger.error(f"Error indexing chunk of doc {doc_id} for search: {e}")
+
+
+def remove_document(doc_id):
+    """Drop a document from the search index, logging instead of raising"""
+    try:
+        get_search_index().remove_document(doc_id)
+    except Exception as e:
+        logger.error(f"Error removing doc {doc_id} from search index: {e}")
+
+
+def backfill_search_index():
+    """Index every stored document the search index does not know yet"""
+    # Imported here so that importing the index does not pull in storage
+    from services.storage import doc_store
+    from services.content_store import load_content, ContentCorruptError
+
+    try:
+        indexed = get_search_index().indexed_ids()
+        missing = [doc for doc_id, doc in doc_store.items() if doc_id not in indexed]
+    except Exception as e:
+        logger.error(f"Error preparing search index backfill: {e}")
+        return
+    for doc in missing:
+        try:
+            body = load_content(doc.id)
+        except ContentCorruptError:
+            continue
+        index_document(doc.id, doc.owner, body["content"], body["segments"])
+    if missing:
+        logger.info(f"Indexed {len(missing)} documents for search")
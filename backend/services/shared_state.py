@@ -0,0 +1,517 @@
+# backend/services/shared_state.py
+"""
+Shared state backends for running more than one worker or node.
+
+By default ("local" mode) all state lives in the memory of a single process
+and doc_store is persisted to doc_store.json. In a shared mode the doc store,
+user settings and job registry are kept in a StateBackend that every worker
+talks to:
+
+- "sqlite": a file-locked SQLite database, for several workers on one host
+- "memory": an in-process InMemoryStateBackend, the local stand-in for a
+  network store (useful for tests and development)
+- "package.module:ClassName": any other StateBackend implementation, e.g. a
+  client for a network key-value store shared by several nodes
+
+Every write gets a per-key version (for compare-and-set) and a global
+sequence number, so workers can cheaply pull the changes made by others.
+
+Only metadata is shared state. Transcript bodies and chunk logs
+(content_store), version history, the search index and the audio cache
+are files under BASE_DIR, so every worker has to run on one host. The
+first worker pins the backend to its host (claim_host) and workers on
+another host refuse to start, unless SHARED_STATE_MULTI_HOST declares
+that those directories are on a filesystem all hosts share.
+"""
+import importlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Get configuration
+try:
+    from config import STATE_BACKEND, SHARED_STATE_DB, SHARED_STATE_MULTI_HOST
+except ImportError:
+    # Default values if config can't be imported
+    STATE_BACKEND = "local"
+    SHARED_STATE_DB = "shared_state.db"
+    SHARED_STATE_MULTI_HOST = False
+
+logger = logging.getLogger(__name__)
+
+# Namespace of the backend's own bookkeeping (the pinned host, leases)
+META_NAMESPACE = "__meta__"
+
+# Identifies this process among the workers sharing the backend
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Attempts at a compare-and-set read-modify-write before giving up
+MAX_UPDATE_ATTEMPTS = 5
+
+
+class StateConflict(Exception):
+    """Raised when a compare-and-set write finds a different version"""
+
+    def __init__(self, namespace, key, expected, current):
+        super().__init__(
+            f"State conflict on {namespace}/{key}: expected version {expected}, found {current}"
+        )
+        self.current = current
+
+
+class StateBackend:
+    """
+    Interface of a shared key-value store with versions and a change feed.
+
+    Values are JSON-serializable objects grouped into namespaces ("docs",
+    "settings", "jobs", ...). Implementations must be safe to use from
+    several threads and, for shared deployments, several processes.
+    """
+
+    def get(self, namespace, key):
+        """Return (value, version); (None, version) if missing or deleted"""
+        raise NotImplementedError
+
+    def put(self, namespace, key, value, expected_version=None):
+        """Store a value, optionally only if the current version matches. Returns the new version"""
+        raise NotImplementedError
+
+    def put_many(self, namespace, entries):
+        """
+        Store several values at once: [(key, value, expected_version), ...].
+
+        Implementations should apply all of them or none (raising
+        StateConflict if any version does not match). This default writes
+        them one by one, for backends without multi-key transactions.
+        Returns the new versions.
+        """
+        return [self.put(namespace, key, value, expected) for key, value, expected in entries]
+
+    def delete(self, namespace, key, expected_version=None):
+        """Delete a value (recorded as a tombstone so other workers see it), optionally only at a version"""
+        raise NotImplementedError
+
+    def items(self, namespace):
+        """Return {key: value} for every live entry of a namespace"""
+        raise NotImplementedError
+
+    def changes_since(self, seq):
+        """Return (last seq, [(namespace, key, value or None, version), ...]) for writes after seq"""
+        raise NotImplementedError
+
+    def incr(self, name):
+        """Atomically increment a named counter and return the new value"""
+        raise NotImplementedError
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    StateBackend on a SQLite database in WAL mode.
+
+    Writes run in BEGIN IMMEDIATE transactions, which take SQLite's file lock,
+    so any number of worker processes on the host can share the database.
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._write() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT,"
+                " version INTEGER NOT NULL, seq INTEGER NOT NULL,"
+                " PRIMARY KEY (ns, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS state_seq ON state (seq)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+        logger.info(f"Using SQLite shared state at {path}")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _next(conn, name):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+        return conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+    def _write_row(self, namespace, key, encoded, expected_version, conn=None):
+        if conn is None:
+            with self._write() as conn:
+                return self._write_row(namespace, key, encoded, expected_version, conn)
+        row = conn.execute(
+            "SELECT version FROM state WHERE ns = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        current = row[0] if row else 0
+        if expected_version is not None and current != expected_version:
+            raise StateConflict(namespace, key, expected_version, current)
+        seq = self._next(conn, "__seq__")
+        conn.execute(
+            "INSERT OR REPLACE INTO state (ns, key, value, version, seq) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, encoded, current + 1, seq),
+        )
+        return current + 1
+
+    def get(self, namespace, key):
+        row = self._conn().execute(
+            "SELECT value, version FROM state WHERE ns = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if not row:
+            return None, 0
+        return (json.loads(row[0]) if row[0] is not None else None), row[1]
+
+    def put(self, namespace, key, value, expected_version=None):
+        return self._write_row(namespace, key, json.dumps(value), expected_version)
+
+    def put_many(self, namespace, entries):
+        # One transaction: a conflict on any key rolls back every write
+        with self._write() as conn:
+            return [
+                self._write_row(namespace, key, json.dumps(value), expected, conn)
+                for key, value, expected in entries
+            ]
+
+    def delete(self, namespace, key, expected_version=None):
+        self._write_row(namespace, key, None, expected_version)
+
+    def items(self, namespace):
+        rows = self._conn().execute(
+            "SELECT key, value FROM state WHERE ns = ? AND value IS NOT NULL", (namespace,)
+        )
+        return {key: json.loads(value) for key, value in rows}
+
+    def changes_since(self, seq):
+        rows = self._conn().execute(
+            "SELECT seq, ns, key, value, version FROM state WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+        if not rows:
+            return seq, []
+        changes = [
+            (ns, key, json.loads(value) if value is not None else None, version)
+            for _, ns, key, value, version in rows
+        ]
+        return rows[-1][0], changes
+
+    def incr(self, name):
+        with self._write() as conn:
+            return self._next(conn, name)
+
+
+class InMemoryStateBackend(StateBackend):
+    """
+    Thread-safe in-process StateBackend.
+
+    Stand-in for a network store with the same semantics (versions,
+    tombstones, change feed), for tests and single-process development.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._counters = {}
+        self._seq = 0
+
+    def _check_version(self, namespace, key, expected_version):
+        # Called with self._lock held
+        _, current, _ = self._data.get((namespace, key), (None, 0, 0))
+        if expected_version is not None and current != expected_version:
+            raise StateConflict(namespace, key, expected_version, current)
+        return current
+
+    def _store(self, namespace, key, value, current):
+        # Called with self._lock held
+        self._seq += 1
+        # Store an encoded copy so callers can't mutate shared state in place
+        encoded = json.dumps(value) if value is not None else None
+        self._data[(namespace, key)] = (encoded, current + 1, self._seq)
+        return current + 1
+
+    def _write_row(self, namespace, key, value, expected_version):
+        with self._lock:
+            current = self._check_version(namespace, key, expected_version)
+            return self._store(namespace, key, value, current)
+
+    def get(self, namespace, key):
+        encoded, version, _ = self._data.get((namespace, key), (None, 0, 0))
+        return (json.loads(encoded) if encoded is not None else None), version
+
+    def put(self, namespace, key, value, expected_version=None):
+        return self._write_row(namespace, key, value, expected_version)
+
+    def put_many(self, namespace, entries):
+        with self._lock:
+            # Check every version before writing anything
+            currents = [self._check_version(namespace, key, expected) for key, _, expected in entries]
+            return [
+                self._store(namespace, key, value, current)
+                for (key, value, _), current in zip(entries, currents)
+            ]
+
+    def delete(self, namespace, key, expected_version=None):
+        self._write_row(namespace, key, None, expected_version)
+
+    def items(self, namespace):
+        with self._lock:
+            entries = list(self._data.items())
+        return {
+            key: json.loads(encoded)
+            for (ns, key), (encoded, _, _) in entries
+            if ns == namespace and encoded is not None
+        }
+
+    def changes_since(self, seq):
+        with self._lock:
+            entries = sorted(
+                (row_seq, ns, key, encoded, version)
+                for (ns, key), (encoded, version, row_seq) in self._data.items()
+                if row_seq > seq
+            )
+        if not entries:
+            return seq, []
+        changes = [
+            (ns, key, json.loads(encoded) if encoded is not None else None, version)
+            for _, ns, key, encoded, version in entries
+        ]
+        return entries[-1][0], changes
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            return self._counters[name]
+
+
+class SharedMapping:
+    """dict-like view of one StateBackend namespace (values are copies)"""
+
+    def __init__(self, backend, namespace):
+        self._backend = backend
+        self._namespace = namespace
+
+    def get(self, key, default=None):
+        value, _ = self._backend.get(self._namespace, key)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value, _ = self._backend.get(self._namespace, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._backend.put(self._namespace, key, value)
+
+    def __delitem__(self, key):
+        self._backend.delete(self._namespace, key)
+
+    def __contains__(self, key):
+        return self._backend.get(self._namespace, key)[0] is not None
+
+    def __len__(self):
+        return len(self._backend.items(self._namespace))
+
+    def __iter__(self):
+        return iter(self._backend.items(self._namespace))
+
+    def keys(self):
+        return self._backend.items(self._namespace).keys()
+
+    def values(self):
+        return self._backend.items(self._namespace).values()
+
+    def items(self):
+        return self._backend.items(self._namespace).items()
+
+    def update_entry(self, key, fn, attempts=MAX_UPDATE_ATTEMPTS):
+        """Compare-and-set read-modify-write of one value (see update_entry)"""
+        for _ in range(attempts):
+            current, version = self._backend.get(self._namespace, key)
+            value = fn(current)
+            try:
+                if value is None:
+                    if current is not None:
+                        self._backend.delete(self._namespace, key, expected_version=version)
+                else:
+                    self._backend.put(self._namespace, key, value, expected_version=version)
+                return value
+            except StateConflict:
+                # Another worker wrote in between: re-read and re-apply
+                continue
+        raise StateConflict(self._namespace, key, version, None)
+
+    def delete_if(self, key, version):
+        """Delete a value only if it is still at version; returns whether it was deleted"""
+        try:
+            self._backend.delete(self._namespace, key, expected_version=version)
+            return True
+        except StateConflict:
+            return False
+
+    def get_versioned(self, key):
+        """Return (value, version); value is None if missing"""
+        return self._backend.get(self._namespace, key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_state_backend():
+    """
+    Return the configured shared StateBackend, or None in local mode.
+    The backend is created once per process on first use.
+    """
+    global _backend
+    if STATE_BACKEND == "local":
+        return None
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if STATE_BACKEND == "sqlite":
+                    _backend = SQLiteStateBackend(SHARED_STATE_DB)
+                elif STATE_BACKEND == "memory":
+                    _backend = InMemoryStateBackend()
+                else:
+                    # Pluggable network store: "package.module:ClassName"
+                    module_name, _, class_name = STATE_BACKEND.partition(":")
+                    backend_cls = getattr(importlib.import_module(module_name), class_name)
+                    _backend = backend_cls()
+                claim_host(_backend)
+                logger.info(f"Shared state mode: {STATE_BACKEND}")
+    return _backend
+
+
+def claim_host(backend, host=None, multi_host=None):
+    """
+    Pin a shared backend to the host of its first worker.
+
+    Raises:
+        RuntimeError: If the backend is pinned to another host and
+                      SHARED_STATE_MULTI_HOST is not set
+    """
+    host = host or socket.gethostname()
+    multi_host = SHARED_STATE_MULTI_HOST if multi_host is None else multi_host
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        record, version = backend.get(META_NAMESPACE, "host")
+        if record is not None:
+            if record.get("host") == host or multi_host:
+                return
+            raise RuntimeError(
+                f"Shared state is in use by host {record.get('host')}. Transcripts, version "
+                f"history and the search index are stored on local disk, so all workers must "
+                f"run on one host; set YAPPER_SHARED_STATE_MULTI_HOST=true only if "
+                f"{host} sees the same data directories through a shared filesystem."
+            )
+        try:
+            backend.put(
+                META_NAMESPACE, "host",
+                {"host": host, "since": datetime.now(timezone.utc).isoformat()},
+                expected_version=version,
+            )
+            return
+        except StateConflict:
+            continue
+    raise RuntimeError("Could not pin shared state to this host")
+
+
+def hold_lease(backend, name, ttl, holder=None):
+    """
+    Take or renew a named lease, so that one worker at a time runs a task.
+
+    The lease is held for ttl seconds after each successful call; the holder
+    renews it by calling again before then. When it stops renewing (its
+    worker stopped), another worker takes the lease over.
+
+    Args:
+        backend: Shared StateBackend, or None in local mode (the only
+                 process always holds the lease)
+        name: Lease name
+        ttl: Seconds the lease is held
+        holder: Worker taking the lease (default: WORKER_ID)
+
+    Returns:
+        bool: Whether the caller holds the lease
+    """
+    if backend is None:
+        return True
+    holder = holder or WORKER_ID
+    key = f"lease:{name}"
+    record, version = backend.get(META_NAMESPACE, key)
+    now = time.time()
+    if record is not None and record.get("holder") != holder and record.get("expiresAt", 0) > now:
+        return False
+    try:
+        backend.put(META_NAMESPACE, key, {"holder": holder, "expiresAt": now + ttl},
+                    expected_version=version)
+    except StateConflict:
+        # Another worker took it in between
+        return False
+    return True
+
+
+def shared_mapping(namespace):
+    """Return a SharedMapping for a namespace in shared mode, or a plain dict in local mode"""
+    backend = get_state_backend()
+    if backend is None:
+        return {}
+    return SharedMapping(backend, namespace)
+
+
+_local_update_lock = threading.Lock()
+
+
+def update_entry(mapping, key, fn, attempts=MAX_UPDATE_ATTEMPTS):
+    """
+    Read-modify-write one value of a shared_mapping() without losing updates.
+
+    Args:
+        mapping: A shared_mapping() (SharedMapping or plain dict)
+        key: Key of the value
+        fn: Receives the current value (None if missing) and returns the
+            new value, or None to delete it. Must not change its argument
+            in place; in shared mode it may be called more than once.
+        attempts: Compare-and-set attempts in shared mode
+
+    Returns:
+        The new value
+
+    Raises:
+        StateConflict: If other workers kept writing the key
+    """
+    if isinstance(mapping, SharedMapping):
+        return mapping.update_entry(key, fn, attempts)
+    with _local_update_lock:
+        value = fn(mapping.get(key))
+        if value is None:
+            mapping.pop(key, None)
+        else:
+            mapping[key] = value
+        return value
@@ -0,0 +1,142 @@
+# backend/services/signed_url_cache.py
+"""
+Reuse of signed Storage URLs.
+
+Every audio player load used to check that the blob exists and sign a
+fresh v4 URL. A signed URL stays valid until it expires, so get_url()
+hands out the cached one for the same (path, method) while more than
+SIGNED_URL_SAFETY_MARGIN seconds of validity remain; a player that starts
+with it has at least that long to fetch the audio. A cached URL is never
+returned to a caller that asked for a shorter lifetime than it has left.
+
+Concurrent misses for the same key and lifetime are coalesced: one caller
+signs, the others wait for its result (single-flight). Callers asking for
+another lifetime sign their own URL, so nobody gets a URL that lives
+longer than they asked for.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# Get configuration
+try:
+    from config import SIGNED_URL_SAFETY_MARGIN, SIGNED_URL_CACHE_MAX_ENTRIES
+except ImportError:
+    # Default values if config can't be imported
+    SIGNED_URL_SAFETY_MARGIN = 300
+    SIGNED_URL_CACHE_MAX_ENTRIES = 10000
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """A signing call other callers can wait for"""
+
+    __slots__ = ("done", "url", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.url = None
+        self.error = None
+
+
+class SignedUrlCache:
+    """LRU of (path, method) -> (expires_at, url) with single-flight signing"""
+
+    def __init__(self, margin=SIGNED_URL_SAFETY_MARGIN, max_entries=SIGNED_URL_CACHE_MAX_ENTRIES):
+        self.margin = margin
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    def _cached(self, key, expiration, now):
+        # Called with self._lock held
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        remaining = entry[0] - now
+        if self.margin < remaining <= expiration:
+            self._entries.move_to_end(key)
+            return entry[1]
+        return None
+
+    def get_url(self, path, sign, expiration, method="GET"):
+        """
+        Return a signed URL for a path, signing a new one only when needed.
+
+        Args:
+            path: Blob name
+            sign: Callable returning a fresh URL valid for `expiration` seconds,
+                  or None if the blob does not exist
+            expiration: Lifetime (seconds) the caller asked for
+            method: HTTP method the URL is signed for
+
+        Returns:
+            str: The URL, or None when sign() returned None
+        """
+        key = (path, method)
+        flight_key = (path, method, expiration)
+        with self._lock:
+            url = self._cached(key, expiration, time.time())
+            if url is not None:
+                self._hits += 1
+                return url
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[flight_key] = _Flight()
+                self._misses += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.url
+
+        signed_at = time.time()
+        try:
+            flight.url = sign()
+            if flight.url is not None:
+                self.put(path, flight.url, signed_at + expiration, method)
+            return flight.url
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(flight_key, None)
+            flight.done.set()
+
+    def put(self, path, url, expires_at, method="GET"):
+        """Remember a URL signed elsewhere (e.g. at upload time)"""
+        with self._lock:
+            self._entries[(path, method)] = (expires_at, url)
+            self._entries.move_to_end((path, method))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path):
+        """Forget every URL of a path (after it was deleted or moved)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                del self._entries[key]
+
+    def stats(self):
+        """Hit/miss counters; hits and coalesced calls skipped Storage entirely"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+            }
+
+
+signed_url_cache = SignedUrlCache()
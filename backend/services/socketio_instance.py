@@ -1,6 +1,11 @@
 # backend/services/socketio_instance.py
 from flask_socketio import SocketIO, join_room, emit, disconnect
-from services.storage import save_doc_store, doc_store
+from services.storage import doc_store
+from services.doc_store import VersionConflict
+from services.content_store import load_content, save_content
+from services.search_index import index_document
+from services.version_history import record_version
+from services.transcript_builder import is_transcribing
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,14 +35,16 @@ def handle_join_doc_evt(data):
     logger.info(f"Client joined room: {doc_id}")
 
     doc = doc_store.get(doc_id)
-    if doc and not doc.get("deleted"):
+    if doc and not doc.deleted:
         # Include any timing data stored in the document
+        body = load_content(doc_id)
         emit(
             "doc_content_update",
             {
                 "doc_id": doc_id,
-                "content": doc["content"],
-                "segments": doc.get("segments", []),
+                "content": body["content"],
+                "segments": body["segments"],
+                "version": doc.version,
             },
             room=doc_id,
         )
@@ -45,6 +52,30 @@ def handle_join_doc_evt(data):
         logger.warning(f"Doc {doc_id} not found or deleted")
 
 
+def parse_version(value):
+    """
+    Version an edit was based on, from a socket payload.
+
+    Returns:
+        int: The version, or None if the client sent none
+
+    Raises:
+        ValueError: If the value is not a non-negative integer
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid version: {value!r}")
+    if isinstance(value, str):
+        value = value.strip()
+        if not value.isdigit():
+            raise ValueError(f"Invalid version: {value!r}")
+        return int(value)
+    if isinstance(value, int) and value >= 0:
+        return value
+    raise ValueError(f"Invalid version: {value!r}")
+
+
 @socketio.on("edit_doc")
 def handle_edit_doc_evt(data):
     doc_id = data.get("doc_id")
@@ -55,9 +86,35 @@ def handle_edit_doc_evt(data):
         return
 
     doc = doc_store.get(doc_id)
-    if doc and not doc.get("deleted"):
-        doc["content"] = new_content
-        save_doc_store()
+    if doc and not doc.deleted:
+        if is_transcribing(doc_id):
+            # The transcription's final text would replace the edit
+            logger.warning(f"Rejected edit for doc {doc_id}: transcription in progress")
+            emit("edit_conflict", {"doc_id": doc_id, "version": doc.version, "transcribing": True})
+            return
+        try:
+            expected_version = parse_version(data.get("version"))
+        except ValueError as e:
+            # Treated like a stale edit: the client reloads the current version
+            logger.warning(f"Rejected edit for doc {doc_id}: {e}")
+            emit("edit_conflict", {"doc_id": doc_id, "version": doc.version})
+            return
+
+        # Bump the version first so a stale editor (older "version") is rejected
+        try:
+            doc = doc_store.patch(doc_id, {}, expected_version=expected_version)
+        except VersionConflict as e:
+            logger.warning(f"Rejected stale edit for doc {doc_id}: {e}")
+            emit("edit_conflict", {"doc_id": doc_id, "version": e.current})
+            return
+
+        # Only the body changes, so the metadata store is not rewritten
+        old = load_content(doc_id)
+        body = save_content(doc_id, content=new_content, segments=old["segments"])
+        index_document(doc_id, doc.owner, new_content, body["segments"])
+        # Socket events carry no verified uid, so the author is left unset
+        record_version(doc_id, doc.version, new_content,
+                       previous=(doc.version - 1, old["content"]))
 
         # Broadcast to all clients except sender
         emit(
@@ -65,7 +122,8 @@ def handle_edit_doc_evt(data):
             {
                 "doc_id": doc_id,
                 "content": new_content,
-                "segments": doc.get("segments", []),
+                "segments": body["segments"],
+                "version": doc.version,
             },
             room=doc_id,
             include_self=False,
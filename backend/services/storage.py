@@ -3,7 +3,16 @@ import os
 import json
 import logging
 import platform
+import threading
+import time
+from datetime import datetime, timezone
 from pathlib import Path
+from services.content_store import CONTENT_KEYS, migrate_inline_content
+from services.doc_record import Document
+from services.doc_index import DocIndex
+from services.doc_store import DocStore, now_iso
+from services.doc_snapshot import SnapshotReader, write_snapshot
+from services.shared_state import get_state_backend
 
 # Get configuration
 try:
@@ -12,6 +21,18 @@ except ImportError:
     # Default value if config can't be imported
     DOC_STORE_FILE = "doc_store.json"
 
+try:
+    from config import SHARED_STATE_SYNC_INTERVAL
+except ImportError:
+    SHARED_STATE_SYNC_INTERVAL = 0.5
+
+try:
+    from config import DOC_STORE_FORMAT, DOC_STORE_SNAPSHOT, DOC_STORE_MMAP
+except ImportError:
+    DOC_STORE_FORMAT = "binary"
+    DOC_STORE_SNAPSHOT = "doc_store.bin"
+    DOC_STORE_MMAP = True
+
 logger = logging.getLogger(__name__)
 
 # Detect platform
@@ -23,9 +44,52 @@ IS_WSL = (
 )
 
 # Initialize storage
-doc_store = {}
+# Shared backend for multi-worker deployments (None in the default local mode)
+_state_backend = get_state_backend()
+
+# Secondary indexes used by the paginated listing API, kept current by doc_store
+doc_index = DocIndex()
+doc_store = DocStore(
+    index=doc_index, backend=_state_backend, sync_interval=SHARED_STATE_SYNC_INTERVAL
+)
 doc_counter = 0
 
+# Serializes writers of the store file; readers and doc writers never take it
+_flush_lock = threading.Lock()
+_counter_lock = threading.Lock()
+# The store is loaded once, by create_app, not on import
+_load_lock = threading.Lock()
+_loaded = False
+
+
+def next_doc_number():
+    """Atomically allocate the next sequential document number (DocN names)"""
+    global doc_counter
+    if _state_backend is not None:
+        base, _ = _state_backend.get("meta", "doc_counter_base")
+        return (base or 0) + _state_backend.incr("doc_counter")
+    with _counter_lock:
+        doc_counter += 1
+        return doc_counter
+
+
+def _backfill_timestamps(docs):
+    """Give documents created before timestamps were recorded a createdAt/updatedAt"""
+    filled = 0
+    for doc in docs.values():
+        if doc.get("createdAt"):
+            continue
+        created = None
+        local_path = doc.get("localPath")
+        if local_path and os.path.exists(local_path):
+            created = datetime.fromtimestamp(
+                os.path.getmtime(local_path), timezone.utc
+            ).isoformat(timespec="milliseconds")
+        doc["createdAt"] = created or now_iso()
+        doc.setdefault("updatedAt", doc["createdAt"])
+        filled += 1
+    return filled
+
 
 def get_absolute_path(file_path):
     """
@@ -67,54 +131,187 @@ def ensure_directory_exists(file_path):
     return file_path
 
 
-def load_doc_store():
-    """Load document store from file"""
-    global doc_store, doc_counter
+def load_doc_store(force=False):
+    """
+    Load the document store, once per process.
+
+    Reads the binary snapshot when there is one, otherwise doc_store.json
+    (migrating it to the snapshot format), or the shared backend in shared mode.
+
+    Args:
+        force: Reload even if the store was already loaded
+
+    Returns:
+        float: Seconds spent loading, or None if it was already loaded
+    """
+    global doc_counter, _loaded
+
+    with _load_lock:
+        if _loaded and not force:
+            return None
+        started = time.perf_counter()
+
+        if DOC_STORE_FORMAT == "binary" and _state_backend is None:
+            snapshot = _read_snapshot(get_absolute_path(DOC_STORE_SNAPSHOT))
+            if snapshot is not None:
+                docs, doc_counter = snapshot
+                # Bodies a failed migration left inline are moved out now
+                inline = {
+                    doc_id: doc.to_dict() for doc_id, doc in docs.items()
+                    if doc.extra and any(key in doc.extra for key in CONTENT_KEYS)
+                }
+                migrated, failed = migrate_inline_content(inline)
+                for doc_id, record in inline.items():
+                    if not any(key in record for key in CONTENT_KEYS):
+                        docs[doc_id] = Document.from_dict(record)
+                doc_store.replace_all(docs)
+                if migrated and not failed:
+                    save_doc_store()
+                _loaded = True
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    f"Loaded document store with {len(docs)} documents from snapshot in {elapsed * 1000:.1f} ms"
+                )
+                return elapsed
+
+        safe_path = get_absolute_path(DOC_STORE_FILE)
+        docs, counter = _read_json_store(safe_path)
+
+        # Older stores kept transcript bodies inline and had no timestamps
+        migrated, failed = migrate_inline_content(docs)
+        backfilled = _backfill_timestamps(docs)
+        if failed:
+            # Writing the store now would drop the bodies that are still inline
+            logger.error(f"Inline content of {failed} documents could not be moved; "
+                         f"{safe_path} is left as it is until the next start")
+
+        if _state_backend is not None:
+            _load_shared_doc_store(docs, counter)
+        else:
+            doc_counter = counter
+            doc_store.replace_all(docs)
+            if docs:
+                logger.info(
+                    f"Loaded document store with {len(doc_store)} documents from {safe_path}"
+                )
+            # Write the snapshot right away so the next start skips the JSON parse
+            if not failed and (migrated or backfilled or (docs and DOC_STORE_FORMAT == "binary")):
+                save_doc_store()
+
+        _loaded = True
+        return time.perf_counter() - started
 
-    # Get absolute path and ensure directory exists
-    safe_path = get_absolute_path(DOC_STORE_FILE)
+
+def _read_snapshot(path):
+    """
+    Return (docs, counter) from the binary snapshot, or None if there is none.
+
+    Raises:
+        RuntimeError: If the snapshot exists but can't be read. doc_store.json
+                      is older than the snapshot, so loading it instead would
+                      silently drop every document written since.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with SnapshotReader(path, use_mmap=DOC_STORE_MMAP) as reader:
+            return reader.documents(), reader.counter
+    except Exception as e:
+        logger.error(f"Error loading document store snapshot from {path}: {e}")
+        _backup_corrupted(path)
+        raise RuntimeError(
+            f"Document store snapshot {path} can't be read ({e}). Restore it from a backup; "
+            f"to start from {DOC_STORE_FILE} instead, losing the changes made since it was "
+            f"written, move the snapshot away."
+        ) from e
+
+
+def _read_json_store(safe_path):
+    """Return (docs, counter) from doc_store.json"""
+    docs, counter = {}, 0
 
     if os.path.exists(safe_path):
         try:
             with open(safe_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                doc_store.update(data.get("docs", {}))
-                doc_counter = data.get("counter", 0)
-            logger.info(
-                f"Loaded document store with {len(doc_store)} documents from {safe_path}"
-            )
+            docs = data.get("docs", {})
+            counter = data.get("counter", 0)
         except Exception as e:
             logger.error(f"Error loading document store from {safe_path}: {e}")
-            # Create backup if exists but corrupted
-            if os.path.exists(safe_path):
-                backup_file = f"{safe_path}.bak"
-                try:
-                    import shutil
-
-                    shutil.copy2(safe_path, backup_file)
-                    logger.info(
-                        f"Created backup of corrupted document store at {backup_file}"
-                    )
-                except Exception as backup_err:
-                    logger.error(f"Failed to create backup: {backup_err}")
-    else:
+            _backup_corrupted(safe_path)
+    elif _state_backend is None:
         logger.info(
             f"Document store file not found at {safe_path}, starting with empty store"
         )
+    return docs, counter
+
+
+def _backup_corrupted(path):
+    """Keep a copy of a store file that failed to load"""
+    # Create backup if exists but corrupted
+    if os.path.exists(path):
+        backup_file = f"{path}.bak"
+        try:
+            import shutil
+
+            shutil.copy2(path, backup_file)
+            logger.info(
+                f"Created backup of corrupted document store at {backup_file}"
+            )
+        except Exception as backup_err:
+            logger.error(f"Failed to create backup: {backup_err}")
+
+
+def _load_shared_doc_store(file_docs, file_counter):
+    """Load doc_store from the shared backend, seeding it from doc_store.json the first time"""
+    if file_docs and not _state_backend.items("docs"):
+        imported = doc_store.import_docs(file_docs)
+        _state_backend.put("meta", "doc_counter_base", file_counter)
+        logger.info(f"Imported {imported} documents from {DOC_STORE_FILE} into shared state")
+
+    doc_store.load_shared()
+    logger.info(f"Loaded document store with {len(doc_store)} documents from shared state")
 
 
 def save_doc_store():
-    """Save document store to file"""
-    global doc_store, doc_counter
+    """
+    Save document store to file.
 
-    # Get absolute path
-    safe_path = get_absolute_path(DOC_STORE_FILE)
+    Serializes a copy-on-write snapshot, so concurrent readers and writers
+    are never blocked by the flush; only other flushes wait on it.
+    In shared mode every write is already durable in the backend.
+    """
+    if _state_backend is not None:
+        return
 
-    # Ensure directory exists
-    safe_path = ensure_directory_exists(safe_path)
+    with _flush_lock:
+        # Take the snapshot inside the lock so the last flush always writes the newest state
+        if DOC_STORE_FORMAT == "binary":
+            safe_path = ensure_directory_exists(get_absolute_path(DOC_STORE_SNAPSHOT))
+            try:
+                docs = doc_store.snapshot()
+                write_snapshot(safe_path, docs, doc_counter)
+                logger.info(f"Saved document store with {len(docs)} documents to {safe_path}")
+                return
+            except Exception as e:
+                logger.error(f"Error saving document store snapshot to {safe_path}: {e}")
+                # The loader prefers the snapshot whenever it exists, so move the
+                # stale one aside before the changes go to disk as JSON
+                if os.path.exists(safe_path):
+                    try:
+                        os.replace(safe_path, f"{safe_path}.stale")
+                    except OSError as move_err:
+                        logger.error(f"Could not move stale snapshot {safe_path} aside: {move_err}")
+                        return
 
-    data = {"docs": doc_store, "counter": doc_counter}
+        safe_path = ensure_directory_exists(get_absolute_path(DOC_STORE_FILE))
+        data = {"docs": doc_store.to_dicts(), "counter": doc_counter}
+        _write_doc_store(safe_path, data)
 
+
+def _write_doc_store(safe_path, data):
+    """Write a doc store snapshot to disk, falling back to the working directory"""
+    docs = data["docs"]
     try:
         # Write directly to the final file - safer than using temp files which can cause I/O issues
         with open(safe_path, "w", encoding="utf-8") as f:
@@ -124,7 +321,7 @@ def save_doc_store():
             os.fsync(f.fileno())
 
         logger.info(
-            f"Saved document store with {len(doc_store)} documents to {safe_path}"
+            f"Saved document store with {len(docs)} documents to {safe_path}"
         )
     except Exception as e:
         logger.error(f"Error saving document store to {safe_path}: {e}")
@@ -142,6 +339,3 @@ def save_doc_store():
                 f"Error saving document store to fallback path: {fallback_err}"
             )
 
-
-# Load document store on module import
-load_doc_store()
@@ -0,0 +1,544 @@
+# backend/services/storage_backend.py
+"""
+Blob storage behind one interface, so audio can live in Firebase or on disk.
+
+STORAGE_BACKEND selects the implementation:
+
+- "firebase": Firebase Storage, with file records in the Firestore "files"
+  collection (the functions of services/firebase_service.py and
+  Firestore_implementation.py)
+- "local": a directory (LOCAL_STORAGE_ROOT) on this host, with file
+  records in the shared "files" mapping. Signed URLs point at
+  GET /api/storage/<path> on this server, carry an expiry and an HMAC of
+  method, path and expiry made with STORAGE_URL_SECRET (or, if none is
+  configured, a random key generated once per install and kept in
+  STORAGE_URL_SECRET_FILE), and are served with
+  send_file, which hands the file to the server's sendfile support.
+  Signed upload URLs take a PUT of the content at the same path.
+
+The local backend is meant for single-node on-prem installs, where the
+audio already sits on local disk, and for load tests and benchmarks that
+should not touch the network.
+
+Callers use the module-level functions (upload_file_by_path,
+get_signed_url, get_file_url, get_upload_url, check_blob_exists,
+get_blob_size, move_file, delete_file, delete_files, list_user_files,
+download_file), which go to the configured backend.
+"""
+import hashlib
+import hmac
+import logging
+import mimetypes
+import os
+import secrets
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import quote
+from firebase_config import ADMIN_USER_IDS
+from services.shared_state import shared_mapping
+
+# Get configuration
+try:
+    from config import (
+        STORAGE_BACKEND, LOCAL_STORAGE_ROOT, LOCAL_STORAGE_URL, STORAGE_URL_SECRET,
+        STORAGE_URL_SECRET_FILE, UPLOAD_CHUNK_SIZE,
+    )
+except ImportError:
+    # Default values if config can't be imported
+    STORAGE_BACKEND = "firebase"
+    LOCAL_STORAGE_ROOT = "storage"
+    LOCAL_STORAGE_URL = "/api/storage"
+    STORAGE_URL_SECRET = None
+    STORAGE_URL_SECRET_FILE = "storage_url_secret"
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# Lifetime of the download and upload URLs handed to clients
+URL_EXPIRATION = 3600
+
+
+def _owner(storage_path):
+    parts = storage_path.split("/")
+    if len(parts) >= 2 and parts[0] == "users":
+        return parts[1]
+    return None
+
+
+def _may_access(user_id, storage_path):
+    """Whether a user may change a path; None is an internal caller"""
+    return user_id is None or user_id in ADMIN_USER_IDS or _owner(storage_path) == user_id
+
+
+class StorageBackend:
+    """Interface of a blob store; paths look like users/<uid>/uploads/<file>"""
+
+    name = None
+
+    def available(self):
+        """Whether the store can be used right now"""
+        return True
+
+    def upload_file_by_path(self, local_path, storage_path):
+        """Store a local file at storage_path; raises on failure"""
+        raise NotImplementedError
+
+    def get_signed_url(self, storage_path, expiration=URL_EXPIRATION):
+        """Time-limited download URL, or None if the blob does not exist"""
+        raise NotImplementedError
+
+    def get_upload_url(self, storage_path, content_type, size, expiration=URL_EXPIRATION):
+        """
+        Time-limited URL a client can PUT exactly size bytes of content to.
+
+        Returns:
+            dict: {"url": str, "headers": {name: value}}; the PUT must send the headers
+        """
+        raise NotImplementedError
+
+    def exists(self, storage_path):
+        raise NotImplementedError
+
+    def size(self, storage_path):
+        """Size in bytes of a blob as stored now, or None if it does not exist"""
+        raise NotImplementedError
+
+    def move_file(self, source_path, dest_path, requesting_user_id):
+        """Move a blob within one user's paths; returns whether it is at dest_path"""
+        raise NotImplementedError
+
+    def delete_file(self, storage_path, requesting_user_id):
+        """Delete one blob; returns whether it was deleted"""
+        raise NotImplementedError
+
+    def delete_files(self, storage_paths, requesting_user_id=None):
+        """Delete many blobs; returns {"deleted": [paths], "failed": {path: error}}"""
+        raise NotImplementedError
+
+    def list_user_files(self, user_id, folder_path, delimiter=None):
+        """File objects (filename, storagePath, contentType, size, ...) under users/<uid>/<folder_path>"""
+        raise NotImplementedError
+
+    def list_blobs(self, prefix, fields=None, start_offset=None, max_results=None):
+        """
+        Blobs under a prefix in name order; each has .name and .generation
+        (for the reconciler). start_offset (inclusive) and max_results
+        list a part of them.
+        """
+        raise NotImplementedError
+
+    def download_file(self, storage_path, dest_path):
+        """Copy a blob to a local file; returns False if the blob does not exist"""
+        raise NotImplementedError
+
+
+class FirebaseStorageBackend(StorageBackend):
+    """Firebase Storage, with file records in Firestore"""
+
+    name = "firebase"
+
+    # Imported in the methods so that the local backend needs no Firebase client
+
+    def available(self):
+        from services import firebase_service
+        return bool(firebase_service.bucket)
+
+    def upload_file_by_path(self, local_path, storage_path):
+        from Firestore_implementation import upload_file_by_path
+        return upload_file_by_path(local_path, storage_path)
+
+    def get_signed_url(self, storage_path, expiration=URL_EXPIRATION):
+        from Firestore_implementation import get_signed_url
+        return get_signed_url(storage_path, expiration)
+
+    def get_upload_url(self, storage_path, content_type, size, expiration=URL_EXPIRATION):
+        from services import firebase_service
+        # Signed headers: Storage rejects a PUT of another type or size
+        headers = {
+            "Content-Type": content_type,
+            "x-goog-content-length-range": f"{size},{size}",
+        }
+        url = firebase_service.bucket.blob(storage_path).generate_signed_url(
+            version="v4", expiration=expiration, method="PUT", headers=headers,
+        )
+        return {"url": url, "headers": headers}
+
+    def exists(self, storage_path):
+        from services import firebase_service
+        return firebase_service.check_blob_exists(storage_path)
+
+    def size(self, storage_path):
+        from services import firebase_service
+        from services.blob_cache import blob_cache
+        # Written by a client, not by this process: the cache can't know it
+        blob_cache.invalidate(storage_path)
+        info = blob_cache.lookup(firebase_service.bucket, storage_path)
+        return info.size if info is not None else None
+
+    def move_file(self, source_path, dest_path, requesting_user_id):
+        from services import firebase_service
+        return firebase_service.move_file(source_path, dest_path, requesting_user_id)
+
+    def delete_file(self, storage_path, requesting_user_id):
+        from services import firebase_service
+        return firebase_service.delete_file(storage_path, requesting_user_id)
+
+    def delete_files(self, storage_paths, requesting_user_id=None):
+        from services import firebase_service
+        return firebase_service.delete_files(storage_paths, requesting_user_id)
+
+    def list_user_files(self, user_id, folder_path, delimiter=None):
+        from services import firebase_service
+        return firebase_service.list_user_files(user_id, folder_path, delimiter)
+
+    def list_blobs(self, prefix, fields=None, start_offset=None, max_results=None):
+        from services import firebase_service
+        options = {"fields": fields, "start_offset": start_offset, "max_results": max_results}
+        return firebase_service.bucket.list_blobs(
+            prefix=prefix, **{name: value for name, value in options.items() if value is not None}
+        )
+
+    def download_file(self, storage_path, dest_path):
+        from services import firebase_service
+        if not firebase_service.bucket:
+            return False
+        blob = firebase_service.bucket.blob(storage_path, chunk_size=UPLOAD_CHUNK_SIZE)
+        if not blob.exists():
+            return False
+        blob.download_to_filename(dest_path)
+        return True
+
+
+class LocalBlob:
+    """What list_blobs() reports for a local file"""
+
+    __slots__ = ("name", "generation", "size")
+
+    def __init__(self, name, generation, size):
+        self.name = name
+        self.generation = generation
+        self.size = size
+
+
+def load_url_secret(path):
+    """
+    Return the install's URL signing key, generating a random one on first use.
+
+    The key is written to a temp file that is then linked into place, so
+    workers starting at once all end up with the key of whichever won.
+    """
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.link(tmp_path, path)
+                logger.info(f"Generated a storage URL signing key in {path}")
+            except FileExistsError:
+                pass
+        finally:
+            os.remove(tmp_path)
+    with open(path) as f:
+        secret = f.read().strip()
+    if not secret:
+        raise RuntimeError(f"Storage URL signing key file {path} is empty")
+    return secret
+
+
+class LocalStorageBackend(StorageBackend):
+    """Blobs as files under a root directory, served by this server"""
+
+    name = "local"
+
+    def __init__(self, root=LOCAL_STORAGE_ROOT, secret=None, url_prefix=LOCAL_STORAGE_URL):
+        self.root = os.path.abspath(root)
+        # Never a fixed default: anyone knowing the key can forge GET and PUT URLs
+        secret = secret or STORAGE_URL_SECRET or load_url_secret(STORAGE_URL_SECRET_FILE)
+        self._secret = secret.encode()
+        self.url_prefix = url_prefix.rstrip("/")
+        # filename -> record, as in the Firestore "files" collection
+        self.records = shared_mapping("files")
+
+    def path(self, storage_path):
+        """Local path of a blob; raises ValueError for paths outside the root"""
+        full_path = os.path.abspath(os.path.join(self.root, storage_path))
+        if not full_path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage path: {storage_path}")
+        return full_path
+
+    # --- Signed URLs ---
+
+    def signature(self, storage_path, expires, method="GET", size=None):
+        message = f"{method}\n{storage_path}\n{expires}"
+        if size is not None:
+            message += f"\n{size}"
+        return hmac.new(self._secret, message.encode(), hashlib.sha256).hexdigest()
+
+    def verify(self, storage_path, expires, signature, method="GET", size=None):
+        """Whether a URL's expiry and signature are valid for a request to storage_path"""
+        try:
+            if int(expires) < time.time():
+                return False
+        except (TypeError, ValueError):
+            return False
+        return hmac.compare_digest(self.signature(storage_path, expires, method, size), signature or "")
+
+    def get_signed_url(self, storage_path, expiration=URL_EXPIRATION):
+        if not self.exists(storage_path):
+            return None
+        expires = int(time.time()) + expiration
+        return (f"{self.url_prefix}/{quote(storage_path)}"
+                f"?expires={expires}&signature={self.signature(storage_path, expires)}")
+
+    def get_upload_url(self, storage_path, content_type, size, expiration=URL_EXPIRATION):
+        self.path(storage_path)
+        expires = int(time.time()) + expiration
+        signature = self.signature(storage_path, expires, "PUT", size)
+        url = (f"{self.url_prefix}/{quote(storage_path)}"
+               f"?expires={expires}&size={size}&signature={signature}")
+        return {"url": url, "headers": {"Content-Type": content_type}}
+
+    # --- Blobs ---
+
+    def _record(self, storage_path, **fields):
+        filename = os.path.basename(storage_path)
+        record = dict(self.records.get(filename) or {}, storagePath=storage_path, **fields)
+        self.records[filename] = record
+
+    def _record_upload(self, storage_path, content_type=None):
+        self._record(
+            storage_path,
+            filename=os.path.basename(storage_path),
+            ownerId=_owner(storage_path) or "unknown",
+            contentType=content_type or mimetypes.guess_type(storage_path)[0] or "audio/mpeg",
+            uploadTime=datetime.now(timezone.utc).isoformat(),
+            status="active",
+        )
+
+    def upload_file_by_path(self, local_path, storage_path):
+        dest = self.path(storage_path)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp_path = f"{dest}.{uuid.uuid4().hex}.part"
+        try:
+            try:
+                # Same filesystem: no copy at all
+                os.link(local_path, tmp_path)
+            except OSError:
+                shutil.copyfile(local_path, tmp_path)
+            os.replace(tmp_path, dest)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._record_upload(storage_path)
+        logger.info(f"File stored locally at {storage_path}")
+
+    def receive(self, storage_path, stream, size, content_type=None):
+        """
+        Store the body of a PUT to a signed upload URL.
+
+        Args:
+            storage_path: Blob path the URL was signed for
+            stream: Request body
+            size: Signed size; a body of any other length is discarded
+            content_type: Content-Type of the request
+
+        Returns:
+            bool: Whether the blob was stored
+        """
+        dest = self.path(storage_path)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp_path = f"{dest}.{uuid.uuid4().hex}.part"
+        received = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while received <= size:
+                    chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    received += len(chunk)
+            if received != size:
+                logger.warning(f"Upload to {storage_path} sent {received} bytes, expected {size}")
+                return False
+            os.replace(tmp_path, dest)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._record_upload(storage_path, content_type)
+        logger.info(f"File received at {storage_path} ({size} bytes)")
+        return True
+
+    def exists(self, storage_path):
+        try:
+            return os.path.isfile(self.path(storage_path))
+        except ValueError:
+            return False
+
+    def size(self, storage_path):
+        try:
+            return os.path.getsize(self.path(storage_path))
+        except (OSError, ValueError):
+            return None
+
+    def move_file(self, source_path, dest_path, requesting_user_id):
+        if _owner(source_path) != _owner(dest_path) or not _may_access(requesting_user_id, source_path):
+            logger.warning(f"Move denied: {requesting_user_id} {source_path} -> {dest_path}")
+            return False
+        try:
+            source = self.path(source_path)
+            dest = self.path(dest_path)
+            if not os.path.exists(source):
+                return os.path.exists(dest)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(source, dest)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error moving file: {e}")
+            return False
+        self._record(dest_path, status="active" if "uploads" in dest_path else "trashed")
+        return True
+
+    def delete_file(self, storage_path, requesting_user_id):
+        return storage_path in self.delete_files([storage_path], requesting_user_id)["deleted"]
+
+    def delete_files(self, storage_paths, requesting_user_id=None):
+        deleted = []
+        failed = {}
+        for storage_path in dict.fromkeys(storage_paths):
+            if not _may_access(requesting_user_id, storage_path):
+                failed[storage_path] = "Access denied"
+                continue
+            try:
+                os.remove(self.path(storage_path))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                failed[storage_path] = str(e)
+                continue
+            self.records.pop(os.path.basename(storage_path), None)
+            deleted.append(storage_path)
+        return {"deleted": deleted, "failed": failed}
+
+    def _walk(self, prefix, recursive=True):
+        """(storage path, os.stat_result) of the files under a path prefix"""
+        directory, _, name_prefix = prefix.rpartition("/")
+        try:
+            base = self.path(directory) if directory else self.root
+        except ValueError:
+            return
+        if not os.path.isdir(base):
+            return
+        for dirpath, dirnames, filenames in os.walk(base):
+            rel_dir = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            for filename in filenames:
+                storage_path = f"{rel_dir}/{filename}" if rel_dir != "." else filename
+                if storage_path.startswith(prefix) and not filename.endswith(".part"):
+                    yield storage_path, os.stat(os.path.join(dirpath, filename))
+            if not recursive:
+                break
+
+    def list_user_files(self, user_id, folder_path, delimiter=None):
+        files = []
+        prefix = f"users/{user_id}/{folder_path}"
+        for storage_path, stat in self._walk(prefix, recursive=delimiter is None):
+            filename = storage_path.rsplit("/", 1)[-1]
+            record = self.records.get(filename) or {}
+            files.append({
+                "filename": filename,
+                "storagePath": storage_path,
+                "contentType": record.get("contentType") or mimetypes.guess_type(filename)[0],
+                "size": stat.st_size,
+                "timeCreated": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+                "originalFilename": record.get("originalFilename", filename),
+                "ownerId": record.get("ownerId", user_id),
+            })
+        return files
+
+    def list_blobs(self, prefix, fields=None, start_offset=None, max_results=None):
+        blobs = sorted(
+            (LocalBlob(path, stat.st_mtime_ns, stat.st_size) for path, stat in self._walk(prefix)
+             if start_offset is None or path >= start_offset),
+            key=lambda blob: blob.name,
+        )
+        return blobs if max_results is None else blobs[:max_results]
+
+    def download_file(self, storage_path, dest_path):
+        if not self.exists(storage_path):
+            return False
+        shutil.copyfile(self.path(storage_path), dest_path)
+        return True
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Return the configured StorageBackend, created once per process"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == "local":
+                    _storage = LocalStorageBackend()
+                else:
+                    _storage = FirebaseStorageBackend()
+                logger.info(f"Storage backend: {_storage.name}")
+    return _storage
+
+
+def upload_file_by_path(local_path, storage_path):
+    return get_storage().upload_file_by_path(local_path, storage_path)
+
+
+def get_signed_url(storage_path, expiration=URL_EXPIRATION):
+    return get_storage().get_signed_url(storage_path, expiration)
+
+
+def get_file_url(storage_path, requesting_user_id=None):
+    """Signed URL of a blob, or None if it is missing or not the user's"""
+    storage = get_storage()
+    if storage.name == "firebase":
+        from services import firebase_service
+        return firebase_service.get_file_url(storage_path, requesting_user_id)
+    if requesting_user_id and not _may_access(requesting_user_id, storage_path):
+        return None
+    return storage.get_signed_url(storage_path)
+
+
+def get_upload_url(storage_path, content_type, size, expiration=URL_EXPIRATION):
+    return get_storage().get_upload_url(storage_path, content_type, size, expiration)
+
+
+def check_blob_exists(storage_path):
+    return get_storage().exists(storage_path)
+
+
+def get_blob_size(storage_path):
+    return get_storage().size(storage_path)
+
+
+def move_file(source_path, dest_path, requesting_user_id):
+    return get_storage().move_file(source_path, dest_path, requesting_user_id)
+
+
+def delete_file(storage_path, requesting_user_id):
+    return get_storage().delete_file(storage_path, requesting_user_id)
+
+
+def delete_files(storage_paths, requesting_user_id=None):
+    return get_storage().delete_files(storage_paths, requesting_user_id)
+
+
+def list_user_files(user_id, folder_path, delimiter=None):
+    return get_storage().list_user_files(user_id, folder_path, delimiter)
+
+
+def download_file(storage_path, dest_path):
+    return get_storage().download_file(storage_path, dest_path)
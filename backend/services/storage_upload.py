@@ -0,0 +1,138 @@
+# backend/services/storage_upload.py
+"""
+Background upload of recordings to blob storage (Firebase or local).
+
+upload_audio used to upload the file to Firebase and sign a URL before it
+responded or started transcribing, so the client waited for the whole
+cloud upload. Now the request returns once the local copy is durable, and
+start_storage_upload() runs the cloud upload as a background job next to
+the transcription. Progress is visible on the document as storage_status:
+
+    pending -> uploading -> uploaded
+                        \\-> failed (after STORAGE_UPLOAD_ATTEMPTS tries)
+
+and is pushed to the document's socket room as "storage_status" events.
+"""
+import logging
+import os
+from services.doc_record import StorageStatus
+from services.storage import doc_store, save_doc_store
+from services.job_registry import start_job, update_job, claim_job
+from services.storage_backend import upload_file_by_path, get_signed_url, check_blob_exists
+from services.blob_store import is_blob_path
+from services.socketio_instance import socketio
+
+# Get configuration
+try:
+    from config import STORAGE_UPLOAD_ATTEMPTS
+except ImportError:
+    # Default value if config can't be imported
+    STORAGE_UPLOAD_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the second attempt; doubles after every failure
+RETRY_DELAY = 5
+
+# Seconds without progress after which an upload job running on another
+# worker is taken to be abandoned (its worker stopped) and is resumed
+CLAIM_TIMEOUT = 3600
+
+
+def _set_status(doc_id, status, **changes):
+    changes["storage_status"] = status
+    doc = doc_store.patch(doc_id, changes)
+    if doc:
+        save_doc_store()
+        socketio.emit("storage_status", {
+            "doc_id": doc_id,
+            "storage_status": status,
+            "error": changes.get("storage_error"),
+        }, room=doc_id)
+    return doc
+
+
+def start_storage_upload(doc_id, local_path, firebase_path):
+    """Upload a document's audio to the storage backend in the background"""
+    socketio.start_background_task(upload_to_storage, doc_id, local_path, firebase_path)
+
+
+def upload_to_storage(doc_id, local_path, firebase_path, upload=None, sign=None):
+    """
+    Upload one recording, retrying failed attempts, and record the outcome.
+
+    Args:
+        doc_id: Document the audio belongs to
+        local_path: Durable local copy of the audio
+        firebase_path: Destination path in the bucket
+        upload: upload_file_by_path-compatible function (default: the storage backend's)
+        sign: get_signed_url-compatible function
+
+    Returns:
+        bool: Whether the upload succeeded
+    """
+    upload = upload or upload_file_by_path
+    sign = sign or get_signed_url
+
+    job_id = f"storage_upload:{doc_id}"
+    start_job(job_id, "storage_upload", doc_id=doc_id, path=firebase_path)
+    error = None
+    for attempt in range(1, STORAGE_UPLOAD_ATTEMPTS + 1):
+        if not doc_store.get(doc_id) or not os.path.exists(local_path):
+            # Deleted while queued; nothing left to upload
+            update_job(job_id, status="cancelled")
+            return False
+        _set_status(doc_id, StorageStatus.UPLOADING)
+        try:
+            if is_blob_path(firebase_path) and check_blob_exists(firebase_path):
+                # The same content was uploaded before, for this or another document
+                logger.info(f"Audio of doc {doc_id} is already stored at {firebase_path}")
+            else:
+                upload(local_path, firebase_path)
+            url = sign(firebase_path)
+            _set_status(
+                doc_id, StorageStatus.UPLOADED,
+                firebaseUrl=url, firebasePath=firebase_path, storage_error=None,
+            )
+            update_job(job_id, status="completed", attempts=attempt)
+            logger.info(f"Uploaded audio of doc {doc_id} to {firebase_path}")
+            return True
+        except Exception as e:
+            error = str(e)
+            logger.warning(
+                f"Upload of doc {doc_id} to Firebase failed (attempt {attempt}/{STORAGE_UPLOAD_ATTEMPTS}): {e}"
+            )
+            update_job(job_id, attempts=attempt, error=error)
+            if attempt < STORAGE_UPLOAD_ATTEMPTS:
+                socketio.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+
+    _set_status(doc_id, StorageStatus.FAILED, storage_error=error)
+    update_job(job_id, status="failed", error=error)
+    logger.error(f"Giving up uploading audio of doc {doc_id}: {error}")
+    return False
+
+
+def resume_storage_uploads():
+    """
+    Restart the uploads of documents that were pending when the server
+    stopped. Every worker calls this on start; each upload is claimed in the
+    job registry first, so it is resumed by one worker and not by those
+    that find it running elsewhere.
+
+    Returns:
+        int: Number of uploads resumed by this worker
+    """
+    unfinished = [
+        doc for doc in doc_store.values()
+        if doc.storage_status in (StorageStatus.PENDING, StorageStatus.UPLOADING)
+        and doc.localPath and doc.firebasePath
+    ]
+    resumed = 0
+    for doc in unfinished:
+        if claim_job(f"storage_upload:{doc.id}", "storage_upload", CLAIM_TIMEOUT,
+                     doc_id=doc.id, path=doc.firebasePath):
+            start_storage_upload(doc.id, doc.localPath, doc.firebasePath)
+            resumed += 1
+    if resumed:
+        logger.info(f"Resuming {resumed} Firebase uploads")
+    return resumed
@@ -0,0 +1,144 @@
+# backend/services/transcript_builder.py
+"""
+Incremental transcript assembly.
+
+Transcription produces text chunk by chunk. Concatenating each chunk onto
+one string and writing the whole body back every time is quadratic in the
+transcript length, so a TranscriptBuilder keeps the chunks as a list and
+only appends the new ones to the content store's chunk log. The joined,
+normalized text is produced once, by finalize(), and stored with the
+timing segments ({"start", "end", "text"}) of the chunks that had them.
+"""
+import re
+import threading
+from services.content_store import append_chunks, load_content, save_content
+
+_WHITESPACE = re.compile(r"\s+")
+_SPACE_BEFORE_PUNCTUATION = re.compile(r"\s+([.,;:!?])")
+# A chunk starting with one of these is glued to the previous one
+_LEADING_PUNCTUATION = ".,;:!?\"'"
+
+# doc_id -> TranscriptBuilder of transcriptions in progress
+_active = {}
+_active_lock = threading.Lock()
+
+
+def normalize_transcript(text):
+    """Collapse whitespace and drop spaces before punctuation"""
+    text = _WHITESPACE.sub(" ", text.strip())
+    return _SPACE_BEFORE_PUNCTUATION.sub(r"\1", text)
+
+
+def join_piece(previous, chunk_text):
+    """
+    Return chunk_text with the separator it needs after `previous`.
+
+    Args:
+        previous: Text the chunk is appended to (only its last character matters)
+        chunk_text: Stripped text of the new chunk
+    """
+    if not previous or not chunk_text:
+        return chunk_text
+    if chunk_text[0] in _LEADING_PUNCTUATION:
+        return chunk_text
+    if previous[-1].isalnum() and chunk_text[0].isalnum():
+        return " " + chunk_text
+    return chunk_text
+
+
+class TranscriptBuilder:
+    """Append-only transcript of one document"""
+
+    def __init__(self, doc_id, text=""):
+        """
+        Args:
+            doc_id: Document ID
+            text: Body already stored for the document, which chunks extend
+        """
+        self.doc_id = doc_id
+        self._pieces = [text] if text else []
+        self._segments = []
+        self._lock = threading.Lock()
+
+    def append(self, chunk_text, start=None, end=None):
+        """
+        Add one chunk and persist it.
+
+        Args:
+            chunk_text: Transcribed text of the chunk
+            start: Optional audio offset (seconds) where the chunk starts
+            end: Optional audio offset (seconds) where the chunk ends
+
+        Returns:
+            str: The stripped chunk text
+        """
+        chunk_text = chunk_text.strip()
+        with self._lock:
+            previous = next((piece for piece in reversed(self._pieces) if piece), "")
+            piece = join_piece(previous, chunk_text)
+            if piece:
+                self._pieces.append(piece)
+                append_chunks(self.doc_id, [piece])
+                if start is not None:
+                    self._segments.append({"start": start, "end": end, "text": chunk_text})
+        return chunk_text
+
+    def text(self):
+        """Return the raw joined text"""
+        with self._lock:
+            return "".join(self._pieces)
+
+    def finalize(self):
+        """
+        Store the normalized transcript as the document body.
+
+        Returns:
+            str: The normalized text
+        """
+        final_text = normalize_transcript(self.text())
+        with self._lock:
+            segments = list(self._segments) or None
+        # Without timed chunks the stored segments are kept
+        save_content(self.doc_id, content=final_text, segments=segments)
+        with _active_lock:
+            if _active.get(self.doc_id) is self:
+                del _active[self.doc_id]
+        return final_text
+
+
+def start_transcript(doc_id):
+    """Clear a document's body and segments and return the builder that refills it"""
+    save_content(doc_id, content="", segments=[])
+    builder = TranscriptBuilder(doc_id)
+    with _active_lock:
+        _active[doc_id] = builder
+    return builder
+
+
+def get_builder(doc_id):
+    """
+    Return the builder of a transcription in progress, or one that extends
+    the stored body of the document.
+    """
+    with _active_lock:
+        builder = _active.get(doc_id)
+    if builder is None:
+        builder = TranscriptBuilder(doc_id, load_content(doc_id)["content"])
+    return builder
+
+
+def is_transcribing(doc_id):
+    """
+    Whether a transcription of the document is running in this process.
+
+    Its builder's finalize() replaces the whole body, so edits made in the
+    meantime would be lost; they are rejected instead.
+    """
+    with _active_lock:
+        return doc_id in _active
+
+
+def discard_transcript(doc_id):
+    """Forget the builder of a transcription that failed; stored chunks are kept"""
+    with _active_lock:
+        _active.pop(doc_id, None)
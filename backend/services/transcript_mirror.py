@@ -0,0 +1,219 @@
+# backend/services/transcript_mirror.py
+"""
+Batched mirroring of transcription chunks to Firestore.
+
+The mirror used to read ``transcriptions/<doc_id>``, extend its
+``transcription_chunks`` array and write the whole document back for every
+chunk. That is a read plus an ever-growing write per chunk, and a long
+transcript eventually hits Firestore's 1 MiB document limit. Chunks are now
+stored one document each in the ``transcriptions/<doc_id>/chunks``
+subcollection, keyed by their index, and the parent document only carries
+the status fields.
+
+add_chunks() only queues the chunks. A background thread coalesces
+everything queued within FLUSH_INTERVAL seconds into WriteBatch commits of at
+most MAX_BATCH_WRITES writes, so the transcription loop never waits on
+Firestore. The client is passed in, which keeps the mirror usable against
+the Firestore emulator (set FIRESTORE_EMULATOR_HOST) or an in-memory
+stand-in in tests.
+
+A failed commit is retried with exponential backoff. Writes still failing
+after MAX_ATTEMPTS are dropped, and the transcription is then marked
+"incomplete" instead of "completed", so a reader of the mirror can tell it
+is missing chunks.
+
+Mirroring is off unless FIRESTORE_TRANSCRIPT_MIRROR is set; the local
+content store stays the source of truth. mirror_transcription() is the
+entry point of the transcription loop.
+"""
+import logging
+import threading
+import time
+from firebase_admin import firestore
+
+# Get configuration
+try:
+    from config import FIRESTORE_TRANSCRIPT_MIRROR
+except ImportError:
+    # Default value if config can't be imported
+    FIRESTORE_TRANSCRIPT_MIRROR = False
+
+logger = logging.getLogger(__name__)
+
+# Seconds chunks are collected before a flush
+FLUSH_INTERVAL = 1.0
+# Firestore accepts at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+# Commit attempts per batch before its writes are dropped
+MAX_ATTEMPTS = 5
+# Seconds before the first retry of a failed commit, doubled on each retry
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30
+
+CHUNKS_COLLECTION = "chunks"
+
+
+class TranscriptMirror:
+    """Queues transcription chunks and writes them to Firestore in batches"""
+
+    def __init__(self, db, collection="transcriptions", flush_interval=FLUSH_INTERVAL,
+                 retry_delay=RETRY_DELAY):
+        self.db = db
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        # doc_id -> {"file_url", "final", "chunks": [(index, chunk), ...]}
+        self._pending = {}
+        # doc_id -> next chunk index for chunks that carry none
+        self._next_index = {}
+        # doc_ids of transcriptions with dropped writes since their last final update
+        self._incomplete = set()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def add_chunks(self, doc_id, file_url, chunks, final=False):
+        """
+        Queue chunks of a transcription for mirroring; never blocks on Firestore.
+
+        Args:
+            doc_id: Document ID
+            file_url: URL of the transcribed file
+            chunks: Chunk dicts (a "chunk_index" key is used as their index)
+                    or plain strings
+            final: Whether this is the last update of the transcription
+        """
+        with self._cond:
+            pending = self._pending.setdefault(doc_id, {"chunks": [], "final": False})
+            pending["file_url"] = file_url
+            pending["final"] = pending["final"] or final
+            for chunk in chunks:
+                if not isinstance(chunk, dict):
+                    chunk = {"text": chunk}
+                index = chunk.get("chunk_index")
+                if index is None:
+                    index = self._next_index.get(doc_id, 0)
+                self._next_index[doc_id] = max(self._next_index.get(doc_id, 0), index + 1)
+                pending["chunks"].append((index, chunk))
+            if final:
+                self._next_index.pop(doc_id, None)
+                # Don't hold the completed status back for the full interval
+                self._cond.notify()
+            self._ensure_thread()
+
+    def flush(self):
+        """Write everything queued so far; returns the number of chunks written"""
+        with self._flush_lock:
+            with self._cond:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            # (ref, data, doc_id, is_status); a status follows its chunks, so
+            # it is committed in the batch of its last chunk or a later one
+            writes = []
+            written = 0
+            for doc_id, update in pending.items():
+                parent = self.db.collection(self.collection).document(doc_id)
+                for index, chunk in update["chunks"]:
+                    ref = parent.collection(CHUNKS_COLLECTION).document(f"{index:06d}")
+                    writes.append((ref, dict(chunk, chunk_index=index), doc_id, False))
+                status = {
+                    "file_url": update["file_url"],
+                    "status": "completed" if update["final"] else "in_progress",
+                    "updated_at": firestore.SERVER_TIMESTAMP,
+                }
+                if update["chunks"]:
+                    status["chunk_count"] = max(index for index, _ in update["chunks"]) + 1
+                writes.append((parent, status, doc_id, True))
+            for start in range(0, len(writes), MAX_BATCH_WRITES):
+                batch = writes[start:start + MAX_BATCH_WRITES]
+                if self._commit(batch):
+                    written += sum(1 for _, _, _, is_status in batch if not is_status)
+                else:
+                    self._incomplete.update(doc_id for _, _, doc_id, _ in batch)
+            for doc_id, update in pending.items():
+                if update["final"]:
+                    self._incomplete.discard(doc_id)
+            return written
+
+    def _commit(self, writes):
+        """Commit writes in one batch, retrying with backoff; returns False if they were dropped"""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                batch = self.db.batch()
+                for ref, data, doc_id, is_status in writes:
+                    if is_status and data["status"] == "completed" and doc_id in self._incomplete:
+                        # Earlier chunks of this transcription were dropped
+                        data = dict(data, status="incomplete")
+                    batch.set(ref, data, merge=True)
+                batch.commit()
+                return True
+            except Exception as e:
+                logger.warning(f"Firestore batch of {len(writes)} writes failed (attempt {attempt}): {e}")
+            if attempt < MAX_ATTEMPTS:
+                time.sleep(min(self.retry_delay * 2 ** (attempt - 1), MAX_RETRY_DELAY))
+        logger.error(f"Dropped {len(writes)} Firestore transcription writes after {MAX_ATTEMPTS} attempts")
+        return False
+
+    def _ensure_thread(self):
+        # Called with self._cond held
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="transcript-mirror", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._closed:
+                    self._cond.wait()
+                final = any(update["final"] for update in self._pending.values())
+                if not final and not self._closed:
+                    # Let more chunks coalesce into the same batch
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error mirroring transcription chunks to Firestore: {e}")
+            if closed:
+                return
+
+    def close(self):
+        """Flush what is queued and stop the background thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        else:
+            self.flush()
+
+
+# Created on first use by mirror_transcription
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def mirror_transcription(doc_id, file_url, chunks, final=False):
+    """
+    Queue transcription chunks for the Firestore mirror, if it is enabled.
+
+    Args:
+        doc_id: Document ID
+        file_url: Storage path or URL of the transcribed file
+        chunks: Chunk dicts or plain strings (see TranscriptMirror.add_chunks)
+        final: Whether this is the last update of the transcription
+    """
+    global _mirror
+    if not FIRESTORE_TRANSCRIPT_MIRROR:
+        return
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                from services.firebase_client import db
+                _mirror = TranscriptMirror(db)
+    _mirror.add_chunks(doc_id, file_url, chunks, final=final)
@@ -0,0 +1,319 @@
+# backend/services/trash.py
+"""
+Trash lifecycle.
+
+Trashing a document only sets flags (deleted and/or audioTrashed) and
+stamps trashedAt; the audio stays at users/<uid>/uploads/<file> in Storage
+and in UPLOAD_FOLDER on disk, so trash and restore are metadata writes
+whatever the size of the recording. purge_expired_trash() permanently
+deletes documents that have been in the trash for TRASH_RETENTION_DAYS, in
+batches of TRASH_PURGE_BATCH whose blobs go to Storage as one bulk delete,
+and start_trash_purger() runs it every TRASH_PURGE_INTERVAL seconds.
+
+Audio trashed before this was moved to users/<uid>/trash/ and TRASH_FOLDER.
+Those documents had no trashedAt; stamp_legacy_trash() gives them one (so
+their retention period starts at the upgrade, not at their last update)
+and marks them legacyTrash: restoring one moves its audio back once, and
+purging deletes both locations.
+"""
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from services.storage import doc_store, doc_index, save_doc_store
+from services.doc_store import now_iso
+from services.doc_index import ANY_FOLDER, MAX_PAGE_SIZE
+from services.content_store import delete_content
+from services.search_index import remove_document
+from services.version_history import delete_history
+from services.storage_backend import move_file, delete_file, delete_files, check_blob_exists
+from services.audio_cache import audio_cache
+from services.blob_store import blob_refs, blob_path
+from services.socketio_instance import socketio
+
+# Get configuration
+try:
+    from config import (
+        UPLOAD_FOLDER, TRASH_FOLDER,
+        TRASH_RETENTION_DAYS, TRASH_PURGE_INTERVAL, TRASH_PURGE_BATCH,
+    )
+except ImportError:
+    # Default values if config can't be imported
+    UPLOAD_FOLDER = "uploads"
+    TRASH_FOLDER = "trash"
+    TRASH_RETENTION_DAYS = 30
+    TRASH_PURGE_INTERVAL = 3600
+    TRASH_PURGE_BATCH = 100
+
+logger = logging.getLogger(__name__)
+
+
+def upload_path(owner, filename):
+    return f"users/{owner}/uploads/{filename}"
+
+
+def legacy_trash_path(owner, filename):
+    return f"users/{owner}/trash/{filename}"
+
+
+def trash_changes(delete_doc=False):
+    """Changes that put a document in the trash"""
+    changes = {"audioTrashed": True, "trashedAt": now_iso()}
+    if delete_doc:
+        changes["deleted"] = True
+    return changes
+
+
+def delete_changes(doc):
+    """Changes that soft delete a document (DELETE /api/docs/<id>)"""
+    if doc.audioTrashed:
+        # Keep the trashedAt (or its absence, for legacy audio) of trashed audio
+        return {"deleted": True}
+    if doc.audioFilename:
+        return trash_changes(delete_doc=True)
+    return {"deleted": True, "trashedAt": now_iso()}
+
+
+def restore_changes():
+    """Changes that take a document out of the trash"""
+    return {"audioTrashed": False, "deleted": False, "trashedAt": None, "legacyTrash": False}
+
+
+def has_legacy_audio(doc):
+    """Whether the document's audio was moved to the old trash locations"""
+    return bool(doc.audioTrashed and (doc.legacyTrash or not doc.trashedAt))
+
+
+def restore_legacy_audio(owner, filename):
+    """
+    Move audio trashed the old way back to its upload locations.
+
+    Returns:
+        bool: Whether the audio is now in Storage uploads or UPLOAD_FOLDER
+    """
+    restored = False
+    if check_blob_exists(legacy_trash_path(owner, filename)):
+        restored = move_file(legacy_trash_path(owner, filename), upload_path(owner, filename), owner)
+    local_trash = os.path.join(TRASH_FOLDER, filename)
+    local_upload = os.path.join(UPLOAD_FOLDER, filename)
+    try:
+        if os.path.exists(local_trash):
+            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+            os.replace(local_trash, local_upload)
+            restored = True
+    except OSError as e:
+        logger.error(f"Error restoring local file {filename}: {e}")
+    return restored or check_blob_exists(upload_path(owner, filename)) or os.path.exists(local_upload)
+
+
+def delete_audio(owner, filename, requesting_user_id, legacy=True, uploads=True):
+    """
+    Permanently delete a recording from Storage and local disk.
+
+    Args:
+        owner: Owner uid (the Storage path prefix)
+        filename: audioFilename
+        requesting_user_id: User the Storage delete is checked against
+        legacy: Also delete the old trash locations
+        uploads: Delete the upload locations; False deletes only the old
+                 trash locations
+
+    Returns:
+        bool: Whether any copy was deleted
+    """
+    paths = []
+    local_paths = []
+    if uploads:
+        paths.append(upload_path(owner, filename))
+        local_paths.append(os.path.join(UPLOAD_FOLDER, filename))
+    if legacy:
+        paths.append(legacy_trash_path(owner, filename))
+        local_paths.append(os.path.join(TRASH_FOLDER, filename))
+    deleted = False
+    for path in paths:
+        deleted = delete_file(path, requesting_user_id) or deleted
+    audio_cache.forget(filename)
+    for path in local_paths:
+        try:
+            os.remove(path)
+            deleted = True
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error deleting local file {path}: {e}")
+    return deleted
+
+
+def purge_docs(docs, requesting_user_id=None):
+    """
+    Delete documents, their audio, content, search entries and history for good.
+
+    The audio of all documents is deleted from Storage in one bulk call.
+    Content-addressed audio is only deleted with the last document that
+    references it. A document whose blob could not be deleted is kept, so
+    the purge can be retried.
+
+    Args:
+        docs: Documents to purge
+        requesting_user_id: User the Storage deletes are checked against;
+                            None for the background purger
+
+    Returns:
+        dict: {"purged": [doc ids], "failed": {doc_id: error}}
+    """
+    purging = {doc.id for doc in docs}
+    doc_by_path = {}
+    docs_by_blob = {}
+    shared = set()
+    # Blobs reserved for deletion; new references to them wait until released
+    claimed = set()
+    try:
+        for doc in docs:
+            if not (doc.audioFilename and doc.owner):
+                continue
+            if doc.contentHash:
+                if doc.audioFilename in shared:
+                    continue
+                if doc.audioFilename not in claimed and blob_refs.claim_purge(doc.audioFilename, purging):
+                    shared.add(doc.audioFilename)
+                else:
+                    claimed.add(doc.audioFilename)
+                    docs_by_blob.setdefault(blob_path(doc.audioFilename), []).append(doc.id)
+                continue
+            doc_by_path[upload_path(doc.owner, doc.audioFilename)] = doc.id
+            if has_legacy_audio(doc):
+                doc_by_path[legacy_trash_path(doc.owner, doc.audioFilename)] = doc.id
+
+        failed = {}
+        if doc_by_path:
+            result = delete_files(list(doc_by_path), requesting_user_id)
+            failed.update((doc_by_path[path], error) for path, error in result["failed"].items())
+        if docs_by_blob:
+            # Blobs are not under a user's path: access was checked on the documents
+            result = delete_files(list(docs_by_blob))
+            for path, error in result["failed"].items():
+                failed.update((doc_id, error) for doc_id in docs_by_blob[path])
+
+        purged = []
+        for doc in docs:
+            if doc.id in failed:
+                continue
+            if doc.audioFilename and doc.audioFilename not in shared:
+                audio_cache.forget(doc.audioFilename)
+                for folder in (UPLOAD_FOLDER, TRASH_FOLDER):
+                    try:
+                        os.remove(os.path.join(folder, doc.audioFilename))
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.error(f"Error deleting local file {doc.audioFilename}: {e}")
+            if doc.contentHash:
+                blob_refs.discard(doc.audioFilename, doc.id)
+            doc_store.remove(doc.id)
+            delete_content(doc.id)
+            remove_document(doc.id)
+            delete_history(doc.id)
+            purged.append(doc.id)
+        return {"purged": purged, "failed": failed}
+    finally:
+        blob_refs.release_purge(claimed)
+
+
+def _trashed_docs():
+    """Ids of every trashed document"""
+    cursor = None
+    while True:
+        page, cursor = doc_index.query(
+            owner=None, folder=ANY_FOLDER, trashed=True, cursor=cursor, limit=MAX_PAGE_SIZE
+        )
+        yield from page
+        if not cursor:
+            return
+
+
+def stamp_legacy_trash():
+    """
+    Give documents trashed before trashedAt existed a trashedAt of now.
+
+    Counting them from their last update instead would purge most of them
+    on the first run after an upgrade. Documents whose audio is in the old
+    trash locations are marked legacyTrash, which has_legacy_audio() reads
+    once they have a trashedAt.
+
+    Returns:
+        int: Number of documents stamped
+    """
+    stamped = 0
+    for doc_id in _trashed_docs():
+        doc = doc_store.get(doc_id)
+        if not doc or doc.trashedAt:
+            continue
+
+        def stamp(record):
+            # Re-checked on the latest copy: the document may have changed since
+            if record.get("trashedAt") or not (record.get("deleted") or record.get("audioTrashed")):
+                return
+            record["trashedAt"] = now_iso()
+            if record.get("audioTrashed"):
+                record["legacyTrash"] = True
+
+        if doc_store.mutate(doc_id, stamp):
+            stamped += 1
+    if stamped:
+        save_doc_store()
+        logger.info(f"Stamped trashedAt on {stamped} documents trashed before it was recorded")
+    return stamped
+
+
+def expired_trash(now=None):
+    """Return the ids of trashed documents past the retention period"""
+    now = now or datetime.now(timezone.utc)
+    cutoff = (now - timedelta(days=TRASH_RETENTION_DAYS)).isoformat(timespec="milliseconds")
+    expired = []
+    for doc_id in _trashed_docs():
+        doc = doc_store.get(doc_id)
+        # Without trashedAt the retention period has not started (see stamp_legacy_trash)
+        if doc and doc.trashedAt and doc.trashedAt <= cutoff:
+            expired.append(doc_id)
+    return expired
+
+
+def purge_expired_trash(now=None, batch_size=TRASH_PURGE_BATCH):
+    """
+    Permanently delete expired trash, one batch at a time.
+
+    Returns:
+        int: Number of documents purged
+    """
+    stamp_legacy_trash()
+    expired = expired_trash(now)
+    purged = 0
+    for start in range(0, len(expired), batch_size):
+        # Skip documents restored since the scan
+        docs = [
+            doc for doc in map(doc_store.get, expired[start:start + batch_size])
+            if doc and (doc.deleted or doc.audioTrashed)
+        ]
+        result = purge_docs(docs)
+        for doc_id, error in result["failed"].items():
+            logger.error(f"Error purging trashed doc {doc_id}: {error}")
+        purged += len(result["purged"])
+        save_doc_store()
+        # Let requests run between batches
+        socketio.sleep(0)
+    if purged:
+        logger.info(f"Purged {purged} documents from the trash")
+    return purged
+
+
+def _purge_loop():
+    while True:
+        try:
+            purge_expired_trash()
+        except Exception as e:
+            logger.error(f"Trash purge failed: {e}")
+        socketio.sleep(TRASH_PURGE_INTERVAL)
+
+
+def start_trash_purger():
+    """Run purge_expired_trash() in the background every TRASH_PURGE_INTERVAL seconds"""
+    socketio.start_background_task(_purge_loop)
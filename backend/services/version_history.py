@@ -0,0 +1,296 @@
+# backend/services/version_history.py
+"""
+Delta-compressed transcript version history.
+
+Each document's history is a directory of segment files. A segment starts
+with a full snapshot of the transcript and continues with up to
+VERSION_SNAPSHOT_INTERVAL - 1 deltas, one JSON line per version:
+
+    {"version": 7, "createdAt": ..., "author": uid, "length": 5120,
+     "snapshot": "full text"}                     # first line of a segment
+    {"version": 8, ..., "delta": [[pos, deleted, "inserted"], ...]}
+
+Segment files are named after their first version, so rebuilding any
+version reads one segment and applies at most interval - 1 deltas, and an
+edit only appends a line the size of the changed text.
+"""
+import bisect
+import difflib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from services.doc_store import now_iso
+
+# Get configuration
+try:
+    from config import VERSION_HISTORY_DIR, VERSION_SNAPSHOT_INTERVAL
+except ImportError:
+    # Default values if config can't be imported
+    VERSION_HISTORY_DIR = "doc_history"
+    VERSION_SNAPSHOT_INTERVAL = 20
+
+logger = logging.getLogger(__name__)
+
+# Changed regions shorter than this are stored as a single splice
+_SPLICE_LIMIT = 2000
+# Number of documents whose latest text is kept in memory
+_HEAD_CACHE_SIZE = 256
+# Diff units: sentences, or words when the text has little punctuation
+_SENTENCE = re.compile(r"[^.!?\n]*(?:[.!?\n]+\s*|$)")
+_WORD = re.compile(r"\S+\s*|\s+")
+# Sentences longer than this make the sentence diff too coarse
+_MAX_SENTENCE = 1000
+# Above this many diff units a single splice is cheaper than diffing
+_MAX_DIFF_TOKENS = 5000
+
+_locks = {}
+_locks_lock = threading.Lock()
+# doc_id -> (segment path, segment size, entries in segment, version, content)
+_heads = OrderedDict()
+
+
+def make_delta(old, new):
+    """
+    Compute the edits turning `old` into `new`.
+
+    Returns:
+        list: [[position in old, characters deleted, text inserted], ...]
+              in increasing position order
+    """
+    # Trim the common prefix and suffix; most edits touch one region
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[-1 - end] == new[-1 - end]:
+        end += 1
+    old_mid = old[start:len(old) - end]
+    new_mid = new[start:len(new) - end]
+    if not old_mid and not new_mid:
+        return []
+    if len(old_mid) <= _SPLICE_LIMIT or len(new_mid) <= _SPLICE_LIMIT:
+        return [[start, len(old_mid), new_mid]]
+
+    # Several scattered edits: diff sentence by sentence (or word by word)
+    # so the unchanged text in between is not stored
+    old_tokens = [token for token in _SENTENCE.findall(old_mid) if token]
+    new_tokens = [token for token in _SENTENCE.findall(new_mid) if token]
+    if max(map(len, old_tokens + new_tokens)) > _MAX_SENTENCE:
+        old_tokens = _WORD.findall(old_mid)
+        new_tokens = _WORD.findall(new_mid)
+    if max(len(old_tokens), len(new_tokens)) > _MAX_DIFF_TOKENS:
+        return [[start, len(old_mid), new_mid]]
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    old_offsets = [start]
+    for token in old_tokens:
+        old_offsets.append(old_offsets[-1] + len(token))
+    delta = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        delta.append([
+            old_offsets[i1],
+            old_offsets[i2] - old_offsets[i1],
+            "".join(new_tokens[j1:j2]),
+        ])
+    return delta
+
+
+def apply_delta(old, delta):
+    """Apply a delta from make_delta to `old`"""
+    parts = []
+    cursor = 0
+    for pos, deleted, inserted in delta:
+        parts.append(old[cursor:pos])
+        parts.append(inserted)
+        cursor = pos + deleted
+    parts.append(old[cursor:])
+    return "".join(parts)
+
+
+def _lock_for(doc_id):
+    with _locks_lock:
+        return _locks.setdefault(doc_id, threading.Lock())
+
+
+def _doc_dir(doc_id):
+    # doc ids are uuids, but never let one escape the history directory
+    return os.path.join(VERSION_HISTORY_DIR, os.path.basename(str(doc_id)))
+
+
+def _segments(doc_id):
+    """Return the sorted first versions of a document's segment files"""
+    try:
+        names = os.listdir(_doc_dir(doc_id))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-6]) for name in names if name.endswith(".jsonl"))
+
+
+def _segment_path(doc_id, first_version):
+    return os.path.join(_doc_dir(doc_id), f"{first_version:010d}.jsonl")
+
+
+def _read_segment(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _replay(entries, until=None):
+    """Rebuild the text of version `until` (default: last) from one segment"""
+    content = None
+    for entry in entries:
+        if "snapshot" in entry:
+            content = entry["snapshot"]
+        else:
+            content = apply_delta(content, entry["delta"])
+        if until is not None and entry["version"] == until:
+            return content
+    return content if until is None else None
+
+
+def _load_head(doc_id):
+    """Return (path, size, entries, version, content) of the latest recorded version"""
+    segments = _segments(doc_id)
+    if not segments:
+        return None
+    path = _segment_path(doc_id, segments[-1])
+    size = os.path.getsize(path)
+    cached = _heads.get(doc_id)
+    # Another worker may have appended since we cached it
+    if cached and cached[0] == path and cached[1] == size:
+        _heads.move_to_end(doc_id)
+        return cached
+    entries = _read_segment(path)
+    head = (path, size, len(entries), entries[-1]["version"], _replay(entries))
+    _cache_head(doc_id, head)
+    return head
+
+
+def _cache_head(doc_id, head):
+    _heads[doc_id] = head
+    _heads.move_to_end(doc_id)
+    while len(_heads) > _HEAD_CACHE_SIZE:
+        _heads.popitem(last=False)
+
+
+def _append(path, entry):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return os.path.getsize(path)
+
+
+def record_version(doc_id, version, content, author=None, previous=None, **info):
+    """
+    Add a transcript version to a document's history.
+
+    Args:
+        doc_id: Document ID
+        version: Document version the text belongs to
+        content: Transcript text of that version
+        author: uid (or "transcription") that produced it
+        previous: (version, content) before this change, recorded first if
+                  the document has no history yet
+        **info: Extra fields stored with the entry (e.g. restoredFrom)
+    """
+    content = content or ""
+    try:
+        with _lock_for(doc_id):
+            head = _load_head(doc_id)
+            if head is None and previous is not None and previous[0] < version:
+                head = _write_snapshot(doc_id, previous[0], previous[1] or "", None, {})
+            if head is None:
+                _write_snapshot(doc_id, version, content, author, info)
+                return
+
+            path, _, count, head_version, head_content = head
+            if version <= head_version:
+                logger.warning(
+                    f"Skipping history entry {version} for doc {doc_id}: already at {head_version}"
+                )
+                return
+            if content == head_content and not info:
+                return
+
+            delta = make_delta(head_content, content)
+            delta_size = sum(len(inserted) for _, _, inserted in delta)
+            # Start a new segment at the interval, or when a full copy is about as small
+            if count >= VERSION_SNAPSHOT_INTERVAL or delta_size * 2 >= len(content):
+                _write_snapshot(doc_id, version, content, author, info)
+                return
+
+            entry = _entry(version, content, author, info)
+            entry["delta"] = delta
+            size = _append(path, entry)
+            _cache_head(doc_id, (path, size, count + 1, version, content))
+    except Exception as e:
+        logger.error(f"Error recording version {version} of doc {doc_id}: {e}")
+
+
+def _entry(version, content, author, info):
+    entry = {"version": version, "createdAt": now_iso(), "author": author, "length": len(content)}
+    entry.update(info)
+    return entry
+
+
+def _write_snapshot(doc_id, version, content, author, info):
+    path = _segment_path(doc_id, version)
+    entry = _entry(version, content, author, info)
+    entry["snapshot"] = content
+    size = _append(path, entry)
+    head = (path, size, 1, version, content)
+    _cache_head(doc_id, head)
+    return head
+
+
+def list_versions(doc_id):
+    """
+    Return the metadata of every recorded version, newest first.
+
+    Returns:
+        list: [{"version", "createdAt", "author", "length", "snapshot": bool, ...}]
+    """
+    versions = []
+    for first_version in _segments(doc_id):
+        for entry in _read_segment(_segment_path(doc_id, first_version)):
+            meta = {key: value for key, value in entry.items() if key != "delta"}
+            meta["snapshot"] = "snapshot" in entry
+            versions.append(meta)
+    versions.reverse()
+    return versions
+
+
+def get_version(doc_id, version):
+    """
+    Rebuild the transcript text of one version.
+
+    Returns:
+        str: The text, or None if that version was not recorded
+    """
+    segments = _segments(doc_id)
+    pos = bisect.bisect_right(segments, version) - 1
+    if pos < 0:
+        return None
+    return _replay(_read_segment(_segment_path(doc_id, segments[pos])), until=version)
+
+
+def delete_history(doc_id):
+    """Remove the whole version history of a document"""
+    with _lock_for(doc_id):
+        _heads.pop(doc_id, None)
+        directory = _doc_dir(doc_id)
+        try:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Error deleting version history of doc {doc_id}: {e}")